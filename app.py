@@ -1,17 +1,30 @@
 # app.py
-import eventlet 
-eventlet.monkey_patch() # Essential for eventlet async mode with SocketIO
+from config import CurrentConfig # Import configuration (first: it decides the serving mode)
+if CurrentConfig.SERVING_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch() # Essential for eventlet async mode with SocketIO
 
 import datetime
 from flask import Flask, render_template, redirect, url_for, request, session, jsonify
 from flask_socketio import SocketIO, emit, join_room
-from config import CurrentConfig # Import configuration
 from services.controller.cliente_controller import ClienteController
 from services.controller.embalagem_controller import EmbalagemController
 from services.controller.cotacao_controller import CotacaoController
 from services.controller.company_controller import CompanyController
 from services.controller.cotacao_consulta_controller import CotacaoConsultaController
+from services.controller.analytics_controller import AnalyticsController
+from services.metrics import metrics
+from services import serialization
+from db.reference_data import reference_cache
+from db.migrate import upgrade as apply_migrations
+from db.rollups import refresh_until_caught_up
+from db.partitions import run_maintenance as run_partition_maintenance
+from services.quote_events import quote_event_listener, CONSULTATIONS_ROOM
+from services.executor import quotation_executor, BULK
+from services.rate_limit import carrier_rate_limiter
+from services import quotation_flow
 import logging
+import uuid
 import os
 
 # Configure logger
@@ -21,28 +34,38 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config.from_object(CurrentConfig) # Load configuration from object
+app.json_encoder = serialization.JSONEncoder # jsonify through the fast encoder
+
+# Initialize SocketIO. With several workers (run_workers.py) a message queue carries room emits
+# to the worker holding each socket; browsers must stick to one worker (sticky sessions).
+socketio_options = {}
+if CurrentConfig.SOCKETIO_MESSAGE_QUEUE == 'postgres':
+    from services.socketio_pg import PostgresPubSubManager
+    socketio_options['client_manager'] = PostgresPubSubManager(channel=CurrentConfig.SOCKETIO_CHANNEL)
+elif CurrentConfig.SOCKETIO_MESSAGE_QUEUE:
+    socketio_options['message_queue'] = CurrentConfig.SOCKETIO_MESSAGE_QUEUE
+    socketio_options['channel'] = CurrentConfig.SOCKETIO_CHANNEL
+# Under SERVING_MODE=asgi the routes are served by asgi.py and these SocketIO handlers stay unused
+socketio = SocketIO(app, async_mode='eventlet' if CurrentConfig.SERVING_MODE == 'eventlet' else 'threading',
+                    json=serialization, **socketio_options) # Fast JSON for socket payloads
+
+# Apply pending schema migrations (db/migrations)
+if CurrentConfig.MIGRATE_ON_STARTUP:
+    try:
+        apply_migrations()
+    except Exception as e:
+        logger.error(f"Could not apply database migrations at startup: {e}")
 
-# Initialize SocketIO
-socketio = SocketIO(app, async_mode='eventlet')
-
-# Definition of carrier mapping (Internal Code -> Display Name)
-# Ensure the keys (BAU, TNT, etc.) match the 'Transportadora' identifier
-# returned by your carrier service functions and used in db.quote_responses.
-TRANSPORTADORA_MAP = {
-    'BAU': 'Bauer',           # SSW
-    'TNT': 'TNT Mercúrio',
-    'EPC': 'Princesa dos Campos',
-    'EUC': 'Eucatur',         # SSW
-    'RTE': 'Rodonaves',
-    'PEP': 'Zanotelli',       # SSW
-    'BTU': 'Braspress',
-    'ESM': 'Exp. São Miguel',
-    # Add more mappings as needed, matching the internal codes
-}
+# Warm up the reference data cache (carriers, companies); lookups retry lazily if this fails
+try:
+    reference_cache.load()
+except Exception as e:
+    logger.error(f"Could not preload reference data at startup: {e}")
 
 # Instantiate controllers (Stateless controllers can be global)
 cotacao_consulta_controller = CotacaoConsultaController()
 company_controller = CompanyController() # Instantiated once if stateless
+analytics_controller = AnalyticsController()
 
 # Route for the home page
 @app.route('/')
@@ -114,6 +137,8 @@ def packages():
             processed_packages = embalagem_controller.coletar_dados_embalagens(packages_data)
             # Store package data in session
             session['packages_data'] = processed_packages
+            # New quotation request: the quotations page rejoins its job (by protocol) under this ID
+            session['quotation_request_id'] = uuid.uuid4().hex
             logger.info("Package data processed and stored in session.")
             return jsonify({'redirect': url_for('quotations')})
         except ValueError as e:
@@ -142,6 +167,7 @@ def quotations():
     client_data = session['client_data']
     packages_data = session['packages_data']
     invoice_value = session['invoice_value']
+    quotation_request_id = session.setdefault('quotation_request_id', uuid.uuid4().hex)
 
     # Protocol is generated when quoting starts (in SocketIO handler)
     # Removed protocol generation from here
@@ -153,7 +179,8 @@ def quotations():
                            total_weight=packages_data['total_weight'],
                            total_volume=packages_data['total_volume'],
                            total_packages=packages_data['total_packages'],
-                           invoice_value=invoice_value)
+                           invoice_value=invoice_value,
+                           quotation_request_id=quotation_request_id)
 
 # Routes for quote consultation
 @app.route('/consultations', methods=['GET'])
@@ -164,116 +191,211 @@ def consultations():
 def consultations_filter():
     return cotacao_consulta_controller.filter_consultations()
 
+@app.route('/consultations/export', methods=['GET'])
+def consultations_export():
+    return cotacao_consulta_controller.export_consultations()
+
 @app.route('/consultations/<int:quote_id>', methods=['GET'])
 def quote_details(quote_id):
     return cotacao_consulta_controller.show_quote_details(quote_id)
 
+@app.route('/consultations/<int:quote_id>/json', methods=['GET'])
+def quote_details_json(quote_id):
+    return cotacao_consulta_controller.show_quote_details(quote_id, variant='json')
+
+# Carrier analytics (reads only the rollup tables)
+@app.route('/analytics', methods=['GET'])
+def analytics():
+    return analytics_controller.show_analytics()
+
+@app.route('/analytics/carriers', methods=['GET'])
+def analytics_carriers():
+    return analytics_controller.carrier_stats()
+
+# Internal metrics (stage timings, counters)
+@app.route('/metrics', methods=['GET'])
+def metrics_view():
+    return jsonify({**metrics.snapshot(), 'reference_cache': reference_cache.stats()})
+
+# Explicit invalidation of the reference data cache (e.g., after adding a carrier), in every worker
+@app.route('/reference-data/invalidate', methods=['POST'])
+def reference_data_invalidate():
+    reference_cache.invalidate_all_workers()
+    return jsonify({'status': 'ok'})
+
 # === SocketIO Event Handlers ===
 
+@socketio.on('join_consultations')
+def handle_join_consultations():
+    """Subscribes the client to live updates of the consultations list."""
+    join_room(CONSULTATIONS_ROOM)
+    logger.debug(f"SocketIO client {request.sid} joined {CONSULTATIONS_ROOM}.")
+
 @socketio.on('start_quotation')
-def handle_start_quotation():
-    """Handles the client request to start the quotation process."""
-    room = request.sid # Use session ID as the room
-    join_room(room)
-    logger.info(f"SocketIO client {room} connected and joined room.")
-    
-    # Instantiate controller for this request
-    cotacao_controller = CotacaoController()
-    
-    client_data = session.get('client_data')
-    packages_data = session.get('packages_data')
-    invoice_value = session.get('invoice_value')
-    
-    if not all([client_data, packages_data, invoice_value]):
-        error_msg = "Dados de cliente, embalagem ou valor da nota ausentes na sessão."
-        logger.error(f"{error_msg} for SID {room}")
-        emit('quotation_error', {'error': error_msg}, room=room)
+def handle_start_quotation(data=None):
+    """
+    Handles the client request to start the quotation process. A repeated request (same
+    request_id from the page, or same client and packages) attaches to the quotation already started.
+    """
+    sid = request.sid
+    join_room(sid) # Use session ID as the room
+    logger.info(f"SocketIO client {sid} connected and joined room.")
+
+    quote = quotation_flow.session_quote(session)
+    if quote is None:
+        emit(*quotation_flow.session_error(sid), room=sid)
+        return
+
+    # The job (and its room) outlive the requesting socket; reconnecting clients rejoin by protocol
+    job, created = quotation_flow.claim_job(quote, data)
+    join_room(job.room)
+    snapshot = quotation_flow.attach(job, sid, created)
+    if snapshot is not None:
+        emit('quotation_snapshot', snapshot)
         return
 
     try:
         # Prepare data needed for quotation APIs (excluding protocol for now)
-        cotacao_base_data = cotacao_controller.obter_dados_base_para_cotacao(
-            client_data,
-            packages_data,
-            invoice_value
-        )
+        cotacao_base_data = CotacaoController().obter_dados_base_para_cotacao(*quote)
         if not cotacao_base_data:
-             emit('quotation_error', {'error': 'Falha ao preparar dados para cotação.'}, room=room)
-             return
-             
-        # Start background task to process quotations
-        logger.info(f"Starting background task for quotation processing for SID {room}.")
-        socketio.start_background_task(target=process_quotations, cotacao_base_data=cotacao_base_data, room=room)
+            socketio.emit(*quotation_flow.fail(job, quotation_flow.ERRO_PREPARO), room=job.room)
+            return
+
+        # Hand the quotation to the bounded executor (runs now or waits in the FIFO admission queue)
+        def report_position(position):
+            socketio.emit(*quotation_flow.queued(position), room=job.room)
 
+        position = quotation_executor.submit(process_quotations, cotacao_base_data=cotacao_base_data, sid=sid,
+                                             job=job, on_position=report_position)
+        error_event = quotation_flow.submitted(job, sid, position)
     except Exception as e:
-        logger.exception(f"Error initiating quotation process for SID {room}: {e}")
-        emit('quotation_error', {'error': 'Erro interno ao iniciar o processo de cotação.'}, room=room)
+        error_event = quotation_flow.start_failed(job, sid, e)
+    if error_event is not None:
+        socketio.emit(*error_event, room=job.room)
+
+@socketio.on('rejoin_quotation')
+def handle_rejoin_quotation(data):
+    """Reattaches a reconnecting client to its quotation job: snapshot now, remaining results live."""
+    job, expired = quotation_flow.find_job(request.sid, data)
+    if job is None:
+        emit(*expired)
+        return
+    join_room(job.room)
+    emit('quotation_snapshot', quotation_flow.rejoin(job, request.sid))
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    """Schedules the cancellation of quotations nobody watches anymore (CANCEL_ON_DISCONNECT)."""
+    for job in quotation_flow.watched_jobs_left(request.sid):
+        socketio.start_background_task(cancel_if_abandoned, job)
+
+def cancel_if_abandoned(job):
+    socketio.sleep(CurrentConfig.CANCEL_GRACE_SECONDS)
+    quotation_flow.cancel_if_abandoned(job)
+
+def process_quotations(cotacao_base_data, sid, job):
+    """Background task to request quotes from carriers and emit results to the job's room."""
+    logger.info(f"Background task started for SID {sid}.")
+    progress = quotation_flow.QuotationProgress(job, sid)
+    if progress.skip():
+        return
 
-def process_quotations(cotacao_base_data, room):
-    """Background task to request quotes from carriers and emit results."""
-    logger.info(f"Background task started for room {room}.")
-    
     # Instantiate controller for this task
     cotacao_controller = CotacaoController()
-    
     try:
         # 1. Generate Protocol *HERE* before saving
         protocolo = cotacao_controller.gerar_protocolo()
         cotacao_data_final = {**cotacao_base_data, "protocolo": protocolo}
-        logger.info(f"Generated Protocol {protocolo} for room {room}.")
-        
-        # Emit the protocol number to the client
-        socketio.emit('protocol_generated', {'protocolo': protocolo}, room=room)
+        socketio.emit(*progress.protocol_generated(protocolo), room=job.room)
 
         # 2. Save initial quote data to DB
-        quote_id = cotacao_controller.salvar_cotacao_inicial(cotacao_data_final)
-        logger.info(f"Initial quote saved to DB with ID: {quote_id}, Protocol: {protocolo} for room {room}")
-
-        # 3. Define callback for emitting results
-        def emit_new_quotation(cotacao_result):
-            if not cotacao_result or not isinstance(cotacao_result, dict):
-                logger.warning(f"Invalid cotacao_result received in callback for room {room}: {cotacao_result}")
-                return
-                
-            transportadora_code = cotacao_result.get('Transportadora') # Internal code (e.g., 'BTU')
-            if not transportadora_code:
-                 logger.warning(f"Cotacao result missing 'Transportadora' key for room {room}: {cotacao_result}")
-                 return
-
-            # Map internal code to display name
-            transportadora_name = TRANSPORTADORA_MAP.get(transportadora_code, transportadora_code) # Fallback to code if not mapped
-            cotacao_result['Transportadora'] = transportadora_name # Update for display
-
-            # Simple validity check (can be enhanced)
-            frete = cotacao_result.get('frete')
-            is_valid = frete is not None and frete != '-' and float(frete) > 0
-
-            if not is_valid:
-                # Standardize fields for invalid/error quotes
-                cotacao_result['modal'] = '-'
-                cotacao_result['frete'] = '-'
-                cotacao_result['prazo'] = '-'
-                cotacao_result['cotacao'] = '-'
-                # Keep the error message if present
-            
-            # Emit the processed quotation via SocketIO
-            socketio.emit('new_quotation', {'cotacao': cotacao_result}, room=room)
-            logger.debug(f"Emitted quotation to room {room}: {cotacao_result}")
+        progress.quote_saved(cotacao_controller.salvar_cotacao_inicial(cotacao_data_final))
 
-        # 4. Request quotes from carriers concurrently
-        cotacao_controller.solicitar_cotacoes(quote_id, cotacao_data_final, emit_new_quotation)
-        
-        # 5. Emit completion event
-        socketio.emit('quotations_complete', {}, room=room)
-        logger.info(f"Quotation process completed for room {room} (Protocol: {protocolo}).")
+        # 3. Request quotes from carriers concurrently (results arrive already normalized)
+        cotacao_controller.solicitar_cotacoes(
+            job.quote_id, cotacao_data_final,
+            lambda cotacao_display: socketio.emit(*progress.new_result(cotacao_display), room=job.room),
+            job=job, on_deadline=lambda pendentes: socketio.emit(*progress.deadline_reached(pendentes), room=job.room))
 
+        # 4. Emit completion event
+        socketio.emit(*progress.completed(), room=job.room)
     except Exception as e:
-        logger.exception(f"Error during background quotation processing for room {room}: {e}")
-        socketio.emit('quotation_error', {'error': 'Erro interno durante o processamento das cotações.'}, room=room)
+        socketio.emit(*progress.failed(e), room=job.room)
+
+@socketio.on('requote_quotation')
+def handle_requote_quotation(data=None):
+    """
+    Quotes a stored quote again (consultations page) as a new quote. Its carrier calls run in
+    the 'bulk' priority class, so they only take the slots interactive quotations leave free.
+    """
+    quote_id = (data or {}).get('quote_id')
+    try:
+        cotacao_controller = CotacaoController(priority=BULK)
+        cotacao_base_data = cotacao_controller.obter_dados_recotacao(quote_id)
+        if not cotacao_base_data:
+            emit('quotation_error', {'error': quotation_flow.ERRO_RECOTACAO})
+            return
+        position = quotation_executor.submit(process_requote, cotacao_controller, cotacao_base_data)
+        emit(*quotation_flow.requote_submitted(quote_id, position))
+    except Exception as e:
+        emit(*quotation_flow.requote_failed(quote_id, e))
+
+def process_requote(cotacao_controller, cotacao_base_data):
+    """Background re-quotation: saved and completed like any quote, results only go to the database."""
+    try:
+        protocolo = cotacao_controller.gerar_protocolo()
+        cotacao_data_final = {**cotacao_base_data, "protocolo": protocolo}
+        quote_id = cotacao_controller.salvar_cotacao_inicial(cotacao_data_final)
+        cotacao_controller.solicitar_cotacoes(quote_id, cotacao_data_final, lambda cotacao_display: None)
+        logger.info(f"Re-quotation completed (Protocol: {protocolo}).")
+    except Exception as e:
+        logger.error(f"Error during re-quotation: {e}", exc_info=True)
+
+# === Background jobs ===
+
+def rollup_worker():
+    """Periodically folds new carrier responses into the analytics rollups."""
+    while True:
+        try:
+            refresh_until_caught_up()
+        except Exception as e:
+            logger.error(f"Carrier rollup refresh failed: {e}")
+        socketio.sleep(CurrentConfig.ROLLUP_INTERVAL_SECONDS)
+
+def partition_maintenance_worker():
+    """Creates upcoming monthly partitions and archives the expired ones."""
+    while True:
+        try:
+            run_partition_maintenance()
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+        socketio.sleep(CurrentConfig.PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+
+def carrier_call_counts_worker():
+    """Adds the per-carrier daily call counters to carrier_call_counts."""
+    while True:
+        socketio.sleep(CurrentConfig.CARRIER_CALL_COUNTS_FLUSH_INTERVAL)
+        try:
+            carrier_rate_limiter.flush()
+        except Exception as e:
+            logger.error(f"Carrier call counts flush failed: {e}")
+
+def start_background_jobs(emitter=None):
+    """
+    Starts the per-process background jobs (rollups and partitions only where RUN_SINGLETON_JOBS is set).
+    emitter: object with sleep() and emit() through which the quote event listener pushes to
+    browsers (asgi.py passes one bound to its server); defaults to socketio.
+    """
+    if CurrentConfig.RUN_SINGLETON_JOBS:
+        socketio.start_background_task(target=rollup_worker)
+        socketio.start_background_task(target=partition_maintenance_worker)
+    socketio.start_background_task(target=quote_event_listener.run, socketio=emitter or socketio)
+    socketio.start_background_task(target=carrier_call_counts_worker)
 
 if __name__ == '__main__':
     # Use host/port from config or environment variables
     host = os.environ.get('FLASK_RUN_HOST', '10.1.5.2') # Default from original code
     port = int(os.environ.get('FLASK_RUN_PORT', '5001')) # Default from original code
     logger.info(f"Starting Flask-SocketIO server on {host}:{port} with debug={CurrentConfig.DEBUG}")
+    start_background_jobs()
     socketio.run(app, host=host, port=port, debug=CurrentConfig.DEBUG)
@@ -0,0 +1,221 @@
+# asgi.py
+"""
+Asyncio serving mode: the same pages, templates and SocketIO events as app.py, served by
+python-socketio's AsyncServer under an ASGI server, without eventlet's monkey patching.
+
+    uvicorn asgi:application --host 10.1.5.2 --port 5001
+    python asgi.py    # Same, on FLASK_RUN_HOST/FLASK_RUN_PORT
+
+Flask routes run in threads through asgiref's WsgiToAsgi. SocketIO handlers get a copy of the
+Flask session taken at connect time, as with Flask-SocketIO. Carrier adapters and database
+access stay blocking and run in thread pools (services.controller.cotacao_async_controller).
+SOCKETIO_MESSAGE_QUEUE supports redis:// URLs here; the Postgres manager is eventlet-only.
+"""
+import os
+os.environ['SERVING_MODE'] = 'asgi' # Before app/config are imported: no monkey patching
+
+import time
+import asyncio
+import inspect
+import logging
+from http.cookies import SimpleCookie
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+from config import CurrentConfig # Import configuration
+from app import app as flask_app, start_background_jobs
+from services import serialization
+from services.controller.cotacao_async_controller import AsyncCotacaoController
+from services.executor import create_async_executor, BULK
+from services import quotation_flow
+from services.quote_events import CONSULTATIONS_ROOM
+
+logger = logging.getLogger(__name__)
+
+# SocketIO server (asyncio); a Redis message queue shares rooms between workers
+socketio_options = {}
+if CurrentConfig.SOCKETIO_MESSAGE_QUEUE.startswith(('redis://', 'rediss://')):
+    socketio_options['client_manager'] = socketio.AsyncRedisManager(CurrentConfig.SOCKETIO_MESSAGE_QUEUE,
+                                                                    channel=CurrentConfig.SOCKETIO_CHANNEL)
+elif CurrentConfig.SOCKETIO_MESSAGE_QUEUE:
+    logger.warning(f"SOCKETIO_MESSAGE_QUEUE '{CurrentConfig.SOCKETIO_MESSAGE_QUEUE}' is not supported in asgi mode; "
+                   "emits only reach this process.")
+sio = socketio.AsyncServer(async_mode='asgi', json=serialization, **socketio_options)
+
+# Same limits as the eventlet executor; carrier calls run in its thread pool
+async_executor = create_async_executor()
+
+class _LoopEmitter:
+    """sleep()/emit() for background threads (quote event listener): emits on the server's event loop."""
+
+    def __init__(self, loop):
+        self._loop = loop
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def emit(self, event, data, room=None, ignore_queue=False):
+        asyncio.run_coroutine_threadsafe(sio.emit(event, data, room=room, ignore_queue=ignore_queue), self._loop)
+
+async def on_startup():
+    start_background_jobs(emitter=_LoopEmitter(asyncio.get_running_loop()))
+
+def load_flask_session(environ):
+    """Decodes the Flask session cookie of the SocketIO handshake ({} when missing or invalid)."""
+    cookie = SimpleCookie(environ.get('HTTP_COOKIE', '')).get(flask_app.config['SESSION_COOKIE_NAME'])
+    if cookie is None:
+        return {}
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return dict(serializer.loads(cookie.value, max_age=int(flask_app.permanent_session_lifetime.total_seconds())))
+    except Exception:
+        logger.warning("Ignoring invalid session cookie on SocketIO connect.")
+        return {}
+
+async def enter_room(sid, room):
+    # enter_room is a coroutine in newer python-socketio releases
+    result = sio.enter_room(sid, room)
+    if inspect.isawaitable(result):
+        await result
+
+def emit_later(event, data, room):
+    """Schedules an emit from synchronous callbacks running on the event loop."""
+    asyncio.ensure_future(sio.emit(event, data, room=room))
+
+# === SocketIO Event Handlers ===
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    await sio.save_session(sid, load_flask_session(environ))
+
+@sio.on('join_consultations')
+async def handle_join_consultations(sid):
+    """Subscribes the client to live updates of the consultations list."""
+    await enter_room(sid, CONSULTATIONS_ROOM)
+    logger.debug(f"SocketIO client {sid} joined {CONSULTATIONS_ROOM}.")
+
+@sio.on('start_quotation')
+async def handle_start_quotation(sid, data=None):
+    """
+    Handles the client request to start the quotation process. A repeated request (same
+    request_id from the page, or same client and packages) attaches to the quotation already started.
+    """
+    await enter_room(sid, sid) # Use session ID as the room
+    logger.info(f"SocketIO client {sid} connected and joined room.")
+
+    quote = quotation_flow.session_quote(await sio.get_session(sid))
+    if quote is None:
+        await sio.emit(*quotation_flow.session_error(sid), room=sid)
+        return
+
+    # The job (and its room) outlive the requesting socket; reconnecting clients rejoin by protocol
+    job, created = quotation_flow.claim_job(quote, data)
+    await enter_room(sid, job.room)
+    snapshot = quotation_flow.attach(job, sid, created)
+    if snapshot is not None:
+        await sio.emit('quotation_snapshot', snapshot, room=sid)
+        return
+
+    try:
+        cotacao_controller = AsyncCotacaoController(executor=async_executor)
+        cotacao_base_data = await cotacao_controller.obter_dados_base_para_cotacao_async(*quote)
+        if not cotacao_base_data:
+            await sio.emit(*quotation_flow.fail(job, quotation_flow.ERRO_PREPARO), room=job.room)
+            return
+
+        # Hand the quotation to the bounded executor (runs now or waits in the FIFO admission queue)
+        def report_position(position):
+            emit_later(*quotation_flow.queued(position), job.room)
+
+        position = async_executor.submit(process_quotations, cotacao_base_data=cotacao_base_data, sid=sid,
+                                         job=job, on_position=report_position)
+        error_event = quotation_flow.submitted(job, sid, position)
+    except Exception as e:
+        error_event = quotation_flow.start_failed(job, sid, e)
+    if error_event is not None:
+        await sio.emit(*error_event, room=job.room)
+
+@sio.on('rejoin_quotation')
+async def handle_rejoin_quotation(sid, data):
+    """Reattaches a reconnecting client to its quotation job: snapshot now, remaining results live."""
+    job, expired = quotation_flow.find_job(sid, data)
+    if job is None:
+        await sio.emit(*expired, room=sid)
+        return
+    await enter_room(sid, job.room)
+    await sio.emit('quotation_snapshot', quotation_flow.rejoin(job, sid), room=sid)
+
+@sio.event
+async def disconnect(sid):
+    """Schedules the cancellation of quotations nobody watches anymore (CANCEL_ON_DISCONNECT)."""
+    for job in quotation_flow.watched_jobs_left(sid):
+        asyncio.ensure_future(cancel_if_abandoned(job))
+
+async def cancel_if_abandoned(job):
+    await asyncio.sleep(CurrentConfig.CANCEL_GRACE_SECONDS)
+    quotation_flow.cancel_if_abandoned(job)
+
+async def process_quotations(cotacao_base_data, sid, job):
+    """Background task to request quotes from carriers and emit results to the job's room."""
+    logger.info(f"Background task started for SID {sid}.")
+    progress = quotation_flow.QuotationProgress(job, sid)
+    if progress.skip():
+        return
+
+    cotacao_controller = AsyncCotacaoController(executor=async_executor)
+    try:
+        protocolo = await cotacao_controller.gerar_protocolo_async()
+        cotacao_data_final = {**cotacao_base_data, "protocolo": protocolo}
+        await sio.emit(*progress.protocol_generated(protocolo), room=job.room)
+
+        progress.quote_saved(await cotacao_controller.salvar_cotacao_inicial_async(cotacao_data_final))
+
+        async def emit_new_quotation(cotacao_display):
+            await sio.emit(*progress.new_result(cotacao_display), room=job.room)
+
+        async def report_deadline(pendentes):
+            await sio.emit(*progress.deadline_reached(pendentes), room=job.room)
+
+        await cotacao_controller.solicitar_cotacoes_async(job.quote_id, cotacao_data_final, emit_new_quotation, job=job,
+                                                          on_deadline=report_deadline)
+        await sio.emit(*progress.completed(), room=job.room)
+    except Exception as e:
+        await sio.emit(*progress.failed(e), room=job.room)
+
+@sio.on('requote_quotation')
+async def handle_requote_quotation(sid, data=None):
+    """Quotes a stored quote again as a new quote, in the 'bulk' carrier-call priority class."""
+    quote_id = (data or {}).get('quote_id')
+    try:
+        cotacao_controller = AsyncCotacaoController(executor=async_executor, priority=BULK)
+        cotacao_base_data = await cotacao_controller.obter_dados_recotacao_async(quote_id)
+        if not cotacao_base_data:
+            await sio.emit('quotation_error', {'error': quotation_flow.ERRO_RECOTACAO}, room=sid)
+            return
+        position = async_executor.submit(process_requote, cotacao_controller, cotacao_base_data)
+        await sio.emit(*quotation_flow.requote_submitted(quote_id, position), room=sid)
+    except Exception as e:
+        await sio.emit(*quotation_flow.requote_failed(quote_id, e), room=sid)
+
+async def process_requote(cotacao_controller, cotacao_base_data):
+    """Background re-quotation: saved and completed like any quote, results only go to the database."""
+    async def discard(cotacao_display):
+        pass
+
+    try:
+        protocolo = await cotacao_controller.gerar_protocolo_async()
+        cotacao_data_final = {**cotacao_base_data, "protocolo": protocolo}
+        quote_id = await cotacao_controller.salvar_cotacao_inicial_async(cotacao_data_final)
+        await cotacao_controller.solicitar_cotacoes_async(quote_id, cotacao_data_final, discard)
+        logger.info(f"Re-quotation completed (Protocol: {protocolo}).")
+    except Exception as e:
+        logger.error(f"Error during re-quotation: {e}", exc_info=True)
+
+# ASGI application: /socket.io handled by python-socketio, every other path by the Flask app
+application = socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(flask_app), on_startup=on_startup)
+
+if __name__ == '__main__':
+    import uvicorn
+    host = os.environ.get('FLASK_RUN_HOST', '10.1.5.2') # Same defaults as app.py
+    port = int(os.environ.get('FLASK_RUN_PORT', '5001'))
+    logger.info(f"Starting ASGI server on {host}:{port}")
+    uvicorn.run(application, host=host, port=port, log_level='info' if CurrentConfig.DEBUG else 'warning')
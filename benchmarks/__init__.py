@@ -0,0 +1,4 @@
+# benchmarks/__init__.py
+
+# Ad-hoc benchmark scripts. Run them as modules from the project root, e.g.:
+#   python -m benchmarks.quote_details --iterations 200
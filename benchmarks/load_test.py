@@ -0,0 +1,160 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test of the SocketIO quotation flow: simulated users connect with a signed
+session (client + packages already chosen), emit start_quotation and wait until the
+quotation is complete. Users are spread round-robin over the worker URLs (sticky per user).
+
+Against running workers (started with QUOTE_REPOSITORY=memory and CARRIER_STUB_LATENCY_MS,
+so no carriers or TOTVS are involved):
+
+    python -m benchmarks.load_test --urls http://127.0.0.1:5001,http://127.0.0.1:5002 --quotes 500
+
+Or let it start run_workers.py itself for each worker count and compare throughput:
+
+    python -m benchmarks.load_test --spawn-workers 1,2,4 --quotes 500 --concurrency 80 --latency-ms 200
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import socketio
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from config import CurrentConfig # Import configuration
+from db.repository import LOAD_TEST_CLIENT
+
+PACKAGES = {
+    'pack': [{'AmountPackages': 2, 'Weight': 6.25, 'Length': 40, 'Height': 20, 'Width': 50}],
+    'total_weight': 12.5,
+    'total_volume': 0.08,
+    'total_packages': 2,
+}
+
+def session_cookie(index):
+    """Signed Flask session with the load-test client and packages (a distinct invoice value per quote)."""
+    signer = Flask(__name__)
+    signer.secret_key = CurrentConfig.SECRET_KEY
+    serializer = SecureCookieSessionInterface().get_signing_serializer(signer)
+    return serializer.dumps({
+        'client_data': LOAD_TEST_CLIENT,
+        'packages_data': PACKAGES,
+        # Distinct requests: identical ones would be coalesced (or deduplicated) by the server
+        'invoice_value': 1000 + index / 100,
+        'quotation_request_id': f"loadtest-{os.getpid()}-{index}",
+    })
+
+def run_quote(url, index, timeout):
+    """One simulated user. Returns (seconds until complete, results received), or None on failure."""
+    client = socketio.Client(reconnection=False)
+    done = threading.Event()
+    outcome = {'results': 0, 'error': None}
+
+    @client.on('new_quotation')
+    def on_result(data):
+        outcome['results'] += 1
+
+    @client.on('quotations_complete')
+    def on_complete(data):
+        if not data.get('pending'):
+            done.set()
+
+    @client.on('quotations_final')
+    def on_final(data):
+        done.set()
+
+    @client.on('quotation_error')
+    def on_error(data):
+        outcome['error'] = data.get('error')
+        done.set()
+
+    start = time.perf_counter()
+    try:
+        client.connect(url, headers={'Cookie': f"session={session_cookie(index)}"})
+        client.emit('start_quotation')
+        if not done.wait(timeout) or outcome['error']:
+            return None
+        return time.perf_counter() - start, outcome['results']
+    except Exception:
+        return None
+    finally:
+        client.disconnect()
+
+def run_load(urls, quotes, concurrency, timeout):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        outcomes = list(pool.map(lambda i: run_quote(urls[i % len(urls)], i, timeout), range(quotes)))
+        elapsed = time.perf_counter() - start
+    completed = sorted(outcome[0] for outcome in outcomes if outcome)
+    results = sum(outcome[1] for outcome in outcomes if outcome)
+    report = {'workers': len(urls), 'quotes': quotes, 'failed': quotes - len(completed), 'elapsed': elapsed,
+              'quotes_per_s': len(completed) / elapsed, 'results_per_s': results / elapsed}
+    if completed:
+        report['p50'] = completed[len(completed) // 2]
+        report['p95'] = completed[min(len(completed) - 1, int(len(completed) * 0.95))]
+    return report
+
+def print_report(report):
+    print(f"workers={report['workers']} quotes={report['quotes']} failed={report['failed']} "
+          f"elapsed={report['elapsed']:.2f}s quotes/s={report['quotes_per_s']:.1f} "
+          f"results/s={report['results_per_s']:.1f} "
+          f"p50={report.get('p50', 0):.2f}s p95={report.get('p95', 0):.2f}s")
+
+def wait_ready(urls, timeout=60):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                if requests.get(url, timeout=2).status_code == 200:
+                    break
+            except requests.exceptions.RequestException:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Worker {url} did not start within {timeout}s")
+            time.sleep(0.5)
+
+def spawn_and_run(workers, args):
+    """Starts run_workers.py with stub carriers and the memory repository, runs the load, stops it."""
+    env = {
+        **os.environ,
+        'QUOTE_REPOSITORY': 'memory',
+        'CARRIER_STUB_LATENCY_MS': str(args.latency_ms),
+        'MIGRATE_ON_STARTUP': '0',
+        'PAYLOAD_ARCHIVE_ENABLED': '0',
+        # Measure the server, not the per-carrier rate limits
+        'CARRIER_RATE_LIMIT_RATE': '100000',
+        'CARRIER_RATE_LIMIT_BURST': '100000',
+        'FLASK_ENV': 'production', # No debug reloader
+    }
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    launcher = subprocess.Popen([sys.executable, 'run_workers.py', '--workers', str(workers),
+                                 '--host', '127.0.0.1', '--port', str(args.port)], env=env, cwd=root)
+    urls = [f"http://127.0.0.1:{args.port + index}" for index in range(workers)]
+    try:
+        wait_ready(urls)
+        return run_load(urls, args.quotes, args.concurrency, args.timeout)
+    finally:
+        launcher.terminate()
+        launcher.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the SocketIO quotation flow across workers.")
+    parser.add_argument("--urls", help="Comma-separated worker URLs (already running)")
+    parser.add_argument("--spawn-workers", help="Comma-separated worker counts to start and compare, e.g. 1,2,4")
+    parser.add_argument("--port", type=int, default=5101, help="First port of the spawned workers")
+    parser.add_argument("--quotes", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="Simulated users at once")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Stub carrier latency of spawned workers")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds a quote may take before counting as failed")
+    args = parser.parse_args()
+
+    if args.spawn_workers:
+        for workers in (int(count) for count in args.spawn_workers.split(',')):
+            print_report(spawn_and_run(workers, args))
+    elif args.urls:
+        print_report(run_load(args.urls.split(','), args.quotes, args.concurrency, args.timeout))
+    else:
+        parser.error("Use --urls or --spawn-workers")
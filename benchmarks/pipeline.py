@@ -0,0 +1,83 @@
+# benchmarks/pipeline.py
+"""
+Throughput of the quoting pipeline (protocol, quote + packages insert, carrier fan-out,
+normalize/emit/persist) in isolation from Postgres and from the carriers: uses the
+in-memory repository and stub carriers with a simulated latency.
+
+    python -m benchmarks.pipeline --quotes 500 --concurrency 50 --latency-ms 200
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import random
+import time
+from decimal import Decimal
+from db.repository import create_repository
+from services.controller.cotacao_controller import CotacaoController, CarrierTask
+from services.metrics import metrics
+
+CARRIERS = ['BTU', 'EPC', 'ESM', 'RTE', 'TNT', 'BAU', 'EUC', 'PEP']
+
+class StubCarrierController(CotacaoController):
+    """Replaces the carrier adapters with sleeps of ~latency seconds returning a fixed result."""
+
+    def __init__(self, repository, latency):
+        super().__init__(repository)
+        self.latency = latency
+
+    def montar_tarefas(self, cotacao_data):
+        def stub(code):
+            eventlet.sleep(random.uniform(0.5, 1.5) * self.latency)
+            return {"Transportadora": code, "modal": "Rodoviário", "frete": 123.45,
+                    "prazo": 3, "cotacao": "0", "message": None}
+        return [CarrierTask(code, None, lambda code=code: stub(code)) for code in CARRIERS]
+
+def _quote_data(protocolo):
+    return {
+        "protocolo": protocolo,
+        "comp_cnpj": "00.000.000/0001-00",
+        "cli_cnpj": "11.111.111/0001-11",
+        "invoice_value": Decimal("1500.00"),
+        "total_weight": Decimal("12.5"),
+        "total_packages": 2,
+        "volume_total": Decimal("0.08"),
+        "pack": [{"AmountPackages": 2, "Weight": 6.25, "Length": 40, "Height": 20, "Width": 50}],
+    }
+
+def run_quote(controller):
+    protocolo = controller.gerar_protocolo()
+    quote_data = _quote_data(protocolo)
+    quote_id = controller.salvar_cotacao_inicial(quote_data)
+    controller.solicitar_cotacoes(quote_id, quote_data, socket_callback=lambda result: None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the quoting pipeline with an in-memory repository.")
+    parser.add_argument("--quotes", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="Quotes in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Mean simulated carrier latency")
+    args = parser.parse_args()
+
+    repository = create_repository('memory')
+    repository.add_company({"code": "BENCH", "cnpj": "00.000.000/0001-00"})
+    repository.upsert_client({"code": "C1", "cnpj": "11.111.111/0001-11", "name": "Cliente Benchmark"})
+    for code in CARRIERS:
+        repository.add_carrier(code)
+    controller = StubCarrierController(repository, args.latency_ms / 1000)
+
+    pool = eventlet.GreenPool(args.concurrency)
+    start = time.perf_counter()
+    for _ in range(args.quotes):
+        pool.spawn_n(run_quote, controller)
+    pool.waitall()
+    elapsed = time.perf_counter() - start
+
+    responses = sum(len(r) for r in repository.responses.values())
+    print(f"quotes={args.quotes} concurrency={args.concurrency} latency={args.latency_ms:.0f}ms "
+          f"elapsed={elapsed:.2f}s quotes/s={args.quotes / elapsed:.1f} responses/s={responses / elapsed:.1f}")
+    # Ideal: every quote takes about one carrier latency, so quotes/s ~ concurrency / latency
+    print(f"ideal quotes/s={args.concurrency / (args.latency_ms / 1000):.1f}")
+    for stage in ('quotation.stage.normalize', 'quotation.stage.emit', 'quotation.stage.persist'):
+        p = metrics.percentiles(stage)
+        if p:
+            print(f"{stage:<28} " + " ".join(f"{k}={v * 1000:.3f}ms" for k, v in p.items()))
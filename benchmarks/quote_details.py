@@ -0,0 +1,133 @@
+# benchmarks/quote_details.py
+"""
+Compares the single-query get_quote_details (json_agg, aggregation in SQL) with the
+previous three-query path that post-processed Decimals in Python.
+Needs a populated database (uses the configured DB_* settings).
+
+    python -m benchmarks.quote_details --iterations 200 --sample 50
+"""
+import argparse
+import random
+import statistics
+import time
+from decimal import Decimal
+from db.connection import get_db_connection
+from db.quotes import get_quote_details
+
+def _decimal_to_float_or_int(obj):
+    """Previous row post-processing: recursively converts Decimal to int/float."""
+    if isinstance(obj, list):
+        return [_decimal_to_float_or_int(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {k: _decimal_to_float_or_int(v) for k, v in obj.items()}
+    elif isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    else:
+        return obj
+
+def get_quote_details_legacy(quote_id):
+    """Previous implementation: three queries plus Python-side conversion and calculations."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT 
+                    q.quote_id, q.protocolo, q.invoice_value, q.total_weight,
+                    q.total_packages, q.total_volume, q.quote_date,
+                    c.code, c.name, c.cnpj, c.city_name, c.state_abbreviation,
+                    c.address, c.address_number, c.neighborhood, c.cep, c.ibge_city_code
+                FROM quotes q
+                JOIN clients c ON q.client_id = c.client_id
+                WHERE q.quote_id = %s;
+            """, (quote_id,))
+            quote = cur.fetchone()
+            if not quote:
+                return None
+            cur.execute("""
+                SELECT qp.amount_packages, qp.weight, qp.length, qp.height, qp.width
+                FROM quote_packages qp
+                WHERE qp.quote_id = %s;
+            """, (quote_id,))
+            packages_raw = cur.fetchall()
+            cur.execute("""
+                SELECT 
+                    qr.response_id, qr.carrier_id, cr.trade_name AS carrier_trade_name, 
+                    qr.modal, qr.shipping_value, qr.deadline_days, qr.quote_carrier, qr.message
+                FROM quote_responses qr
+                JOIN carriers cr ON qr.carrier_id = cr.carrier_id
+                WHERE qr.quote_id = %s
+                ORDER BY 
+                    CASE WHEN qr.shipping_value IS NULL THEN 1 ELSE 0 END,
+                    qr.shipping_value ASC;
+            """, (quote_id,))
+            responses_raw = cur.fetchall()
+
+    quote_details = _decimal_to_float_or_int(quote)
+    packages = []
+    for pkg_raw in packages_raw:
+        pkg = _decimal_to_float_or_int(pkg_raw)
+        try:
+            pkg['volume_unitario'] = round((pkg['length'] / 100) * (pkg['height'] / 100) * (pkg['width'] / 100), 5)
+        except (TypeError, KeyError):
+            pkg['volume_unitario'] = 0
+        packages.append(pkg)
+
+    invoice_value = quote_details.get('invoice_value', 0)
+    responses = []
+    for resp_raw in responses_raw:
+        resp = _decimal_to_float_or_int(resp_raw)
+        shipping_value = resp.get('shipping_value')
+        frete_percent = 0
+        if shipping_value is not None and shipping_value > 0 and invoice_value > 0:
+            frete_percent = (shipping_value / invoice_value) * 100
+        resp['frete_percent'] = round(frete_percent, 2)
+        responses.append(resp)
+
+    client_fields = ["code", "name", "cnpj", "city_name", "state_abbreviation", "address",
+                     "address_number", "neighborhood", "cep", "ibge_city_code"]
+    return {
+        "quote": quote_details,
+        "client": {field: quote_details.pop(field) for field in client_fields},
+        "packages": packages,
+        "responses": responses
+    }
+
+def _sample_quote_ids(sample_size):
+    """Picks quote IDs that have at least one carrier response."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT quote_id FROM quote_responses
+                ORDER BY quote_id DESC LIMIT %s;
+            """, (sample_size,))
+            return [row['quote_id'] for row in cur.fetchall()]
+
+def _run(label, func, quote_ids, iterations):
+    """Times `iterations` calls over randomly chosen quote IDs and prints a summary."""
+    samples = []
+    for _ in range(iterations):
+        quote_id = random.choice(quote_ids)
+        start = time.perf_counter()
+        func(quote_id)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    print(f"{label:<12} n={len(samples)} "
+          f"mean={statistics.mean(samples) * 1000:.2f}ms "
+          f"p50={samples[len(samples) // 2] * 1000:.2f}ms "
+          f"p95={samples[int(len(samples) * 0.95) - 1] * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quote details retrieval paths.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--sample", type=int, default=50, help="Number of distinct quotes to draw from")
+    args = parser.parse_args()
+
+    quote_ids = _sample_quote_ids(args.sample)
+    if not quote_ids:
+        raise SystemExit("No quotes with responses found; populate the database first.")
+
+    # Warm up connections and caches for both paths
+    get_quote_details_legacy(quote_ids[0])
+    get_quote_details(quote_ids[0])
+
+    _run("legacy", get_quote_details_legacy, quote_ids, args.iterations)
+    _run("single", get_quote_details, quote_ids, args.iterations)
@@ -0,0 +1,95 @@
+# benchmarks/serialization.py
+"""
+Rows-to-bytes throughput of the consultations endpoints: fetch, convert and encode.
+
+    legacy: Decimal rows walked by _decimal_to_float_or_int, encoded by Flask's jsonify
+    fast:   NUMERIC cast at fetch time (db.connection), encoded by services.serialization
+
+Needs a populated database (uses the configured DB_* settings).
+
+    python -m benchmarks.serialization --iterations 100 --page-size 200
+"""
+import argparse
+import statistics
+import time
+from flask import Flask, jsonify
+from db.connection import get_db_connection, numeric_as_number
+from db.quotes import get_quote_details
+from services.serialization import dumps_bytes
+from benchmarks.quote_details import _decimal_to_float_or_int, get_quote_details_legacy, _sample_quote_ids
+
+# Same columns as the /consultations list and /consultations/filter pages
+LIST_SQL = """
+    SELECT
+        q.quote_id, q.protocolo, c.code, c.name, c.cnpj,
+        q.invoice_value, q.total_packages, q.total_volume, q.quote_date
+    FROM quotes q
+    JOIN clients c ON q.client_id = c.client_id
+    ORDER BY q.quote_date DESC, q.quote_id DESC
+    LIMIT %s;
+"""
+
+# Flask app used only to give jsonify its application context
+_app = Flask(__name__)
+
+def _fetch_list(page_size, decimals):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            if not decimals:
+                numeric_as_number(cur)
+            cur.execute(LIST_SQL, (page_size,))
+            return cur.fetchall()
+
+def list_legacy(page_size):
+    rows = _decimal_to_float_or_int(_fetch_list(page_size, decimals=True))
+    with _app.app_context():
+        return len(rows), jsonify({'quotations': rows, 'next_cursor': None}).get_data()
+
+def list_fast(page_size):
+    rows = _fetch_list(page_size, decimals=False)
+    return len(rows), dumps_bytes({'quotations': rows, 'next_cursor': None})
+
+def details_legacy(quote_id):
+    details = get_quote_details_legacy(quote_id)
+    with _app.app_context():
+        return len(details['responses']), jsonify(details).get_data()
+
+def details_fast(quote_id):
+    details = get_quote_details(quote_id)
+    return len(details['responses']), dumps_bytes(details)
+
+def _run(label, func, args_list):
+    """Times func over args_list and prints latency and rows/bytes throughput."""
+    samples, rows_total, bytes_total = [], 0, 0
+    for arg in args_list:
+        start = time.perf_counter()
+        rows, body = func(arg)
+        samples.append(time.perf_counter() - start)
+        rows_total += rows
+        bytes_total += len(body)
+    elapsed = sum(samples)
+    samples.sort()
+    print(f"{label:<16} n={len(samples)} "
+          f"p50={samples[len(samples) // 2] * 1000:.2f}ms "
+          f"mean={statistics.mean(samples) * 1000:.2f}ms "
+          f"rows/s={rows_total / elapsed:,.0f} "
+          f"MB/s={bytes_total / elapsed / 1e6:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rows-to-bytes serialization paths.")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--sample", type=int, default=50, help="Number of distinct quotes for the details endpoint")
+    args = parser.parse_args()
+
+    pages = [args.page_size] * args.iterations
+    list_legacy(args.page_size) # Warm up
+    list_fast(args.page_size)
+    _run("list legacy", list_legacy, pages)
+    _run("list fast", list_fast, pages)
+
+    quote_ids = _sample_quote_ids(args.sample)
+    if quote_ids:
+        ids = [quote_ids[i % len(quote_ids)] for i in range(args.iterations)]
+        _run("details legacy", details_legacy, ids)
+        _run("details fast", details_fast, ids)
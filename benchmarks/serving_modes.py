@@ -0,0 +1,103 @@
+# benchmarks/serving_modes.py
+"""
+Side-by-side comparison of the eventlet (app.py) and asyncio (asgi.py under uvicorn) serving
+modes: for each mode a single worker is started with stub carriers and the memory repository,
+then driven by benchmarks.load_test at increasing concurrency. Reports quotes/s, latency and
+the worker's resident memory (peak RSS, Linux /proc).
+
+    python -m benchmarks.serving_modes --concurrency 25,100,400 --quotes 400 --latency-ms 200
+
+The executor limits (MAX_CONCURRENT_QUOTATIONS, MAX_CONCURRENT_CARRIER_CALLS) apply in both
+modes; raise them through the environment to compare the servers rather than the limits.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+from benchmarks.load_test import run_load, wait_ready
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def server_command(mode, port):
+    if mode == 'eventlet':
+        return [sys.executable, 'app.py']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port),
+            '--log-level', 'warning']
+
+def rss_kb(pid):
+    """Resident set size of a process in kB (0 where /proc is unavailable)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+class PeakRss:
+    """Samples a process' RSS in the background and keeps the peak."""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_kb(self.pid))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def run_mode(mode, args):
+    env = {
+        **os.environ,
+        'SERVING_MODE': mode,
+        'FLASK_RUN_HOST': '127.0.0.1',
+        'FLASK_RUN_PORT': str(args.port),
+        'QUOTE_REPOSITORY': 'memory',
+        'CARRIER_STUB_LATENCY_MS': str(args.latency_ms),
+        'MIGRATE_ON_STARTUP': '0',
+        'RUN_SINGLETON_JOBS': '0',
+        'PAYLOAD_ARCHIVE_ENABLED': '0',
+        'CARRIER_RATE_LIMIT_RATE': '100000',
+        'CARRIER_RATE_LIMIT_BURST': '100000',
+        'FLASK_ENV': 'production', # No debug reloader
+    }
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(server_command(mode, args.port), env=env, cwd=ROOT)
+    try:
+        wait_ready([url])
+        idle_kb = rss_kb(server.pid)
+        for concurrency in args.concurrency:
+            with PeakRss(server.pid) as peak:
+                report = run_load([url], args.quotes, concurrency, args.timeout)
+            print(f"{mode:<9} concurrency={concurrency:<5} quotes/s={report['quotes_per_s']:<8.1f} "
+                  f"p50={report.get('p50', 0):.2f}s p95={report.get('p95', 0):.2f}s failed={report['failed']:<4} "
+                  f"rss_idle={idle_kb / 1024:.0f}MB rss_peak={peak.peak / 1024:.0f}MB")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the eventlet and asyncio serving modes.")
+    parser.add_argument("--modes", default="eventlet,asgi")
+    parser.add_argument("--concurrency", default="25,100,400", help="Comma-separated simulated users at once")
+    parser.add_argument("--quotes", type=int, default=400, help="Quotes per concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Stub carrier latency")
+    parser.add_argument("--port", type=int, default=5201)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(',')]
+
+    for mode in args.modes.split(','):
+        run_mode(mode, args)
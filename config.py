@@ -18,6 +18,15 @@ class Config:
     DB_USER = os.environ.get('DB_USER', 'postgres')
     DB_PASSWORD = os.environ.get('DB_PASSWORD', '20Kdu21@@ti') # Use env var in production!
 
+    # Read replica for history/detail/report queries (disabled when DB_READ_HOST is empty)
+    DB_READ_HOST = os.environ.get('DB_READ_HOST', '')
+    DB_READ_PORT = os.environ.get('DB_READ_PORT', DB_PORT)
+    DB_READ_NAME = os.environ.get('DB_READ_NAME', DB_NAME)
+    DB_READ_USER = os.environ.get('DB_READ_USER', DB_USER)
+    DB_READ_PASSWORD = os.environ.get('DB_READ_PASSWORD', DB_PASSWORD)
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '5'))
+    REPLICA_LAG_CHECK_INTERVAL = int(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '10'))
+
     # TOTVS API Configuration
     TOTVS_BASE_URL = os.environ.get('TOTVS_BASE_URL', 'http://10.1.1.221:11980/api/totvsmoda')
     TOTVS_USERNAME = os.environ.get('TOTVS_USERNAME', '77776')
@@ -94,6 +103,91 @@ class Config:
     # General API Settings
     DEFAULT_API_TIMEOUT = int(os.environ.get('DEFAULT_API_TIMEOUT', '25'))
 
+    # Reference data cache (carriers, companies) refresh interval in seconds
+    REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL', '600'))
+
+    # Maximum number of rendered detail pages (HTML/JSON) of completed quotes kept in memory
+    DETAIL_CACHE_MAX_ENTRIES = int(os.environ.get('DETAIL_CACHE_MAX_ENTRIES', '500'))
+
+    # Carrier analytics rollups: refresh interval (seconds) and max responses folded per run
+    ROLLUP_INTERVAL_SECONDS = int(os.environ.get('ROLLUP_INTERVAL_SECONDS', '300'))
+    ROLLUP_BATCH_SIZE = int(os.environ.get('ROLLUP_BATCH_SIZE', '50000'))
+
+    # Apply pending db/migrations when the app starts (otherwise run 'python -m db.migrate upgrade')
+    MIGRATE_ON_STARTUP = os.environ.get('MIGRATE_ON_STARTUP', '1') == '1'
+
+    # Storage used by the quoting pipeline: 'postgres' or 'memory' (benchmarks/load tests)
+    QUOTE_REPOSITORY = os.environ.get('QUOTE_REPOSITORY', 'postgres')
+
+    # Quotation executor (services.executor): concurrent quotations, admission queue, outbound carrier calls
+    MAX_CONCURRENT_QUOTATIONS = int(os.environ.get('MAX_CONCURRENT_QUOTATIONS', '10'))
+    MAX_QUEUED_QUOTATIONS = int(os.environ.get('MAX_QUEUED_QUOTATIONS', '100'))
+    MAX_CONCURRENT_CARRIER_CALLS = int(os.environ.get('MAX_CONCURRENT_CARRIER_CALLS', '60'))
+    # Carrier-call priority classes: share of freed slots (weights) and per-class concurrency caps
+    CARRIER_PRIORITY_WEIGHTS = os.environ.get('CARRIER_PRIORITY_WEIGHTS', 'interactive=8,bulk=1')
+    CARRIER_PRIORITY_LIMITS = os.environ.get('CARRIER_PRIORITY_LIMITS', 'interactive=60,bulk=30')
+
+    # How long finished quotation jobs keep their results in memory for reconnecting browsers
+    QUOTATION_JOB_RETENTION_SECONDS = int(os.environ.get('QUOTATION_JOB_RETENTION_SECONDS', '900'))
+    # Repeated start_quotation events with the same idempotency key attach to the quotation already
+    # started while it runs or for this many seconds after it started (instead of quoting again)
+    QUOTATION_IDEMPOTENCY_WINDOW_SECONDS = int(os.environ.get('QUOTATION_IDEMPOTENCY_WINDOW_SECONDS', '120'))
+
+    # Per-quote deadline in seconds (0 = wait for every carrier): when it passes the page is told
+    # which carriers are still pending; late results are still shown and persisted
+    QUOTATION_DEADLINE_SECONDS = float(os.environ.get('QUOTATION_DEADLINE_SECONDS', '0'))
+
+    # Cancel a quotation's pending carrier calls when its last browser disconnects and does not
+    # come back within the grace period; listed carriers ('BTU,TNT') still finish and are persisted
+    CANCEL_ON_DISCONNECT = os.environ.get('CANCEL_ON_DISCONNECT', '0') == '1'
+    CANCEL_GRACE_SECONDS = float(os.environ.get('CANCEL_GRACE_SECONDS', '10'))
+    CANCEL_LET_FINISH_CARRIERS = [c.strip() for c in os.environ.get('CANCEL_LET_FINISH_CARRIERS', '').split(',') if c.strip()]
+
+    # Per-carrier outbound rate limits (services.rate_limit): default rate (calls/s) and burst,
+    # per-carrier overrides as 'BTU=2/4,BAU=1/3', backend 'local' or 'postgres' (shared by all workers)
+    CARRIER_RATE_LIMIT_RATE = float(os.environ.get('CARRIER_RATE_LIMIT_RATE', '5'))
+    CARRIER_RATE_LIMIT_BURST = float(os.environ.get('CARRIER_RATE_LIMIT_BURST', '10'))
+    CARRIER_RATE_LIMITS = os.environ.get('CARRIER_RATE_LIMITS', '')
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'local')
+    RATE_LIMIT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', '5')) # Seconds a call may wait for a token
+    CARRIER_CALL_COUNTS_FLUSH_INTERVAL = int(os.environ.get('CARRIER_CALL_COUNTS_FLUSH_INTERVAL', '60'))
+
+    # Share identical in-flight carrier requests between concurrent quotes (services.coalescing)
+    COALESCE_CARRIER_REQUESTS = os.environ.get('COALESCE_CARRIER_REQUESTS', '1') == '1'
+
+    # 'eventlet' (app.py: Flask-SocketIO on eventlet) or 'asgi' (asgi.py: python-socketio's asyncio
+    # server under an ASGI server such as uvicorn, no monkey patching); asgi.py sets it itself
+    SERVING_MODE = os.environ.get('SERVING_MODE', 'eventlet')
+
+    # Multi-process serving (run_workers.py): SocketIO message queue shared by the workers so room
+    # emits reach sockets held by any of them ('' = single process, 'postgres' = LISTEN/NOTIFY on
+    # the app database, or a python-socketio URL such as 'redis://localhost:6379/0')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'cotacoes_socketio')
+    # Worker index (set by run_workers.py); only the worker running singleton jobs refreshes
+    # rollups and maintains partitions
+    WORKER_ID = int(os.environ.get('WORKER_ID', '0'))
+    RUN_SINGLETON_JOBS = os.environ.get('RUN_SINGLETON_JOBS', '1') == '1'
+    # API access tokens (TOTVS, RTE): 'local' (per process) or 'postgres' (shared by every worker)
+    SHARED_STATE_BACKEND = os.environ.get('SHARED_STATE_BACKEND', 'local')
+
+    # Stub carriers answering after ~N ms instead of the real APIs (load tests; 0 = real carriers)
+    CARRIER_STUB_LATENCY_MS = float(os.environ.get('CARRIER_STUB_LATENCY_MS', '0'))
+
+    # Raw carrier payload archive (services.payload_archive)
+    PAYLOAD_ARCHIVE_ENABLED = os.environ.get('PAYLOAD_ARCHIVE_ENABLED', '1') == '1'
+    PAYLOAD_ARCHIVE_DIR = os.environ.get('PAYLOAD_ARCHIVE_DIR', 'archive/payloads')
+    PAYLOAD_ARCHIVE_SAMPLE_RATE = float(os.environ.get('PAYLOAD_ARCHIVE_SAMPLE_RATE', '1.0')) # Successful responses; errors always kept
+    PAYLOAD_ARCHIVE_MAX_BYTES = int(os.environ.get('PAYLOAD_ARCHIVE_MAX_BYTES', str(1024 ** 3))) # 1 GiB on disk
+    PAYLOAD_ARCHIVE_SEGMENT_BYTES = int(os.environ.get('PAYLOAD_ARCHIVE_SEGMENT_BYTES', str(64 * 1024 ** 2)))
+    PAYLOAD_ARCHIVE_QUEUE_SIZE = int(os.environ.get('PAYLOAD_ARCHIVE_QUEUE_SIZE', '1000'))
+
+    # Monthly partitions of quote_responses/quote_packages (db.partitions)
+    PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', '3'))
+    PARTITION_RETENTION_MONTHS = int(os.environ.get('PARTITION_RETENTION_MONTHS', '0')) # 0 disables archival
+    PARTITION_ARCHIVE_DIR = os.environ.get('PARTITION_ARCHIVE_DIR', 'archive/partitions')
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS = int(os.environ.get('PARTITION_MAINTENANCE_INTERVAL_SECONDS', '86400'))
+
 class DevelopmentConfig(Config):
     DEBUG = True
     # Example: Override DB for development if needed
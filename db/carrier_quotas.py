@@ -0,0 +1,55 @@
+# db/carrier_quotas.py
+import logging
+from db.connection import get_db_connection
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+def reserve_carrier_token(carrier_code, rate, burst, max_wait):
+    """
+    Refills the carrier's shared token bucket and reserves one token, in a single round trip
+    under a row lock. Returns the seconds to wait before using the token (0.0 if available now),
+    or None, without reserving, when that would exceed max_wait. rate must be > 0.
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO carrier_rate_buckets (carrier_code, tokens) VALUES (%(code)s, %(burst)s)
+                    ON CONFLICT (carrier_code) DO NOTHING;
+                    WITH bucket AS (
+                        SELECT LEAST(%(burst)s, tokens + GREATEST(0, EXTRACT(EPOCH FROM clock_timestamp() - updated_at))::float8 * %(rate)s) AS available
+                        FROM carrier_rate_buckets WHERE carrier_code = %(code)s FOR UPDATE
+                    )
+                    UPDATE carrier_rate_buckets b SET tokens = bucket.available - 1, updated_at = clock_timestamp()
+                    FROM bucket
+                    WHERE b.carrier_code = %(code)s AND GREATEST(0, (1 - bucket.available) / %(rate)s) <= %(max_wait)s
+                    RETURNING GREATEST(0, (1 - bucket.available) / %(rate)s) AS wait;
+                """, {'code': carrier_code, 'rate': float(rate), 'burst': float(burst), 'max_wait': float(max_wait)})
+                row = cur.fetchone()
+                conn.commit()
+                return float(row['wait']) if row else None
+    except Exception as e:
+        logger.error(f"Error reserving rate limit token for carrier {carrier_code}: {str(e)}")
+        raise
+
+def add_call_counts(counts):
+    """Adds {(carrier_code, day): (calls, throttled)} to the daily counters."""
+    if not counts:
+        return
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                for (carrier_code, day), (calls, throttled) in counts.items():
+                    cur.execute("""
+                        INSERT INTO carrier_call_counts (carrier_code, day, calls, throttled)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (carrier_code, day) DO UPDATE SET
+                            calls = carrier_call_counts.calls + EXCLUDED.calls,
+                            throttled = carrier_call_counts.throttled + EXCLUDED.throttled,
+                            updated_at = NOW();
+                    """, (carrier_code, day, calls, throttled))
+                conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving carrier call counts: {str(e)}")
+        raise
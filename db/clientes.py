@@ -1,4 +1,14 @@
 # /db/clientes.py
+"""
+Client persistence.
+
+Rows sharing a code (from before clients.code was unique) must be merged before migration
+0011 can create the unique index; the merge is explicit and dry-run by default:
+    python -m db.clientes duplicate-codes               # list the codes shared by several rows
+    python -m db.clientes merge-duplicate-codes         # show what would be merged
+    python -m db.clientes merge-duplicate-codes --apply # merge them
+"""
+import sys
 import logging
 from db.connection import get_db_connection
 
@@ -6,106 +16,194 @@ from db.connection import get_db_connection
 # logging.basicConfig(level=logging.INFO) # Configured in app.py
 logger = logging.getLogger(__name__)
 
-def verificar_cliente_existente(cnpj, code):
-    """Checks if a client exists in the database by CNPJ or code."""
-    if not cnpj and not code:
-        logger.warning("Attempted to check client existence with no CNPJ or code.")
-        return None
-        
-    sql = "SELECT * FROM clients WHERE "
-    params = []
-    conditions = []
-    if cnpj:
-        conditions.append("cnpj = %s")
-        params.append(cnpj)
-    if code:
-        conditions.append("code = %s")
-        params.append(str(code)) # Ensure code is compared as string if DB field is text
+# Fields kept in sync with the external source (TOTVS). A change in any of them updates the row.
+CAMPOS_SINCRONIZADOS = [
+    'name', 'number_state_registration', 'city_name', 'state_abbreviation',
+    'cep', 'address', 'neighborhood', 'address_number', 'ibge_city_code'
+]
+
+# Single round trip: insert, or update only when a synced field actually differs.
+# When nothing changed the ON CONFLICT branch returns no row, so the existing row
+# is selected from the statement snapshot instead.
+# A CNPJ already registered under another code (code changed in TOTVS) keeps its row:
+# the recoded branch moves that row to the new code instead of inserting a second client.
+# Requires a unique constraint on clients.code (migration 0011).
+_UPSERT_CLIENTE_SQL = """
+    WITH recoded AS (
+        UPDATE clients SET
+            code = %(code)s,
+            name = %(name)s,
+            number_state_registration = %(number_state_registration)s,
+            city_name = %(city_name)s,
+            state_abbreviation = %(state_abbreviation)s,
+            cep = %(cep)s,
+            address = %(address)s,
+            neighborhood = %(neighborhood)s,
+            address_number = %(address_number)s,
+            ibge_city_code = %(ibge_city_code)s,
+            date_update = NOW()
+        WHERE client_id = (
+            SELECT client_id FROM clients
+            WHERE cnpj = %(cnpj)s
+            ORDER BY date_update DESC, client_id DESC
+            LIMIT 1
+        )
+        AND NOT EXISTS (SELECT 1 FROM clients WHERE code = %(code)s)
+        RETURNING clients.*
+    ),
+    upsert AS (
+        INSERT INTO clients (
+            code, name, cnpj, number_state_registration, city_name,
+            state_abbreviation, cep, address, neighborhood,
+            address_number, ibge_city_code, date_creation, date_update
+        )
+        SELECT
+            %(code)s, %(name)s, %(cnpj)s, %(number_state_registration)s, %(city_name)s,
+            %(state_abbreviation)s, %(cep)s, %(address)s, %(neighborhood)s,
+            %(address_number)s, %(ibge_city_code)s, NOW(), NOW()
+        WHERE NOT EXISTS (SELECT 1 FROM recoded)
+        ON CONFLICT (code) DO UPDATE SET
+            name = EXCLUDED.name,
+            number_state_registration = EXCLUDED.number_state_registration,
+            city_name = EXCLUDED.city_name,
+            state_abbreviation = EXCLUDED.state_abbreviation,
+            cep = EXCLUDED.cep,
+            address = EXCLUDED.address,
+            neighborhood = EXCLUDED.neighborhood,
+            address_number = EXCLUDED.address_number,
+            ibge_city_code = EXCLUDED.ibge_city_code,
+            date_update = NOW()
+        WHERE (
+            clients.name, clients.number_state_registration, clients.city_name,
+            clients.state_abbreviation, clients.cep, clients.address, clients.neighborhood,
+            clients.address_number, clients.ibge_city_code
+        ) IS DISTINCT FROM (
+            EXCLUDED.name, EXCLUDED.number_state_registration, EXCLUDED.city_name,
+            EXCLUDED.state_abbreviation, EXCLUDED.cep, EXCLUDED.address, EXCLUDED.neighborhood,
+            EXCLUDED.address_number, EXCLUDED.ibge_city_code
+        )
+        RETURNING clients.*, (xmax = 0) AS inserted
+    )
+    SELECT recoded.*, FALSE AS inserted, TRUE AS changed FROM recoded
+    UNION ALL
+    SELECT upsert.*, TRUE AS changed FROM upsert
+    UNION ALL
+    SELECT c.*, FALSE AS inserted, FALSE AS changed
+    FROM clients c
+    WHERE c.code = %(code)s AND NOT EXISTS (SELECT 1 FROM upsert) AND NOT EXISTS (SELECT 1 FROM recoded);
+"""
+def upsert_cliente(cliente_dados):
+    """
+    Inserts or updates a client in a single statement, with change detection done in SQL.
+    A client whose CNPJ is known under another code is updated (and recoded), not duplicated.
+    Returns (client_row, changed). client_row includes an 'inserted' flag.
+    """
+    required_fields = ['code', 'cnpj'] + CAMPOS_SINCRONIZADOS
+    if not all(field in cliente_dados for field in required_fields):
+        logger.error("Missing required fields for upserting client.")
+        raise ValueError("Dados insuficientes para inserir/atualizar cliente.")
 
-    sql += " OR ".join(conditions) + ";"
-    
+    # Normalize values the same way the previous Python comparison did (trimmed strings)
+    params = {
+        field: (str(cliente_dados[field]).strip() if cliente_dados[field] is not None else None)
+        for field in required_fields
+    }
+
+    client_code = params['code']
     try:
-        logger.info(f"Verifying client existence for CNPJ {cnpj} or code {code}...")
+        logger.info(f"Upserting client with code {client_code}...")
         with get_db_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(sql, tuple(params))
-                result = cur.fetchone()
-                if result:
-                    logger.info(f"Client found: {result['client_id']} for CNPJ {cnpj} / code {code}")
-                else:
-                    logger.info(f"Client not found for CNPJ {cnpj} / code {code}")
-                return result
+                cur.execute(_UPSERT_CLIENTE_SQL, params)
+                row = cur.fetchone()
+                conn.commit()
+
+        if not row:
+            # Only possible if a concurrent transaction inserted the same code mid-statement
+            logger.error(f"Upsert of client {client_code} returned no row.")
+            raise LookupError(f"Cliente {client_code} não pôde ser gravado.")
+
+        changed = row.pop('changed')
+        if row['inserted']:
+            logger.info(f"Client {client_code} inserted (ID: {row['client_id']}).")
+        elif changed:
+            logger.info(f"Client {client_code} updated (ID: {row['client_id']}).")
+        else:
+            logger.info(f"Client {client_code} is up-to-date. No database update needed.")
+        return row, changed
     except Exception as e:
-        logger.error(f"Error verifying client existence: {str(e)}", exc_info=True)
+        # Handle potential unique constraint violations (e.g., concurrent upserts of the same client)
+        if "duplicate key value violates unique constraint" in str(e).lower():
+            logger.warning(f"Unique constraint violation upserting client (code/cnpj): {client_code}/{cliente_dados.get('cnpj')}. Error: {e}")
+        else:
+            logger.error(f"Error upserting client {client_code}: {str(e)}", exc_info=True)
         raise
 
-def atualizar_cliente(cliente_dados):
-    """Updates an existing client's information in the database."""
-    required_fields = ['code', 'name', 'number_state_registration', 'city_name', 
-                       'state_abbreviation', 'cep', 'address', 'neighborhood', 
-                       'address_number', 'ibge_city_code']
-    if not all(field in cliente_dados for field in required_fields):
-        logger.error("Missing required fields for updating client.")
-        raise ValueError("Dados insuficientes para atualizar cliente.")
+# Rows sharing a code; the most recently updated one is kept
+_DUPLICATE_CODES_SQL = """
+    SELECT code, (ARRAY_AGG(client_id ORDER BY date_update DESC, client_id DESC))[1] AS keep_id,
+           (ARRAY_AGG(client_id ORDER BY date_update DESC, client_id DESC))[2:] AS merged_ids
+    FROM clients
+    GROUP BY code
+    HAVING COUNT(*) > 1
+    ORDER BY code;
+"""
 
+def find_duplicate_client_codes(cur=None):
+    """Returns [{'code', 'keep_id', 'merged_ids'}] for every code shared by several clients."""
     try:
-        client_code_str = str(cliente_dados['code']) # Ensure code is string for WHERE clause
-        logger.info(f"Updating client with code {client_code_str}...")
+        if cur is not None:
+            cur.execute(_DUPLICATE_CODES_SQL)
+            return cur.fetchall()
         with get_db_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE clients SET
-                        name = %(name)s,
-                        number_state_registration = %(number_state_registration)s,
-                        city_name = %(city_name)s,
-                        state_abbreviation = %(state_abbreviation)s,
-                        cep = %(cep)s,
-                        address = %(address)s,
-                        neighborhood = %(neighborhood)s,
-                        address_number = %(address_number)s,
-                        ibge_city_code = %(ibge_city_code)s,
-                        date_update = NOW()
-                    WHERE code = %(code_str)s;
-                """, {**cliente_dados, 'code_str': client_code_str})
-                conn.commit()
-                logger.info(f"Client {client_code_str} updated successfully.")
+                cur.execute(_DUPLICATE_CODES_SQL)
+                return cur.fetchall()
     except Exception as e:
-        logger.error(f"Error updating client {client_code_str}: {str(e)}", exc_info=True)
+        logger.error(f"Error listing duplicate client codes: {str(e)}", exc_info=True)
         raise
 
-def inserir_cliente(cliente_dados):
-    """Inserts a new client into the database."""
-    required_fields = ['code', 'name', 'cnpj', 'number_state_registration', 'city_name', 
-                       'state_abbreviation', 'cep', 'address', 'neighborhood', 
-                       'address_number', 'ibge_city_code']
-    if not all(field in cliente_dados for field in required_fields):
-        logger.error("Missing required fields for inserting client.")
-        raise ValueError("Dados insuficientes para inserir cliente.")
-        
+def merge_duplicate_client_codes(apply=False):
+    """
+    Merges the clients sharing a code into the most recently updated one: their quotes are
+    repointed to it and the other rows deleted, in one transaction. Irreversible, so each
+    merge is logged and nothing is written unless apply is True.
+    Returns the duplicates found (see find_duplicate_client_codes).
+    """
     try:
-        client_code = cliente_dados['code']
-        logger.info(f"Inserting new client with code {client_code}...")
         with get_db_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO clients (
-                        code, name, cnpj, number_state_registration, city_name, 
-                        state_abbreviation, cep, address, neighborhood, 
-                        address_number, ibge_city_code, date_creation, date_update
-                    )
-                    VALUES (
-                        %(code)s, %(name)s, %(cnpj)s, %(number_state_registration)s, %(city_name)s, 
-                        %(state_abbreviation)s, %(cep)s, %(address)s, %(neighborhood)s, 
-                        %(address_number)s, %(ibge_city_code)s, NOW(), NOW()
-                    );
-                """, cliente_dados)
-                conn.commit()
-                logger.info(f"Client {client_code} inserted successfully.")
+                # Blocks concurrent client upserts so no new duplicate appears mid-merge
+                cur.execute("LOCK TABLE clients IN SHARE ROW EXCLUSIVE MODE;")
+                duplicates = find_duplicate_client_codes(cur)
+                for dup in duplicates:
+                    logger.info(f"{'Merging' if apply else 'Would merge'} clients {dup['merged_ids']} "
+                                f"into {dup['keep_id']} (code {dup['code']}).")
+                    if not apply:
+                        continue
+                    cur.execute("UPDATE quotes SET client_id = %s WHERE client_id = ANY(%s);",
+                                (dup['keep_id'], dup['merged_ids']))
+                    cur.execute("DELETE FROM clients WHERE client_id = ANY(%s);", (dup['merged_ids'],))
+                if apply:
+                    conn.commit()
+                else:
+                    conn.rollback()
+        logger.info(f"{len(duplicates)} duplicate client codes {'merged' if apply else 'found (dry run)'}.")
+        return duplicates
     except Exception as e:
-        # Handle potential unique constraint violations gracefully
-        if "duplicate key value violates unique constraint" in str(e).lower():
-             logger.warning(f"Attempted to insert duplicate client (code/cnpj): {client_code}/{cliente_dados.get('cnpj')}. Error: {e}")
-             # Decide if re-raising is needed or just log
-        else:
-            logger.error(f"Error inserting client {client_code}: {str(e)}", exc_info=True)
-        raise # Re-raise by default
\ No newline at end of file
+        logger.error(f"Error merging duplicate client codes: {str(e)}", exc_info=True)
+        raise
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'duplicate-codes':
+        for dup in find_duplicate_client_codes():
+            print(f"{dup['code']}: keep {dup['keep_id']}, merge {dup['merged_ids']}")
+    elif command == 'merge-duplicate-codes':
+        apply = '--apply' in sys.argv[2:]
+        duplicates = merge_duplicate_client_codes(apply=apply)
+        print(f"{'Merged' if apply else 'Would merge (dry run, pass --apply)'}: {len(duplicates)} codes")
+    else:
+        print("Usage: python -m db.clientes [duplicate-codes|merge-duplicate-codes [--apply]]")
+        sys.exit(1)
@@ -1,13 +1,37 @@
 # /db/connection.py
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 from config import CurrentConfig # Import configuration
+from services.metrics import metrics
+import threading
+import time
 import logging
 
 # Configuração do logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _cast_numeric(value, cur):
+    """NUMERIC -> int when it has no fractional part, float otherwise (None stays None)."""
+    if value is None:
+        return None
+    if '.' not in value and value.lstrip('-').isdigit():
+        return int(value)
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+# Read paths that render or serialize rows (history, details, analytics) fetch NUMERIC
+# columns as int/float directly, so rows are JSON/template-ready without walking them
+# afterwards. Only connections/cursors passed to numeric_as_number() get it: every other
+# connection (writes, reports) keeps exact Decimal values.
+NUMERIC_AS_NUMBER = psycopg2.extensions.new_type(psycopg2.extensions.DECIMAL.values, 'NUMERIC_AS_NUMBER', _cast_numeric)
+
+def numeric_as_number(conn_or_cursor):
+    """Registers the NUMERIC -> int/float caster on a connection or cursor. Returns it."""
+    psycopg2.extensions.register_type(NUMERIC_AS_NUMBER, conn_or_cursor)
+    return conn_or_cursor
+
 def get_db_connection():
     """Establishes a connection to the PostgreSQL database."""
     try:
@@ -28,4 +52,74 @@ def get_db_connection():
         raise # Re-raise the exception to be handled upstream
     except Exception as e:
         logger.error(f"Unexpected error connecting to database: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+# === Read replica routing ===
+
+_replica_state = {'lag_ok': True, 'checked_at': 0}
+_replica_lock = threading.Lock()
+
+def _connect_replica():
+    """Opens a read-only connection to the replica (DB_READ_* settings)."""
+    connection = psycopg2.connect(
+        host=CurrentConfig.DB_READ_HOST,
+        port=CurrentConfig.DB_READ_PORT,
+        database=CurrentConfig.DB_READ_NAME,
+        user=CurrentConfig.DB_READ_USER,
+        password=CurrentConfig.DB_READ_PASSWORD,
+        cursor_factory=RealDictCursor,
+        options="-c client_encoding=UTF8 -c default_transaction_read_only=on"
+    )
+    logger.debug(f"Replica connection established to {CurrentConfig.DB_READ_HOST}:{CurrentConfig.DB_READ_PORT}")
+    return connection
+
+def _replica_lag_cached():
+    """Cached lag verdict (True/False), or None when it is older than REPLICA_LAG_CHECK_INTERVAL."""
+    if time.time() - _replica_state['checked_at'] < CurrentConfig.REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_state['lag_ok']
+    return None
+
+def _check_replica_lag(connection):
+    """Measures the replication lag on the given replica connection and caches the verdict."""
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+            END AS lag_seconds;
+        """)
+        lag_seconds = float(cur.fetchone()['lag_seconds'])
+    connection.rollback()
+    lag_ok = lag_seconds <= CurrentConfig.REPLICA_MAX_LAG_SECONDS
+    with _replica_lock:
+        _replica_state.update(lag_ok=lag_ok, checked_at=time.time())
+    metrics.set_gauge('db.replica.lag_seconds', lag_seconds)
+    if not lag_ok:
+        logger.warning(f"Replica lag {lag_seconds:.1f}s above {CurrentConfig.REPLICA_MAX_LAG_SECONDS}s; reads go to the primary.")
+    return lag_ok
+
+def get_read_connection(route):
+    """
+    Connection for read-only queries (history, details, reports), with NUMERIC fetched as
+    int/float (numeric_as_number). Uses the replica when one is configured and its lag is
+    acceptable, the primary otherwise. The lag is checked at most
+    every REPLICA_LAG_CHECK_INTERVAL seconds; while the cached verdict is "lagging" the replica
+    is not contacted at all.
+    route names the caller for the per-route counters (db.reads.<route>.replica/primary).
+    """
+    lag_ok = _replica_lag_cached()
+    if CurrentConfig.DB_READ_HOST and lag_ok is not False:
+        connection = None
+        try:
+            connection = _connect_replica()
+            if lag_ok or _check_replica_lag(connection):
+                metrics.incr(f'db.reads.{route}.replica')
+                return numeric_as_number(connection)
+        except Exception as e:
+            logger.error(f"Replica unavailable, falling back to primary: {str(e)}")
+            metrics.incr('db.replica.errors')
+        if connection is not None:
+            connection.close()
+    metrics.incr(f'db.reads.{route}.primary')
+    return numeric_as_number(get_db_connection())
@@ -0,0 +1,70 @@
+# db/exports.py
+import logging
+import uuid
+import psycopg2.extensions
+from db.connection import get_read_connection
+from db.quote_search import build_search_conditions
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+# Column headers, in the same order as the SELECT list below
+EXPORT_COLUMNS = [
+    'protocolo', 'data_cotacao', 'cliente_codigo', 'cliente_cnpj', 'cliente_nome',
+    'cliente_cidade', 'cliente_uf', 'valor_nf', 'peso_total', 'total_pacotes', 'volume_total',
+    'transportadora_codigo', 'transportadora', 'modal', 'frete', 'prazo_dias',
+    'cotacao_transportadora', 'mensagem'
+]
+
+def iter_quote_export_rows(filters, chunk_size=2000):
+    """
+    Streams quotes joined with their carrier responses from a named (server-side) cursor.
+    Yields lists of at most chunk_size tuples, so memory stays flat regardless of the range.
+    filters: same keys accepted by filter_quotations ('code', 'cnpj', 'name', 'date_from', 'date_to').
+    """
+    conditions, params = build_search_conditions(filters)
+    where_clause = " AND ".join(conditions) if conditions else "TRUE"
+    # Repeat the date range on the partition key so only the matching months are scanned
+    # Cancelled calls are not carrier answers: a fully cancelled quote exports as one row without carrier
+    response_conditions = ["qr.quote_id = q.quote_id", "qr.quote_date = q.quote_date", "qr.status = 'answered'"] + [
+        condition.replace("q.quote_date", "qr.quote_date")
+        for condition in conditions if condition.startswith("q.quote_date")
+    ]
+    query = f"""
+        SELECT
+            q.protocolo, q.quote_date, c.code, c.cnpj, c.name,
+            c.city_name, c.state_abbreviation, q.invoice_value, q.total_weight,
+            q.total_packages, q.total_volume,
+            cr.short_name, cr.trade_name, qr.modal, qr.shipping_value, qr.deadline_days,
+            qr.quote_carrier, qr.message
+        FROM quotes q
+        JOIN clients c ON q.client_id = c.client_id
+        LEFT JOIN quote_responses qr ON {" AND ".join(response_conditions)}
+        LEFT JOIN carriers cr ON qr.carrier_id = cr.carrier_id
+        WHERE {where_clause}
+        ORDER BY q.quote_date, q.quote_id, qr.response_id;
+    """
+
+    conn = get_read_connection('export')
+    rows_exported = 0
+    try:
+        # Named cursor keeps the result set on the server; plain tuples avoid per-row dict overhead
+        cursor_name = f"quote_export_{uuid.uuid4().hex}"
+        with conn.cursor(name=cursor_name, cursor_factory=psycopg2.extensions.cursor) as cur:
+            cur.itersize = chunk_size
+            # Exact values in spreadsheets (read connections convert NUMERIC to float)
+            psycopg2.extensions.register_type(psycopg2.extensions.DECIMAL, cur)
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                rows_exported += len(rows)
+                yield rows
+        conn.rollback() # Read-only transaction, nothing to commit
+        logger.info(f"Quote export finished: {rows_exported} rows (filters: {filters}).")
+    except Exception as e:
+        logger.error(f"Error streaming quote export after {rows_exported} rows: {str(e)}", exc_info=True)
+        raise
+    finally:
+        conn.close()
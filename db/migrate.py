@@ -0,0 +1,190 @@
+# db/migrate.py
+"""
+Versioned schema migrations.
+
+Migrations are the numbered SQL files in db/migrations (NNNN_description.sql), applied
+in order, each in its own transaction, and recorded in schema_migrations. A Postgres
+advisory lock serializes concurrent runs (several workers starting at once).
+
+    python -m db.migrate upgrade   # apply pending migrations
+    python -m db.migrate status    # list applied/pending migrations
+    python -m db.migrate verify    # check that the hot queries can use their indexes
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+from db.connection import get_db_connection
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_([\w-]+)\.sql$')
+
+# Arbitrary constant identifying the migration lock
+ADVISORY_LOCK_ID = 72034001
+
+# Key queries and the table whose index each one must be able to use
+VERIFY_QUERIES = [
+    ("clients by cnpj", "clients", "SELECT client_id FROM clients WHERE cnpj = '00.000.000/0000-00'"),
+    ("clients by code", "clients", "SELECT client_id FROM clients WHERE code = '0'"),
+    ("carriers by short_name", "carriers", "SELECT carrier_id FROM carriers WHERE short_name = 'X'"),
+    ("quote_responses by quote_id", "quote_responses", "SELECT response_id FROM quote_responses WHERE quote_id = 0"),
+    ("quote_packages by quote_id", "quote_packages", "SELECT quote_id FROM quote_packages WHERE quote_id = 0"),
+    ("quotes by quote_date", "quotes",
+     "SELECT quote_id FROM quotes WHERE quote_date >= NOW() - INTERVAL '30 days' ORDER BY quote_date DESC, quote_id DESC LIMIT 50"),
+]
+
+def discover_migrations():
+    """Returns [(version, name, path)] of the migration files, ordered by version."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers in db/migrations.")
+    return migrations
+
+def _read_migration(path):
+    with open(path, encoding='utf-8') as f:
+        sql = f.read()
+    return sql, hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """)
+
+def _applied_migrations(cur):
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version;")
+    return {row['version']: row for row in cur.fetchall()}
+
+def upgrade():
+    """Applies the pending migrations in order. Returns the list of versions applied."""
+    applied_now = []
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                # Session-level lock: held across the per-migration transactions below
+                cur.execute("SELECT pg_advisory_lock(%s);", (ADVISORY_LOCK_ID,))
+                try:
+                    _ensure_migrations_table(cur)
+                    conn.commit()
+                    applied = _applied_migrations(cur)
+                    for version, name, path in discover_migrations():
+                        sql, checksum = _read_migration(path)
+                        if version in applied:
+                            if applied[version]['checksum'] != checksum:
+                                logger.warning(f"Migration {version:04d}_{name} changed after being applied (checksum mismatch).")
+                            continue
+                        logger.info(f"Applying migration {version:04d}_{name}...")
+                        try:
+                            cur.execute(sql)
+                            cur.execute("""
+                                INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s);
+                            """, (version, name, checksum))
+                            conn.commit()
+                        except Exception:
+                            conn.rollback()
+                            raise
+                        applied_now.append(version)
+                finally:
+                    cur.execute("SELECT pg_advisory_unlock(%s);", (ADVISORY_LOCK_ID,))
+                    conn.commit()
+        if applied_now:
+            logger.info(f"Applied migrations: {applied_now}")
+        else:
+            logger.info("Database schema is up-to-date.")
+        return applied_now
+    except Exception as e:
+        logger.error(f"Error applying migrations: {str(e)}", exc_info=True)
+        raise
+
+def status():
+    """Returns [{'version', 'name', 'applied_at', 'checksum_ok'}] for every known migration."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                _ensure_migrations_table(cur)
+                applied = _applied_migrations(cur)
+                conn.commit()
+        result = []
+        for version, name, path in discover_migrations():
+            row = applied.get(version)
+            result.append({
+                'version': version,
+                'name': name,
+                'applied_at': row['applied_at'] if row else None,
+                'checksum_ok': (row['checksum'] == _read_migration(path)[1]) if row else None
+            })
+        return result
+    except Exception as e:
+        logger.error(f"Error reading migration status: {str(e)}", exc_info=True)
+        raise
+
+def _index_scans(plan, found=None):
+    """Collects (node type, relation) of the index scans in an EXPLAIN (FORMAT JSON) plan."""
+    found = [] if found is None else found
+    if plan.get('Node Type') in ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'):
+        found.append((plan['Node Type'], plan.get('Relation Name')))
+    for child in plan.get('Plans', []):
+        _index_scans(child, found)
+    return found
+
+def verify():
+    """
+    EXPLAINs the key queries with sequential scans disabled, so small tables don't hide a
+    missing index. Returns [{'query', 'ok', 'scans'}]; ok is False when no index scan was planned.
+    """
+    results = []
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL enable_seqscan = off;")
+                for label, table, query in VERIFY_QUERIES:
+                    cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+                    plan = cur.fetchone()['QUERY PLAN']
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    scans = _index_scans(plan[0]['Plan'])
+                    # Partitioned tables report the partition (table_pYYYYMM) as relation
+                    ok = any(relation and relation.startswith(table) for _, relation in scans)
+                    results.append({'query': label, 'ok': ok, 'scans': scans})
+                    if not ok:
+                        logger.warning(f"Query '{label}' is not using an index on {table}.")
+                conn.rollback()
+        return results
+    except Exception as e:
+        logger.error(f"Error verifying query plans: {str(e)}", exc_info=True)
+        raise
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    if command == 'upgrade':
+        print(f"Applied: {upgrade()}")
+    elif command == 'status':
+        for m in status():
+            state = f"applied {m['applied_at']:%Y-%m-%d %H:%M}" if m['applied_at'] else "pending"
+            if m['checksum_ok'] is False:
+                state += " (changed since applied!)"
+            print(f"{m['version']:04d}_{m['name']}: {state}")
+    elif command == 'verify':
+        results = verify()
+        for r in results:
+            print(f"{'OK  ' if r['ok'] else 'FAIL'} {r['query']}: {r['scans'] or 'no index scan'}")
+        sys.exit(0 if all(r['ok'] for r in results) else 1)
+    else:
+        print("Usage: python -m db.migrate [upgrade|status|verify]")
+        sys.exit(1)
@@ -0,0 +1,75 @@
+-- 0001_baseline.sql
+-- Tables as used by the application. IF NOT EXISTS keeps this a no-op on existing
+-- databases; on a fresh database it creates the full schema.
+
+CREATE TABLE IF NOT EXISTS companies (
+    company_id SERIAL PRIMARY KEY,
+    code VARCHAR(20) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    cnpj VARCHAR(18) NOT NULL,
+    number_state_registration VARCHAR(30),
+    city_name VARCHAR(100),
+    state_abbreviation VARCHAR(2),
+    cep VARCHAR(9),
+    address VARCHAR(255),
+    neighborhood VARCHAR(100),
+    address_number VARCHAR(20),
+    ibge_city_code VARCHAR(10)
+);
+
+CREATE TABLE IF NOT EXISTS clients (
+    client_id SERIAL PRIMARY KEY,
+    code VARCHAR(20) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    cnpj VARCHAR(18) NOT NULL,
+    number_state_registration VARCHAR(30),
+    city_name VARCHAR(100),
+    state_abbreviation VARCHAR(2),
+    cep VARCHAR(9),
+    address VARCHAR(255),
+    neighborhood VARCHAR(100),
+    address_number VARCHAR(20),
+    ibge_city_code VARCHAR(10),
+    date_creation TIMESTAMP NOT NULL DEFAULT NOW(),
+    date_update TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS carriers (
+    carrier_id SERIAL PRIMARY KEY,
+    short_name VARCHAR(20) NOT NULL,
+    trade_name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS quotes (
+    quote_id SERIAL PRIMARY KEY,
+    protocolo INTEGER NOT NULL,
+    origin_company_id INTEGER NOT NULL REFERENCES companies (company_id),
+    client_id INTEGER NOT NULL REFERENCES clients (client_id),
+    invoice_value NUMERIC(14, 2) NOT NULL,
+    total_weight NUMERIC(12, 3) NOT NULL,
+    total_packages INTEGER NOT NULL,
+    total_volume NUMERIC(12, 5) NOT NULL,
+    quote_date TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS quote_packages (
+    package_id SERIAL PRIMARY KEY,
+    quote_id INTEGER NOT NULL REFERENCES quotes (quote_id),
+    amount_packages INTEGER NOT NULL DEFAULT 1,
+    weight NUMERIC(12, 3) NOT NULL,
+    length NUMERIC(10, 2) NOT NULL,
+    height NUMERIC(10, 2) NOT NULL,
+    width NUMERIC(10, 2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS quote_responses (
+    response_id SERIAL PRIMARY KEY,
+    quote_id INTEGER NOT NULL REFERENCES quotes (quote_id),
+    carrier_id INTEGER NOT NULL REFERENCES carriers (carrier_id),
+    modal VARCHAR(30),
+    shipping_value NUMERIC(12, 2),
+    deadline_days INTEGER,
+    quote_carrier VARCHAR(100),
+    message TEXT,
+    response_time TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,16 @@
+-- 0002_performance_indexes.sql
+-- Indexes the hot lookups rely on (checked by `python -m db.migrate verify`).
+
+-- Client upsert (ON CONFLICT (code)) and lookup by code: unique index in 0011, after deduplication
+-- inserir_quote: client by CNPJ
+CREATE INDEX IF NOT EXISTS idx_clients_cnpj ON clients (cnpj);
+-- Reference data: carrier by short_name, company by code/CNPJ
+CREATE UNIQUE INDEX IF NOT EXISTS idx_carriers_short_name ON carriers (short_name);
+CREATE INDEX IF NOT EXISTS idx_companies_code ON companies (code);
+CREATE INDEX IF NOT EXISTS idx_companies_cnpj ON companies (cnpj);
+-- Quote details: packages and responses by quote
+CREATE INDEX IF NOT EXISTS idx_quote_responses_quote_id ON quote_responses (quote_id);
+CREATE INDEX IF NOT EXISTS idx_quote_packages_quote_id ON quote_packages (quote_id);
+-- History listings and date ranges on quotes.quote_date: served by idx_quotes_date_id (0003)
+-- Next protocol (MAX(protocolo))
+CREATE INDEX IF NOT EXISTS idx_quotes_protocolo ON quotes (protocolo);
@@ -0,0 +1,12 @@
+-- 0003_consultation_search.sql
+
+-- Trigram index support for substring (ILIKE '%x%') name search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+-- Digits-only CNPJ, so searches match regardless of punctuation
+ALTER TABLE clients ADD COLUMN IF NOT EXISTS cnpj_digits VARCHAR(14)
+    GENERATED ALWAYS AS (regexp_replace(cnpj, '\D', '', 'g')) STORED;
+CREATE INDEX IF NOT EXISTS idx_clients_cnpj_digits ON clients (cnpj_digits);
+CREATE INDEX IF NOT EXISTS idx_clients_name_trgm ON clients USING gin (name gin_trgm_ops);
+-- Keyset pagination order and sargable date ranges
+CREATE INDEX IF NOT EXISTS idx_quotes_date_id ON quotes (quote_date DESC, quote_id DESC);
+CREATE INDEX IF NOT EXISTS idx_quotes_client_date_id ON quotes (client_id, quote_date DESC, quote_id DESC);
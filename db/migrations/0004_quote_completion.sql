@@ -0,0 +1,4 @@
+-- 0004_quote_completion.sql
+
+-- Set once every carrier has answered; completed quotes never change again
+ALTER TABLE quotes ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP;
@@ -0,0 +1,11 @@
+-- 0005_partition_keys.sql
+-- Child tables carry their quote's date as partition key; filled at insert time.
+-- The conversion to partitioned tables is a separate, explicit step (python -m db.partitions convert).
+
+ALTER TABLE quote_responses ADD COLUMN IF NOT EXISTS quote_date TIMESTAMP;
+ALTER TABLE quote_packages ADD COLUMN IF NOT EXISTS quote_date TIMESTAMP;
+
+UPDATE quote_responses qr SET quote_date = q.quote_date FROM quotes q
+WHERE qr.quote_id = q.quote_id AND qr.quote_date IS NULL;
+UPDATE quote_packages qp SET quote_date = q.quote_date FROM quotes q
+WHERE qp.quote_id = q.quote_id AND qp.quote_date IS NULL;
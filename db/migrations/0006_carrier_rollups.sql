@@ -0,0 +1,26 @@
+-- 0006_carrier_rollups.sql
+-- Carrier analytics rollups (maintained by db.rollups)
+
+CREATE TABLE IF NOT EXISTS carrier_daily_rollups (
+    carrier_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    dest_uf VARCHAR(2) NOT NULL,
+    weight_band VARCHAR(16) NOT NULL,
+    response_count INTEGER NOT NULL,
+    success_count INTEGER NOT NULL,
+    min_freight NUMERIC(12, 2),
+    avg_freight NUMERIC(12, 2),
+    p50_freight NUMERIC(12, 2),
+    min_deadline INTEGER,
+    avg_deadline NUMERIC(6, 2),
+    p50_deadline NUMERIC(6, 2),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (carrier_id, day, dest_uf, weight_band)
+);
+CREATE INDEX IF NOT EXISTS idx_carrier_daily_rollups_day ON carrier_daily_rollups (day);
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name VARCHAR(64) PRIMARY KEY,
+    last_response_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,25 @@
+-- 0007_quote_notifications.sql
+-- NOTIFY quote_events on quote insert and completion (consumed by services.quote_events).
+-- Payload: {"event": "created" | "completed", "quote_id": <id>}
+
+CREATE OR REPLACE FUNCTION notify_quote_event() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('quote_events', json_build_object(
+        'event', CASE WHEN TG_OP = 'INSERT' THEN 'created' ELSE 'completed' END,
+        'quote_id', NEW.quote_id
+    )::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_quotes_notify_created ON quotes;
+CREATE TRIGGER trg_quotes_notify_created
+    AFTER INSERT ON quotes
+    FOR EACH ROW EXECUTE FUNCTION notify_quote_event();
+
+DROP TRIGGER IF EXISTS trg_quotes_notify_completed ON quotes;
+CREATE TRIGGER trg_quotes_notify_completed
+    AFTER UPDATE OF completed_at ON quotes
+    FOR EACH ROW
+    WHEN (OLD.completed_at IS NULL AND NEW.completed_at IS NOT NULL)
+    EXECUTE FUNCTION notify_quote_event();
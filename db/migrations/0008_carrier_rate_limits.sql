@@ -0,0 +1,18 @@
+-- 0008_carrier_rate_limits.sql
+-- Shared token buckets for outbound carrier calls (RATE_LIMIT_BACKEND=postgres)
+-- and daily call counters per carrier for quota tracking (services.rate_limit)
+
+CREATE TABLE IF NOT EXISTS carrier_rate_buckets (
+    carrier_code VARCHAR(10) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE TABLE IF NOT EXISTS carrier_call_counts (
+    carrier_code VARCHAR(10) NOT NULL,
+    day DATE NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (carrier_code, day)
+);
@@ -0,0 +1,5 @@
+-- 0009_quote_status.sql
+-- Quotation job status: pending (saved) -> running (carriers being called) -> complete
+
+ALTER TABLE quotes ADD COLUMN IF NOT EXISTS status VARCHAR(16) NOT NULL DEFAULT 'pending';
+UPDATE quotes SET status = 'complete' WHERE completed_at IS NOT NULL AND status <> 'complete';
@@ -0,0 +1,16 @@
+-- 0010_shared_state.sql
+-- State shared by every worker process: API access tokens (services.shared_state) and
+-- SocketIO messages too large for a NOTIFY payload (services.socketio_pg)
+
+CREATE TABLE IF NOT EXISTS shared_tokens (
+    name VARCHAR(64) PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS socketio_messages (
+    message_id BIGSERIAL PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
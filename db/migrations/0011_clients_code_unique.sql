@@ -0,0 +1,26 @@
+-- 0011_clients_code_unique.sql
+-- Unique client code, required by the client upsert (ON CONFLICT (code)) and moved here from 0002.
+-- Schema only: while rows still share a code the migration refuses to run and lists them.
+-- Merge them explicitly first (dry run without --apply):
+--     python -m db.clientes merge-duplicate-codes --apply
+
+DO $$
+DECLARE
+    duplicates TEXT;
+BEGIN
+    SELECT string_agg(format('%s (client_ids %s)', code, client_ids), '; ' ORDER BY code)
+    INTO duplicates
+    FROM (
+        SELECT code, string_agg(client_id::text, ', ' ORDER BY client_id) AS client_ids
+        FROM clients
+        GROUP BY code
+        HAVING COUNT(*) > 1
+    ) dup;
+
+    IF duplicates IS NOT NULL THEN
+        RAISE EXCEPTION 'Duplicate client codes: %', duplicates
+            USING HINT = 'Merge them with: python -m db.clientes merge-duplicate-codes --apply';
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_code ON clients (code);
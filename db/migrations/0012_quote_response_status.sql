@@ -0,0 +1,7 @@
+-- 0012_quote_response_status.sql
+
+-- Outcome of each carrier call: 'answered' (the carrier's result) or 'cancelled' (killed because
+-- the requester left, CANCEL_ON_DISCONNECT). Cancelled rows only record that the carrier was
+-- called; rollups, exports and quote details read answered rows.
+ALTER TABLE quote_responses ADD COLUMN IF NOT EXISTS status VARCHAR(16) NOT NULL DEFAULT 'answered'
+    CHECK (status IN ('answered', 'cancelled'));
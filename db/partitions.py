@@ -0,0 +1,328 @@
+# db/partitions.py
+"""
+Monthly range partitioning of quote_responses and quote_packages on quote_date.
+
+Both tables carry a copy of their quote's quote_date (filled at insert time), which is
+the partition key. Queries join on (quote_id, quote_date) so Postgres can prune partitions.
+A DEFAULT partition ({table}_default) takes rows of months without a partition yet (the
+maintenance job not running), so inserts never fail; ensure moves them into their month.
+
+    python -m db.partitions convert           # one-off: turn the existing tables into partitioned ones
+    python -m db.partitions ensure            # create the upcoming monthly partitions
+    python -m db.partitions archive           # detach + archive partitions older than the retention
+    python -m db.partitions restore 2023-01   # bring an archived month back
+"""
+import os
+import sys
+import gzip
+import datetime
+import logging
+from db.connection import get_db_connection
+from config import CurrentConfig # Import configuration
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ['quote_responses', 'quote_packages']
+
+def _month_start(day):
+    """First day of the month containing day."""
+    return datetime.date(day.year, day.month, 1)
+
+def _add_months(month, count):
+    """Shifts a first-of-month date by count months (count may be negative)."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table, month):
+    """Name of the partition holding the given month, e.g. quote_responses_p202401."""
+    return f"{table}_p{month.year}{month.month:02d}"
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+def _parse_partition_month(table, name):
+    """Inverse of partition_name; returns None for names not created by this module."""
+    suffix = name[len(table) + 2:] if name.startswith(f"{table}_p") else ''
+    if len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return datetime.date(int(suffix[:4]), int(suffix[4:]), 1)
+
+def _is_partitioned(cur, table):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s);", (table,))
+    row = cur.fetchone()
+    return bool(row) and row['relkind'] == 'p'
+
+def _list_partitions(cur, table):
+    """Returns {month: partition_name} of the partitions currently attached to table."""
+    cur.execute("""
+        SELECT child.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class child ON i.inhrelid = child.oid
+        WHERE i.inhparent = to_regclass(%s);
+    """, (table,))
+    partitions = {}
+    for row in cur.fetchall():
+        month = _parse_partition_month(table, row['name'])
+        if month:
+            partitions[month] = row['name']
+    return partitions
+
+def _has_default_partition(cur, table):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL AS present;", (default_partition_name(table),))
+    return cur.fetchone()['present']
+
+def _default_partition_months(cur, table):
+    """Months (first-of-month dates) of the rows currently in the DEFAULT partition."""
+    cur.execute(f"SELECT DISTINCT date_trunc('month', quote_date)::date AS month FROM {default_partition_name(table)};")
+    return {row['month'] for row in cur.fetchall()}
+
+def _create_default_partition(cur, table):
+    name = default_partition_name(table)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} DEFAULT;")
+    return name
+
+def _create_partition(cur, table, month):
+    """
+    Creates the partition of a month. Rows of that month already in the DEFAULT partition
+    are moved into it (Postgres refuses the new partition while the default holds them).
+    """
+    name = partition_name(table, month)
+    bounds = (month, _add_months(month, 1))
+    default = default_partition_name(table)
+    pending = False
+    if _has_default_partition(cur, table):
+        cur.execute(f"""
+            SELECT EXISTS (SELECT 1 FROM {default} WHERE quote_date >= %s AND quote_date < %s) AS pending;
+        """, bounds)
+        pending = cur.fetchone()['pending']
+    if pending:
+        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {default};")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table}
+        FOR VALUES FROM (%s) TO (%s);
+    """, bounds)
+    if pending:
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM {default} WHERE quote_date >= %s AND quote_date < %s RETURNING *
+            )
+            INSERT INTO {table} OVERRIDING SYSTEM VALUE SELECT * FROM moved;
+        """, bounds)
+        logger.info(f"{cur.rowcount} rows moved from {default} into {name}.")
+        cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT;")
+    return name
+
+def ensure_partitions(months_ahead=None):
+    """
+    Creates the partitions for the current month and the next months_ahead months (and the
+    DEFAULT partition when missing), moving rows parked in the DEFAULT partition into them.
+    """
+    months_ahead = CurrentConfig.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = _month_start(datetime.date.today())
+    created = []
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                for table in PARTITIONED_TABLES:
+                    if not _is_partitioned(cur, table):
+                        logger.warning(f"Table {table} is not partitioned yet (run 'python -m db.partitions convert'). Skipping.")
+                        continue
+                    if not _has_default_partition(cur, table):
+                        created.append(_create_default_partition(cur, table))
+                    existing = _list_partitions(cur, table)
+                    # Upcoming months, plus past months whose rows were parked in the DEFAULT partition
+                    months = {_add_months(current, offset) for offset in range(months_ahead + 1)}
+                    months.update(_default_partition_months(cur, table))
+                    for month in sorted(months):
+                        if month not in existing:
+                            created.append(_create_partition(cur, table, month))
+                conn.commit()
+        if created:
+            logger.info(f"Created partitions: {', '.join(created)}")
+        return created
+    except Exception as e:
+        logger.error(f"Error ensuring partitions: {str(e)}", exc_info=True)
+        raise
+
+def _convert_table(cur, table, months_ahead):
+    """Rebuilds one table as a partitioned table, keeping the old one as {table}_legacy."""
+    legacy = f"{table}_legacy"
+    cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE;")
+    cur.execute(f"""
+        UPDATE {table} t SET quote_date = q.quote_date
+        FROM quotes q
+        WHERE t.quote_id = q.quote_id AND t.quote_date IS NULL;
+    """)
+
+    # Primary key columns of the current table; the partition key must join them
+    cur.execute("""
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = to_regclass(%s) AND i.indisprimary;
+    """, (table,))
+    pk_columns = [row['attname'] for row in cur.fetchall()]
+
+    cur.execute(f"ALTER TABLE {table} RENAME TO {legacy};")
+    cur.execute(f"""
+        CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING IDENTITY)
+        PARTITION BY RANGE (quote_date);
+    """)
+    cur.execute(f"ALTER TABLE {table} ALTER COLUMN quote_date SET NOT NULL;")
+    if pk_columns:
+        cur.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({', '.join(pk_columns + ['quote_date'])});")
+    cur.execute(f"ALTER TABLE {table} ADD FOREIGN KEY (quote_id) REFERENCES quotes (quote_id);")
+    cur.execute(f"CREATE INDEX {table}_quote_id_date_idx ON {table} (quote_id, quote_date);")
+
+    # Serial sequences move to the new table so dropping the legacy one later is safe
+    cur.execute("""
+        SELECT attname, pg_get_serial_sequence(%s, attname) AS seq
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped;
+    """, (legacy, legacy))
+    for row in cur.fetchall():
+        if row['seq']:
+            cur.execute(f"ALTER SEQUENCE {row['seq']} OWNED BY {table}.{row['attname']};")
+
+    cur.execute(f"SELECT MIN(quote_date)::date AS first_day FROM {legacy};")
+    first_day = cur.fetchone()['first_day'] or datetime.date.today()
+    month = _month_start(first_day)
+    last_month = _add_months(_month_start(datetime.date.today()), months_ahead)
+    while month <= last_month:
+        _create_partition(cur, table, month)
+        month = _add_months(month, 1)
+    _create_default_partition(cur, table)
+
+    cur.execute(f"INSERT INTO {table} OVERRIDING SYSTEM VALUE SELECT * FROM {legacy} WHERE quote_date IS NOT NULL;")
+    moved = cur.rowcount
+    cur.execute(f"SELECT COUNT(*) AS orphans FROM {legacy} WHERE quote_date IS NULL;")
+    orphans = cur.fetchone()['orphans']
+
+    # Identity sequences of the new table start over; move them past the copied rows
+    cur.execute("""
+        SELECT attname, pg_get_serial_sequence(%s, attname) AS seq
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped;
+    """, (table, table))
+    for row in cur.fetchall():
+        if row['seq']:
+            cur.execute(f"""
+                SELECT setval(%s, GREATEST((SELECT COALESCE(MAX({row['attname']}), 0) FROM {table}),
+                                           (SELECT last_value FROM {row['seq']})));
+            """, (row['seq'],))
+
+    logger.info(f"{table}: {moved} rows moved into monthly partitions, {orphans} rows without a quote left in {legacy}.")
+
+def convert_to_partitioned(months_ahead=None):
+    """
+    One-off conversion of quote_responses and quote_packages into partitioned tables,
+    in a single transaction. The original tables are kept as *_legacy for verification
+    and can be dropped afterwards.
+    """
+    months_ahead = CurrentConfig.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                for table in PARTITIONED_TABLES:
+                    if _is_partitioned(cur, table):
+                        logger.info(f"Table {table} is already partitioned.")
+                        continue
+                    _convert_table(cur, table, months_ahead)
+                conn.commit()
+    except Exception as e:
+        logger.error(f"Error converting tables to partitioned: {str(e)}", exc_info=True)
+        raise
+
+def _archive_path(archive_dir, table, month):
+    return os.path.join(archive_dir, f"{partition_name(table, month)}.csv.gz")
+
+def archive_old_partitions(retention_months=None, archive_dir=None):
+    """
+    Detaches the partitions older than retention_months, writes each one to a gzip'd CSV
+    in archive_dir and drops it. Each partition is handled in its own transaction; the
+    table is only dropped after its archive file is fully written.
+    Returns the list of archive files written.
+    """
+    retention_months = CurrentConfig.PARTITION_RETENTION_MONTHS if retention_months is None else retention_months
+    archive_dir = archive_dir or CurrentConfig.PARTITION_ARCHIVE_DIR
+    if retention_months <= 0:
+        logger.debug("Partition archival disabled (retention <= 0).")
+        return []
+
+    cutoff = _add_months(_month_start(datetime.date.today()), -retention_months)
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = []
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                for table in PARTITIONED_TABLES:
+                    if not _is_partitioned(cur, table):
+                        continue
+                    partitions = _list_partitions(cur, table)
+                    conn.commit()
+                    for month in sorted(m for m in partitions if m < cutoff):
+                        name = partitions[month]
+                        path = _archive_path(archive_dir, table, month)
+                        tmp_path = f"{path}.tmp"
+                        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name};")
+                        with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+                            cur.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+                        os.replace(tmp_path, path)
+                        cur.execute(f"DROP TABLE {name};")
+                        conn.commit()
+                        archived.append(path)
+                        logger.info(f"Partition {name} archived to {path}.")
+        return archived
+    except Exception as e:
+        logger.error(f"Error archiving partitions: {str(e)}", exc_info=True)
+        raise
+
+def restore_partition(month, archive_dir=None):
+    """
+    Re-creates the partitions of the given month (first-of-month date) from their archive
+    files. Note that the retention job archives them again unless the retention is raised.
+    """
+    archive_dir = archive_dir or CurrentConfig.PARTITION_ARCHIVE_DIR
+    month = _month_start(month)
+    restored = []
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                for table in PARTITIONED_TABLES:
+                    path = _archive_path(archive_dir, table, month)
+                    if not os.path.exists(path):
+                        logger.warning(f"No archive found at {path}.")
+                        continue
+                    if month in _list_partitions(cur, table):
+                        raise ValueError(f"Partição {partition_name(table, month)} já existe.")
+                    name = _create_partition(cur, table, month)
+                    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                        cur.copy_expert(f"COPY {name} FROM STDIN WITH (FORMAT csv, HEADER)", archive)
+                    restored.append(name)
+                conn.commit()
+        logger.info(f"Restored partitions for {month:%Y-%m}: {restored}")
+        return restored
+    except Exception as e:
+        logger.error(f"Error restoring partitions for {month:%Y-%m}: {str(e)}", exc_info=True)
+        raise
+
+def run_maintenance():
+    """Periodic job: creates upcoming partitions and archives the expired ones."""
+    ensure_partitions()
+    archive_old_partitions()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'ensure'
+    if command == 'convert':
+        convert_to_partitioned()
+    elif command == 'ensure':
+        print(f"Created: {ensure_partitions()}")
+    elif command == 'archive':
+        print(f"Archived: {archive_old_partitions()}")
+    elif command == 'restore' and len(sys.argv) > 2:
+        print(f"Restored: {restore_partition(datetime.datetime.strptime(sys.argv[2], '%Y-%m').date())}")
+    else:
+        print("Usage: python -m db.partitions [convert|ensure|archive|restore YYYY-MM]")
+        sys.exit(1)
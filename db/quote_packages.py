@@ -23,21 +23,23 @@ def inserir_quote_packages(quote_id, packages):
                         package.get('Weight'),
                         package.get('Length'),
                         package.get('Height'),
-                        package.get('Width')
+                        package.get('Width'),
+                        quote_id
                     )
                     for package in packages
                 ]
                 
                 # Check for missing essential data before inserting
                 for val in package_values:
-                     if None in val[1:]: # Check if Weight, Length, Height, Width are None
+                     if None in val[1:-1]: # Check if Weight, Length, Height, Width are None
                          logger.error(f"Missing package dimension/weight data for quote_id {quote_id}. Package data: {val}")
                          raise ValueError("Dados dimensionais ou de peso ausentes para um pacote.")
 
                 insert_query = """
                     INSERT INTO quote_packages (
-                        quote_id, amount_packages, weight, length, height, width
-                    ) VALUES (%s, %s, %s, %s, %s, %s);
+                        quote_id, amount_packages, weight, length, height, width,
+                        quote_date -- Partition key, copied from the quote
+                    ) VALUES (%s, %s, %s, %s, %s, %s, (SELECT quote_date FROM quotes WHERE quote_id = %s));
                 """
                 cur.executemany(insert_query, package_values)
                 conn.commit()
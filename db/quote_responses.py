@@ -1,34 +1,34 @@
 # db/quote_responses.py
 import logging
 from db.connection import get_db_connection
-from decimal import Decimal # Import Decimal
+from db.reference_data import reference_cache
+from decimal import Decimal, InvalidOperation # Import Decimal
 
 # Configure logger (assuming configured globally in app.py)
 logger = logging.getLogger(__name__)
 
 def get_carrier_id(carrier_identifier):
-    """Gets the carrier_id by its short_name (identifier)."""
+    """Gets the carrier_id by its short_name (identifier), served from the reference data cache."""
     if not carrier_identifier:
         logger.warning("Attempted to get carrier ID with no identifier.")
         return None
 
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT carrier_id FROM carriers WHERE short_name = %s;", (carrier_identifier,))
-                carrier = cur.fetchone()
-                if carrier:
-                    logger.debug(f"Carrier ID {carrier['carrier_id']} found for identifier '{carrier_identifier}'.")
-                    return carrier['carrier_id']
-                else:
-                    logger.error(f"Carrier with short_name '{carrier_identifier}' not found in database.")
-                    return None
+        carrier_id = reference_cache.get_carrier_id(carrier_identifier)
+        if carrier_id:
+            logger.debug(f"Carrier ID {carrier_id} found for identifier '{carrier_identifier}'.")
+        else:
+            logger.error(f"Carrier with short_name '{carrier_identifier}' not found in database.")
+        return carrier_id
     except Exception as e:
         logger.error(f"Error getting carrier_id for '{carrier_identifier}': {str(e)}", exc_info=True)
         raise
 
-def inserir_quote_response(quote_id, response_data):
-    """Inserts a carrier's quote response into the quote_responses table."""
+def inserir_quote_response(quote_id, response_data, status='answered'):
+    """
+    Inserts a carrier's quote response into the quote_responses table.
+    status: 'answered', or 'cancelled' for a call killed before the carrier answered.
+    """
     if not quote_id or not response_data or 'Transportadora' not in response_data:
         logger.error(f"Invalid input for inserting quote response: quote_id={quote_id}, response_data={response_data}")
         return # Or raise error
@@ -72,8 +72,10 @@ def inserir_quote_response(quote_id, response_data):
                 cur.execute("""
                     INSERT INTO quote_responses (
                         quote_id, carrier_id, modal, shipping_value, deadline_days,
-                        quote_carrier, message, response_time -- Assuming response_time is timestamp default NOW()
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, NOW()); 
+                        quote_carrier, message, status, response_time, -- Assuming response_time is timestamp default NOW()
+                        quote_date -- Partition key, copied from the quote
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW(),
+                              (SELECT quote_date FROM quotes WHERE quote_id = %s)); 
                 """, (
                     quote_id,
                     carrier_id,
@@ -81,7 +83,9 @@ def inserir_quote_response(quote_id, response_data):
                     shipping_value_decimal, # Use Decimal or None
                     deadline_days_int,      # Use Integer or None
                     str(quote_carrier) if quote_carrier is not None else None, # Allow NULL
-                    message
+                    message,
+                    status,
+                    quote_id
                 ))
                 conn.commit()
                 logger.info(f"Response from carrier '{carrier_identifier}' inserted successfully for quote ID: {quote_id}")
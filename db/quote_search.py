@@ -0,0 +1,79 @@
+# db/quote_search.py
+import base64
+import json
+import logging
+import datetime
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(quote_date, quote_id):
+    """Encodes the keyset position (last quote_date, quote_id of a page) as an opaque URL-safe token."""
+    raw = json.dumps([quote_date.isoformat(), quote_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decodes a token produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        quote_date_str, quote_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.datetime.fromisoformat(quote_date_str), int(quote_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError(f"Cursor de paginação inválido: {cursor}") from e
+
+def _parse_date(value, field_name):
+    """Parses a 'YYYY-MM-DD' date. Raises ValueError with a user-facing message."""
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"Data inválida para '{field_name}': {value}. Use AAAA-MM-DD.") from e
+
+def _escape_like(value):
+    """Escapes LIKE wildcards so user input is matched literally."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def normalize_page_size(limit):
+    """Clamps the requested page size to [1, MAX_PAGE_SIZE]."""
+    try:
+        limit = int(limit) if limit else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def build_search_conditions(filters):
+    """
+    Translates consultation filters into index-friendly SQL conditions.
+    filters: dict with optional keys 'code', 'cnpj', 'name', 'date_from', 'date_to' and legacy 'date'.
+    Returns (list_of_conditions, params). Raises ValueError for invalid input.
+    """
+    conditions = []
+    params = {}
+
+    if filters.get('code'):
+        conditions.append("c.code = %(code)s")
+        params['code'] = filters['code']
+
+    if filters.get('cnpj'):
+        cnpj_digits = ''.join(filter(str.isdigit, filters['cnpj']))
+        if cnpj_digits:
+            conditions.append("c.cnpj_digits = %(cnpj)s") # Normalized column, any input format matches
+            params['cnpj'] = cnpj_digits
+
+    if filters.get('name'):
+        conditions.append("c.name ILIKE %(name)s") # Served by the trigram index
+        params['name'] = f"%{_escape_like(filters['name'])}%"
+
+    # Legacy single-day filter maps to a one-day range
+    date_from = filters.get('date_from') or filters.get('date')
+    date_to = filters.get('date_to') or filters.get('date')
+    if date_from:
+        conditions.append("q.quote_date >= %(date_from)s")
+        params['date_from'] = _parse_date(date_from, 'date_from')
+    if date_to:
+        # Half-open range keeps the predicate sargable on quote_date
+        conditions.append("q.quote_date < %(date_to_exclusive)s")
+        params['date_to_exclusive'] = _parse_date(date_to, 'date_to') + datetime.timedelta(days=1)
+
+    return conditions, params
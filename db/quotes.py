@@ -1,6 +1,10 @@
 # db/quotes.py
 import logging
-from db.connection import get_db_connection
+from db.connection import get_db_connection, get_read_connection, numeric_as_number
+from services.metrics import metrics
+from config import CurrentConfig # Import configuration
+from db.reference_data import reference_cache
+from db.quote_search import build_search_conditions, decode_cursor, encode_cursor, normalize_page_size
 from decimal import Decimal
 
 # Configure logger (assuming configured globally in app.py)
@@ -43,13 +47,11 @@ def inserir_quote(quote_data):
                     raise LookupError(f"Cliente com CNPJ {quote_data['cli_cnpj']} não encontrado.")
                 client_id = client['client_id']
 
-                # Get origin_company_id using comp_cnpj
-                cur.execute("SELECT company_id FROM companies WHERE cnpj = %s;", (quote_data['comp_cnpj'],))
-                company = cur.fetchone()
-                if not company:
+                # Get origin_company_id using comp_cnpj (reference data cache)
+                company_id = reference_cache.get_company_id_by_cnpj(quote_data['comp_cnpj'])
+                if not company_id:
                     logger.error(f"Company with CNPJ {quote_data['comp_cnpj']} not found.")
                     raise LookupError(f"Empresa de origem com CNPJ {quote_data['comp_cnpj']} não encontrada.")
-                company_id = company['company_id']
 
                 logger.info(f"Inserting quote with Protocol: {quote_data['protocolo']} for client {client_id}, company {company_id}")
 
@@ -82,26 +84,43 @@ def inserir_quote(quote_data):
         # Consider rolling back if necessary
         raise
 
-def _decimal_to_float_or_int(obj):
+def marcar_quote_concluida(quote_id, status='complete'):
     """
-    Recursively convert Decimal objects to float or int (if no fractional part).
-    Handles lists and dicts.
+    Marks a quote as finished (all carriers answered, or cancelled). Finished quotes are immutable.
+    status: 'complete' or 'cancelled'.
     """
-    if isinstance(obj, list):
-        return [_decimal_to_float_or_int(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {k: _decimal_to_float_or_int(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        # Convert to int if the decimal has no fractional part, otherwise float
-        return int(obj) if obj % 1 == 0 else float(obj)
-    else:
-        return obj
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE quotes SET completed_at = NOW(), status = %s
+                    WHERE quote_id = %s AND completed_at IS NULL;
+                """, (status, quote_id))
+                conn.commit()
+                logger.info(f"Quote {quote_id} marked as {status}.")
+    except Exception as e:
+        logger.error(f"Error marking quote {quote_id} as complete: {str(e)}", exc_info=True)
+        raise
+
+def atualizar_status_quote(quote_id, status):
+    """Updates the job status of a quote ('pending', 'running'); completion goes through marcar_quote_concluida."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE quotes SET status = %s
+                    WHERE quote_id = %s AND completed_at IS NULL;
+                """, (status, quote_id))
+                conn.commit()
+    except Exception as e:
+        logger.error(f"Error updating status of quote {quote_id}: {str(e)}", exc_info=True)
+        raise
 
 def get_last_quotations(limit=15):
     """Retrieves the most recent quotations."""
     try:
         logger.info(f"Retrieving last {limit} quotations.")
-        with get_db_connection() as conn:
+        with get_read_connection('last_quotations') as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT 
@@ -109,183 +128,180 @@ def get_last_quotations(limit=15):
                         q.invoice_value, q.total_packages, q.total_volume, q.quote_date
                     FROM quotes q
                     JOIN clients c ON q.client_id = c.client_id
-                    ORDER BY q.quote_date DESC
+                    ORDER BY q.quote_date DESC, q.quote_id DESC
                     LIMIT %s;
                 """, (limit,))
                 results = cur.fetchall()
                 logger.info(f"Retrieved {len(results)} recent quotations.")
-                # Convert Decimal types for JSON serialization/template rendering
-                return _decimal_to_float_or_int(results)
+                return results # NUMERIC values already cast to int/float (read connection)
     except Exception as e:
         logger.error(f"Error retrieving last quotations: {str(e)}", exc_info=True)
         raise
 
-def filter_quotations(filters):
+def get_quotation_summary(quote_id):
+    """Retrieves a single quotation with the same columns as the consultation list (primary)."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                numeric_as_number(cur) # Same values as the list rows (pushed as JSON)
+                cur.execute("""
+                    SELECT 
+                        q.quote_id, q.protocolo, c.code, c.name, c.cnpj,
+                        q.invoice_value, q.total_packages, q.total_volume, q.quote_date
+                    FROM quotes q
+                    JOIN clients c ON q.client_id = c.client_id
+                    WHERE q.quote_id = %s;
+                """, (quote_id,))
+                result = cur.fetchone()
+                return dict(result) if result else None
+    except Exception as e:
+        logger.error(f"Error retrieving quotation summary {quote_id}: {str(e)}", exc_info=True)
+        raise
+
+def filter_quotations(filters, cursor=None, limit=None):
     """
-    Filters quotations based on provided criteria.
-    filters: dict with potential keys 'code', 'cnpj', 'name', 'date'.
+    Filters quotations based on provided criteria, using keyset pagination.
+    filters: dict with potential keys 'code', 'cnpj', 'name', 'date_from', 'date_to' (or legacy 'date').
+    cursor: opaque token returned by the previous page (None for the first page).
+    Returns (quotations, next_cursor); next_cursor is None on the last page.
     """
     try:
-        logger.info(f"Filtering quotations with criteria: {filters}")
-        base_query = """
+        logger.info(f"Filtering quotations with criteria: {filters}, cursor: {cursor}")
+        page_size = normalize_page_size(limit)
+        conditions, params = build_search_conditions(filters)
+
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            conditions.append("(q.quote_date, q.quote_id) < (%(cursor_date)s, %(cursor_id)s)")
+            params['cursor_date'] = cursor_date
+            params['cursor_id'] = cursor_id
+
+        where_clause = " AND ".join(conditions) if conditions else "TRUE"
+        params['page_size'] = page_size + 1 # Fetch one extra row to know whether there is a next page
+
+        query = f"""
             SELECT 
                 q.quote_id, q.protocolo, c.code, c.name, c.cnpj,
                 q.invoice_value, q.total_packages, q.total_volume, q.quote_date
             FROM quotes q
             JOIN clients c ON q.client_id = c.client_id
-            WHERE 1=1
+            WHERE {where_clause}
+            ORDER BY q.quote_date DESC, q.quote_id DESC
+            LIMIT %(page_size)s;
         """
-        params = {}
-        
-        if filters.get('code'):
-            base_query += " AND c.code = %(code)s"
-            params['code'] = filters['code']
         
-        if filters.get('cnpj'):
-            # Normalize CNPJ if needed (e.g., remove punctuation) before query
-            cnpj_clean = ''.join(filter(str.isdigit, filters['cnpj']))
-            if cnpj_clean:
-                 base_query += " AND c.cnpj = %(cnpj)s" # Assuming DB stores CNPJ with punctuation
-                 params['cnpj'] = filters['cnpj'] # Use original format if DB expects it, else use cnpj_clean
-                 # Check DB format if issues arise
-        
-        if filters.get('name'):
-            base_query += " AND c.name ILIKE %(name)s"
-            params['name'] = f"%{filters['name']}%"
-        
-        if filters.get('date'):
-            # Ensure date is in 'YYYY-MM-DD' format for comparison
-            try:
-                # Basic validation, can be enhanced
-                validated_date = filters['date'] # Assume YYYY-MM-DD for now
-                base_query += " AND DATE(q.quote_date) = %(date)s"
-                params['date'] = validated_date
-            except ValueError:
-                 logger.warning(f"Invalid date format received for filtering: {filters['date']}")
-                 # Optionally ignore the date filter or return an error
-
-        base_query += " ORDER BY q.quote_date DESC LIMIT 100;" # Limit results for performance
-        
-        with get_db_connection() as conn:
+        with get_read_connection('filter_quotations') as conn:
             with conn.cursor() as cur:
-                cur.execute(base_query, params)
+                cur.execute(query, params)
                 results = cur.fetchall()
-                logger.info(f"Found {len(results)} quotations matching filters.")
-                return _decimal_to_float_or_int(results)
+
+        next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            next_cursor = encode_cursor(last['quote_date'], last['quote_id'])
+
+        logger.info(f"Found {len(results)} quotations matching filters (more: {next_cursor is not None}).")
+        return results, next_cursor
+    except ValueError as ve:
+        logger.warning(f"Invalid filter input: {ve}")
+        raise
     except Exception as e:
         logger.error(f"Error filtering quotations: {str(e)}", exc_info=True)
         raise
 
+# Quote, client, packages and responses in one round trip. Packages and responses are
+# nested with json_agg; unit volume and freight percentage are computed in SQL and
+# numerics are cast to float8 so no Decimal post-processing is needed.
+QUOTE_DETAILS_SQL = """
+    SELECT
+        q.quote_id, q.protocolo, q.invoice_value::float8 AS invoice_value,
+        q.total_weight::float8 AS total_weight, q.total_packages,
+        q.total_volume::float8 AS total_volume, q.quote_date, q.completed_at,
+        json_build_object(
+            'code', c.code, 'name', c.name, 'cnpj', c.cnpj,
+            'number_state_registration', c.number_state_registration, 'city_name', c.city_name, 'state_abbreviation', c.state_abbreviation,
+            'address', c.address, 'address_number', c.address_number,
+            'neighborhood', c.neighborhood, 'cep', c.cep, 'ibge_city_code', c.ibge_city_code
+        ) AS client,
+        COALESCE(pk.packages, '[]'::json) AS packages,
+        COALESCE(rs.responses, '[]'::json) AS responses
+    FROM quotes q
+    JOIN clients c ON q.client_id = c.client_id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'AmountPackages', qp.amount_packages,
+            'Weight', qp.weight::float8,
+            'Length', qp.length::float8,
+            'Height', qp.height::float8,
+            'Width', qp.width::float8,
+            -- Volume per unit for display (cm -> m)
+            'volume_unitario', COALESCE(ROUND((qp.length / 100.0) * (qp.height / 100.0) * (qp.width / 100.0), 5), 0)::float8
+        )) AS packages
+        FROM quote_packages qp
+        WHERE qp.quote_id = q.quote_id AND qp.quote_date = q.quote_date -- Prunes to one partition
+    ) pk ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'response_id', qr.response_id,
+            'carrier_id', qr.carrier_id,
+            'carrier_trade_name', cr.trade_name,
+            'modal', qr.modal,
+            'shipping_value', qr.shipping_value::float8,
+            'deadline_days', qr.deadline_days,
+            'quote_carrier', qr.quote_carrier,
+            'message', qr.message,
+            -- Percentage relative to the quote's invoice value
+            'frete_percent', CASE
+                WHEN qr.shipping_value > 0 AND q.invoice_value > 0
+                THEN ROUND(qr.shipping_value / q.invoice_value * 100, 2)::float8
+                ELSE 0
+            END
+        ) ORDER BY (qr.shipping_value IS NULL), qr.shipping_value) AS responses -- NULLs last, then by value
+        FROM quote_responses qr
+        JOIN carriers cr ON qr.carrier_id = cr.carrier_id
+        WHERE qr.quote_id = q.quote_id AND qr.quote_date = q.quote_date -- Prunes to one partition
+          AND qr.status = 'answered' -- Cancelled calls are not carrier answers
+    ) rs ON TRUE
+    WHERE q.quote_id = %s;
+"""
+
 def get_quote_details(quote_id):
-    """Retrieves comprehensive details for a specific quote ID."""
+    """
+    Retrieves comprehensive details for a specific quote ID in a single query.
+    Served from the read replica; quotes still in progress (or not replicated yet)
+    are re-read from the primary, since the replica may miss their latest responses.
+    """
     try:
         logger.info(f"Retrieving details for quote ID: {quote_id}")
-        with get_db_connection() as conn:
+        with get_read_connection('quote_details') as conn:
             with conn.cursor() as cur:
-                # Get main quote and client data
-                cur.execute("""
-                    SELECT 
-                        q.quote_id, q.protocolo, q.invoice_value, q.total_weight,
-                        q.total_packages, q.total_volume, q.quote_date,
-                        c.code, c.name, c.cnpj, c.city_name, c.state_abbreviation,
-                        c.address, c.address_number, c.neighborhood, c.cep, c.ibge_city_code
-                    FROM quotes q
-                    JOIN clients c ON q.client_id = c.client_id
-                    WHERE q.quote_id = %s;
-                """, (quote_id,))
+                cur.execute(QUOTE_DETAILS_SQL, (quote_id,))
                 quote = cur.fetchone()
-                
-                if not quote:
-                    logger.warning(f"No quote found with ID {quote_id}.")
-                    return None
-                
-                # Get package data
-                cur.execute("""
-                    SELECT qp.amount_packages, qp.weight, qp.length, qp.height, qp.width
-                    FROM quote_packages qp
-                    WHERE qp.quote_id = %s;
-                """, (quote_id,))
-                packages_raw = cur.fetchall()
-                
-                # Get carrier responses, joining with carriers table for name
-                cur.execute("""
-                    SELECT 
-                        qr.response_id, qr.carrier_id, cr.trade_name AS carrier_trade_name, 
-                        qr.modal, qr.shipping_value, qr.deadline_days, qr.quote_carrier, qr.message
-                    FROM quote_responses qr
-                    JOIN carriers cr ON qr.carrier_id = cr.carrier_id
-                    WHERE qr.quote_id = %s
-                    ORDER BY 
-                        CASE WHEN qr.shipping_value IS NULL THEN 1 ELSE 0 END, -- Sort NULLs last
-                        qr.shipping_value ASC; -- Then sort by value ascending
-                """, (quote_id,))
-                responses_raw = cur.fetchall()
-                
-                # Process and structure the data
-                quote_details = _decimal_to_float_or_int(quote) # Convert Decimals in main quote data
-                
-                # Process packages
-                packages = []
-                for pkg_raw in packages_raw:
-                    pkg = _decimal_to_float_or_int(pkg_raw)
-                    try:
-                        # Calculate volume per unit for display (cm -> m)
-                        volume_unitario = (pkg['length'] / 100) * (pkg['height'] / 100) * (pkg['width'] / 100)
-                        pkg['volume_unitario'] = round(volume_unitario, 5) # Add calculated volume
-                    except (TypeError, KeyError):
-                         pkg['volume_unitario'] = 0 # Handle potential missing dimensions
-                         logger.warning(f"Could not calculate volume for package in quote {quote_id}: {pkg_raw}")
-                    packages.append(pkg)
-
-                # Process responses and calculate percentages
-                responses = []
-                valid_shipping_values = [float(resp['shipping_value']) for resp in responses_raw if resp['shipping_value'] is not None and resp['shipping_value'] > 0]
-                # Calculate total shipping value for percentage calculation (sum of valid, non-zero fretes)
-                # total_shipping = sum(valid_shipping_values) if valid_shipping_values else 1.0 # Avoid division by zero
-
-                # --- Alternative Percentage Logic: % relative to the quote's invoice value ---
-                invoice_value = quote_details.get('invoice_value', 0)
-
-                for resp_raw in responses_raw:
-                    resp = _decimal_to_float_or_int(resp_raw)
-                    shipping_value = resp.get('shipping_value')
-                    
-                    # Calculate percentage relative to invoice value
-                    frete_percent = 0
-                    if shipping_value is not None and shipping_value > 0 and invoice_value > 0:
-                         try:
-                             frete_percent = (shipping_value / invoice_value) * 100
-                         except ZeroDivisionError:
-                              frete_percent = 0
 
-                    # Calculate percentage relative to total frete (original logic)
-                    # frete_percent = (shipping_value / total_shipping * 100) if shipping_value is not None and shipping_value > 0 else 0
-                    
-                    resp['frete_percent'] = round(frete_percent, 2) # Add calculated percentage
-                    responses.append(resp)
-
-                # Structure the final output
-                result = {
-                    "quote": quote_details,
-                    "client": { # Extract client details for clarity in template (optional)
-                        "code": quote_details.pop("code"),
-                        "name": quote_details.pop("name"),
-                        "cnpj": quote_details.pop("cnpj"),
-                        "city_name": quote_details.pop("city_name"),
-                        "state_abbreviation": quote_details.pop("state_abbreviation"),
-                        "address": quote_details.pop("address"),
-                        "address_number": quote_details.pop("address_number"),
-                        "neighborhood": quote_details.pop("neighborhood"),
-                        "cep": quote_details.pop("cep"),
-                        "ibge_city_code": quote_details.pop("ibge_city_code")
-                    },
-                    "packages": packages,
-                    "responses": responses
-                }
+        if CurrentConfig.DB_READ_HOST and (not quote or quote['completed_at'] is None):
+            metrics.incr('db.reads.quote_details.in_progress_primary')
+            with get_db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(QUOTE_DETAILS_SQL, (quote_id,))
+                    quote = cur.fetchone()
                 
-                logger.info(f"Successfully retrieved details for quote ID {quote_id}.")
-                return result
+        if not quote:
+            logger.warning(f"No quote found with ID {quote_id}.")
+            return None
+
+        # Structure the final output (json columns are already decoded by psycopg2)
+        quote_details = dict(quote)
+        result = {
+            "client": quote_details.pop("client"),
+            "packages": quote_details.pop("packages"),
+            "responses": quote_details.pop("responses"),
+            "quote": quote_details
+        }
+        
+        logger.info(f"Successfully retrieved details for quote ID {quote_id}.")
+        return result
 
     except Exception as e:
         logger.error(f"Error getting details for quote ID {quote_id}: {str(e)}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
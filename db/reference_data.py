@@ -0,0 +1,125 @@
+# db/reference_data.py
+import threading
+import time
+import logging
+from db.connection import get_db_connection
+from config import CurrentConfig # Import configuration
+from services.metrics import metrics
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel telling every worker to drop its reference data (services.quote_events listens)
+INVALIDATION_CHANNEL = 'reference_data_events'
+
+class ReferenceDataCache:
+    """
+    In-process cache of rarely changing reference data (carriers and companies).
+    Loaded once at startup, refreshed when the TTL expires or on explicit invalidation.
+    """
+
+    # Minimum age of the data before a miss is allowed to trigger a reload
+    MISS_REFRESH_INTERVAL = 30
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._carrier_ids = {}          # short_name -> carrier_id
+        self._companies_by_code = {}    # code -> company row (dict)
+        self._company_ids_by_cnpj = {}  # cnpj -> company_id
+        self._loaded_at = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Loads (or reloads) carriers and companies from the database in a single connection."""
+        logger.info("Loading reference data (carriers, companies) into cache...")
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT carrier_id, short_name FROM carriers;")
+                carriers = cur.fetchall()
+                cur.execute("""
+                    SELECT
+                        company_id, code, name, cnpj, number_state_registration,
+                        city_name, state_abbreviation, cep, address, neighborhood,
+                        address_number, ibge_city_code
+                    FROM companies;
+                """)
+                companies = cur.fetchall()
+
+        with self._lock:
+            self._carrier_ids = {row['short_name']: row['carrier_id'] for row in carriers}
+            self._companies_by_code = {str(row['code']): dict(row) for row in companies}
+            self._company_ids_by_cnpj = {row['cnpj']: row['company_id'] for row in companies}
+            self._loaded_at = time.time()
+        logger.info(f"Reference data loaded: {len(carriers)} carriers, {len(companies)} companies.")
+
+    def invalidate(self):
+        """Forces a reload on the next lookup."""
+        with self._lock:
+            self._loaded_at = 0
+        logger.info("Reference data cache invalidated.")
+
+    def invalidate_all_workers(self):
+        """Invalidates this worker's cache and notifies the other workers to do the same."""
+        self.invalidate()
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"NOTIFY {INVALIDATION_CHANNEL};")
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Could not notify other workers of the reference data invalidation: {e}")
+
+    def _ensure_fresh(self):
+        """Reloads the data if it was never loaded or the TTL expired. Keeps stale data if the reload fails."""
+        if time.time() - self._loaded_at < self.ttl_seconds:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            if not self._loaded_at and not self._carrier_ids:
+                raise # Nothing to serve from
+            logger.error(f"Failed to refresh reference data, serving stale entries: {e}", exc_info=True)
+
+    def _lookup(self, mapping_name, key):
+        """Looks up a key, refreshing once on a miss (the row may have been added after the last load)."""
+        self._ensure_fresh()
+        value = getattr(self, mapping_name).get(key)
+        if value is None and time.time() - self._loaded_at > self.MISS_REFRESH_INTERVAL:
+            self.invalidate()
+            self._ensure_fresh()
+            value = getattr(self, mapping_name).get(key)
+        if value is None:
+            self.misses += 1
+            metrics.incr('reference_cache.misses')
+        else:
+            self.hits += 1
+            metrics.incr('reference_cache.hits')
+        return value
+
+    def get_carrier_id(self, short_name):
+        """Returns the carrier_id for a carrier short_name, or None if unknown."""
+        return self._lookup('_carrier_ids', short_name)
+
+    def get_company_by_code(self, code):
+        """Returns a copy of the company row for the given code, or None if unknown."""
+        company = self._lookup('_companies_by_code', str(code))
+        return dict(company) if company else None
+
+    def get_company_id_by_cnpj(self, cnpj):
+        """Returns the company_id for the given CNPJ, or None if unknown."""
+        return self._lookup('_company_ids_by_cnpj', cnpj)
+
+    def stats(self):
+        """Returns hit/miss counters and cache age."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "carriers": len(self._carrier_ids),
+            "companies": len(self._companies_by_code),
+            "age_seconds": round(time.time() - self._loaded_at, 1) if self._loaded_at else None
+        }
+
+# Process-wide cache instance
+reference_cache = ReferenceDataCache(CurrentConfig.REFERENCE_CACHE_TTL)
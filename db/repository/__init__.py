@@ -0,0 +1,43 @@
+# db/repository/__init__.py
+"""
+Repository used by the quoting pipeline, selected by QUOTE_REPOSITORY:
+'postgres' (default) or 'memory' (in-process, for benchmarks and load tests).
+"""
+import threading
+from config import CurrentConfig # Import configuration
+from db.repository.base import QuoteRepository
+
+# Client seeded in the memory repository; benchmarks/load_test.py puts it in the session
+LOAD_TEST_CLIENT = {'code': 'LOADTEST', 'cnpj': '11.111.111/0001-11', 'name': 'Cliente Teste de Carga',
+                    'cep': '85501000', 'ibge_city_code': '4118501', 'number_state_registration': 'ISENTO'}
+
+_repository = None
+_lock = threading.Lock()
+
+def create_repository(kind=None):
+    """Builds a new repository of the given kind (defaults to QUOTE_REPOSITORY)."""
+    kind = (kind or CurrentConfig.QUOTE_REPOSITORY).lower()
+    if kind == 'postgres':
+        from db.repository.postgres import PostgresQuoteRepository
+        return PostgresQuoteRepository()
+    if kind == 'memory':
+        from db.repository.memory import InMemoryQuoteRepository
+        # Origin company and carriers the pipeline expects to find
+        return InMemoryQuoteRepository(
+            companies=[{'code': CurrentConfig.DEFAULT_COMPANY_CODE, 'cnpj': CurrentConfig.ESM_CUSTOMER_CNPJ}],
+            carriers=['BTU', 'EPC', 'ESM', 'RTE', 'TNT'] + list(CurrentConfig.SSW_CARRIERS.keys()),
+            clients=[LOAD_TEST_CLIENT],
+            protocolo_start=CurrentConfig.WORKER_ID * 1000000
+        )
+    raise ValueError(f"QUOTE_REPOSITORY inválido: {kind}")
+
+def get_repository():
+    """Process-wide repository instance."""
+    global _repository
+    if _repository is None:
+        with _lock:
+            if _repository is None:
+                _repository = create_repository()
+    return _repository
+
+__all__ = ['QuoteRepository', 'LOAD_TEST_CLIENT', 'create_repository', 'get_repository']
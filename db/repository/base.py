@@ -0,0 +1,49 @@
+# db/repository/base.py
+from abc import ABC, abstractmethod
+
+class QuoteRepository(ABC):
+    """
+    Storage operations used by the quoting pipeline (quotes, packages, responses,
+    clients, companies, carriers). Implementations: PostgresQuoteRepository (production)
+    and InMemoryQuoteRepository (benchmarks/load tests without a database).
+    Every method is abstract: an incomplete implementation fails when instantiated.
+    """
+
+    @abstractmethod
+    def get_next_protocolo(self):
+        """Returns the next protocol number."""
+
+    @abstractmethod
+    def insert_quote(self, quote_data):
+        """Stores a quote (same fields as db.quotes.inserir_quote) and returns its quote_id."""
+
+    @abstractmethod
+    def insert_quote_packages(self, quote_id, packages):
+        """Stores the package list of a quote."""
+
+    @abstractmethod
+    def insert_quote_response(self, quote_id, response_data, status='answered'):
+        """
+        Stores a raw carrier result ('Transportadora', 'frete', 'prazo', ...).
+        status: 'answered', or 'cancelled' for a call killed before the carrier answered.
+        """
+
+    @abstractmethod
+    def set_quote_status(self, quote_id, status):
+        """Updates the job status of an unfinished quote ('pending', 'running')."""
+
+    @abstractmethod
+    def mark_quote_completed(self, quote_id, status='complete'):
+        """Marks a quote as finished (every carrier answered or was cancelled) with the final status."""
+
+    @abstractmethod
+    def upsert_client(self, cliente_dados):
+        """Inserts or updates a client by code. Returns (client_row, changed)."""
+
+    @abstractmethod
+    def get_company_by_code(self, code):
+        """Returns the company row for the code, or None."""
+
+    @abstractmethod
+    def get_carrier_id(self, short_name):
+        """Returns the carrier_id for a carrier short_name, or None."""
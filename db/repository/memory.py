@@ -0,0 +1,142 @@
+# db/repository/memory.py
+import datetime
+import itertools
+import threading
+import logging
+from db.repository.base import QuoteRepository
+from db.clientes import CAMPOS_SINCRONIZADOS
+
+logger = logging.getLogger(__name__)
+
+class InMemoryQuoteRepository(QuoteRepository):
+    """
+    Thread-safe in-process repository with the same contract as the Postgres one.
+    Data lives only as long as the process; meant for benchmarks and load tests.
+    """
+
+    def __init__(self, companies=None, carriers=None, clients=None, protocolo_start=0):
+        self._lock = threading.Lock()
+        self._protocolo = protocolo_start # Distinct per worker, so protocols (job rooms) do not collide
+        self._ids = {name: itertools.count(1) for name in ('quote', 'package', 'response', 'client', 'company', 'carrier')}
+        self.quotes = {}        # quote_id -> quote row
+        self.packages = {}      # quote_id -> [package rows]
+        self.responses = {}     # quote_id -> [response rows]
+        self.clients = {}       # code -> client row
+        self.companies = {}     # code -> company row
+        self.carriers = {}      # short_name -> carrier_id
+        for company in companies or []:
+            self.add_company(company)
+        for short_name in carriers or []:
+            self.add_carrier(short_name)
+        for client in clients or []:
+            self.upsert_client(client)
+
+    def add_company(self, company):
+        """Seeds a company (dict with at least 'code' and 'cnpj')."""
+        with self._lock:
+            row = {'company_id': next(self._ids['company']), **company}
+            self.companies[str(company['code'])] = row
+            return row
+
+    def add_carrier(self, short_name):
+        """Seeds a carrier and returns its carrier_id."""
+        with self._lock:
+            if short_name not in self.carriers:
+                self.carriers[short_name] = next(self._ids['carrier'])
+            return self.carriers[short_name]
+
+    def get_next_protocolo(self):
+        with self._lock:
+            self._protocolo += 1
+            return self._protocolo
+
+    def insert_quote(self, quote_data):
+        with self._lock:
+            client = next((c for c in self.clients.values() if c['cnpj'] == quote_data['cli_cnpj']), None)
+            if not client:
+                raise LookupError(f"Cliente com CNPJ {quote_data['cli_cnpj']} não encontrado.")
+            company = next((c for c in self.companies.values() if c['cnpj'] == quote_data['comp_cnpj']), None)
+            if not company:
+                raise LookupError(f"Empresa de origem com CNPJ {quote_data['comp_cnpj']} não encontrada.")
+            quote_id = next(self._ids['quote'])
+            self.quotes[quote_id] = {
+                'quote_id': quote_id,
+                'protocolo': quote_data['protocolo'],
+                'origin_company_id': company['company_id'],
+                'client_id': client['client_id'],
+                'invoice_value': quote_data['invoice_value'],
+                'total_weight': quote_data['total_weight'],
+                'total_packages': quote_data['total_packages'],
+                'total_volume': quote_data['volume_total'],
+                'quote_date': datetime.datetime.now(),
+                'completed_at': None,
+                'status': 'pending'
+            }
+            return quote_id
+
+    def insert_quote_packages(self, quote_id, packages):
+        with self._lock:
+            self.packages.setdefault(quote_id, []).extend(
+                {'package_id': next(self._ids['package']), 'quote_id': quote_id, **package} for package in packages
+            )
+
+    def insert_quote_response(self, quote_id, response_data, status='answered'):
+        carrier_id = self.get_carrier_id(response_data.get('Transportadora'))
+        if not carrier_id:
+            logger.error(f"Carrier '{response_data.get('Transportadora')}' not found. Response for quote ID {quote_id} will not be inserted.")
+            return
+        with self._lock:
+            self.responses.setdefault(quote_id, []).append({
+                'response_id': next(self._ids['response']),
+                'quote_id': quote_id,
+                'carrier_id': carrier_id,
+                'modal': response_data.get('modal', 'Rodoviário'),
+                'shipping_value': response_data.get('frete'),
+                'deadline_days': response_data.get('prazo'),
+                'quote_carrier': response_data.get('cotacao'),
+                'message': response_data.get('message'),
+                'status': status,
+                'response_time': datetime.datetime.now()
+            })
+
+    def set_quote_status(self, quote_id, status):
+        with self._lock:
+            quote = self.quotes.get(quote_id)
+            if quote and quote['completed_at'] is None:
+                quote['status'] = status
+
+    def mark_quote_completed(self, quote_id, status='complete'):
+        with self._lock:
+            quote = self.quotes.get(quote_id)
+            if quote and quote['completed_at'] is None:
+                quote['completed_at'] = datetime.datetime.now()
+                quote['status'] = status
+
+    def upsert_client(self, cliente_dados):
+        with self._lock:
+            code = str(cliente_dados['code']).strip()
+            existing = self.clients.get(code)
+            if existing is None:
+                # Same CNPJ under another code: recode that client (as the Postgres upsert does)
+                old_code = next((k for k, c in self.clients.items() if c['cnpj'] == cliente_dados.get('cnpj')), None)
+                if old_code is not None:
+                    recoded = self.clients.pop(old_code)
+                    recoded.update({'code': code, **{f: cliente_dados.get(f) for f in CAMPOS_SINCRONIZADOS}})
+                    self.clients[code] = recoded
+                    return {**recoded, 'inserted': False}, True
+                row = {'client_id': next(self._ids['client']), **cliente_dados, 'inserted': True}
+                self.clients[code] = row
+                return dict(row), True
+            changed = any(existing.get(f) != cliente_dados.get(f) for f in CAMPOS_SINCRONIZADOS)
+            if changed:
+                existing.update({f: cliente_dados.get(f) for f in CAMPOS_SINCRONIZADOS})
+            return {**existing, 'inserted': False}, changed
+
+    def get_company_by_code(self, code):
+        with self._lock:
+            company = self.companies.get(str(code))
+            return dict(company) if company else None
+
+    def get_carrier_id(self, short_name):
+        with self._lock:
+            return self.carriers.get(short_name)
@@ -0,0 +1,37 @@
+# db/repository/postgres.py
+from db.repository.base import QuoteRepository
+from db.quotes import inserir_quote, get_next_protocolo, marcar_quote_concluida, atualizar_status_quote
+from db.quote_packages import inserir_quote_packages
+from db.quote_responses import inserir_quote_response, get_carrier_id
+from db.clientes import upsert_cliente
+from db.company import get_company_by_code
+
+class PostgresQuoteRepository(QuoteRepository):
+    """Repository backed by the existing psycopg2 functions in the db package."""
+
+    def get_next_protocolo(self):
+        return get_next_protocolo()
+
+    def insert_quote(self, quote_data):
+        return inserir_quote(quote_data)
+
+    def insert_quote_packages(self, quote_id, packages):
+        return inserir_quote_packages(quote_id, packages)
+
+    def insert_quote_response(self, quote_id, response_data, status='answered'):
+        return inserir_quote_response(quote_id, response_data, status)
+
+    def set_quote_status(self, quote_id, status):
+        return atualizar_status_quote(quote_id, status)
+
+    def mark_quote_completed(self, quote_id, status='complete'):
+        return marcar_quote_concluida(quote_id, status)
+
+    def upsert_client(self, cliente_dados):
+        return upsert_cliente(cliente_dados)
+
+    def get_company_by_code(self, code):
+        return get_company_by_code(code)
+
+    def get_carrier_id(self, short_name):
+        return get_carrier_id(short_name)
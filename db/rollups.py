@@ -0,0 +1,195 @@
+# db/rollups.py
+"""
+Incrementally maintained carrier analytics.
+
+A periodic job folds new quote_responses (tracked by a high-water mark on response_id)
+into carrier_daily_rollups, keyed by carrier, day, destination UF and weight band.
+Only the keys touched by the new responses are recomputed, so the cost of a run depends
+on the new data, not on the size of quote_responses.
+
+Run once from the command line with:
+    python -m db.rollups
+"""
+import logging
+from db.connection import get_db_connection, get_read_connection
+from config import CurrentConfig # Import configuration
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = 'carrier_daily'
+
+# Responses younger than this are left for the next run, so rows committed out of
+# response_id order (concurrent inserts) are not skipped by the high-water mark.
+SETTLE_SECONDS = 30
+
+# Weight bands (kg) on the quote's total weight
+WEIGHT_BANDS = ['0-10', '10-30', '30-100', '100-300', '300+']
+WEIGHT_BAND_SQL = """
+    CASE
+        WHEN q.total_weight <= 10 THEN '0-10'
+        WHEN q.total_weight <= 30 THEN '10-30'
+        WHEN q.total_weight <= 100 THEN '30-100'
+        WHEN q.total_weight <= 300 THEN '100-300'
+        ELSE '300+'
+    END
+"""
+
+_REFRESH_KEYS_SQL = f"""
+    WITH touched AS (
+        SELECT DISTINCT
+            qr.carrier_id, q.quote_date::date AS day,
+            COALESCE(c.state_abbreviation, '??') AS dest_uf, {WEIGHT_BAND_SQL} AS weight_band
+        FROM quote_responses qr
+        JOIN quotes q ON qr.quote_id = q.quote_id AND qr.quote_date = q.quote_date
+        JOIN clients c ON q.client_id = c.client_id
+        WHERE qr.response_id > %(from_id)s AND qr.response_id <= %(to_id)s
+          AND qr.status = 'answered' -- Cancelled calls are not carrier answers
+    ),
+    agg AS (
+        SELECT
+            qr.carrier_id, q.quote_date::date AS day,
+            COALESCE(c.state_abbreviation, '??') AS dest_uf, {WEIGHT_BAND_SQL} AS weight_band,
+            COUNT(*) AS response_count,
+            COUNT(*) FILTER (WHERE qr.shipping_value > 0) AS success_count,
+            MIN(qr.shipping_value) FILTER (WHERE qr.shipping_value > 0) AS min_freight,
+            AVG(qr.shipping_value) FILTER (WHERE qr.shipping_value > 0) AS avg_freight,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY qr.shipping_value)
+                FILTER (WHERE qr.shipping_value > 0) AS p50_freight,
+            MIN(qr.deadline_days) FILTER (WHERE qr.shipping_value > 0) AS min_deadline,
+            AVG(qr.deadline_days) FILTER (WHERE qr.shipping_value > 0) AS avg_deadline,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY qr.deadline_days)
+                FILTER (WHERE qr.shipping_value > 0 AND qr.deadline_days IS NOT NULL) AS p50_deadline
+        FROM quote_responses qr
+        JOIN quotes q ON qr.quote_id = q.quote_id AND qr.quote_date = q.quote_date
+        JOIN clients c ON q.client_id = c.client_id
+        -- Day bounds keep the recomputation on the quote_date index and prune partitions
+        WHERE qr.status = 'answered'
+          AND qr.quote_date >= (SELECT MIN(day) FROM touched)
+          AND qr.quote_date < (SELECT MAX(day) FROM touched) + 1
+          AND (qr.carrier_id, q.quote_date::date, COALESCE(c.state_abbreviation, '??'), {WEIGHT_BAND_SQL})
+              IN (SELECT carrier_id, day, dest_uf, weight_band FROM touched)
+        GROUP BY 1, 2, 3, 4
+    )
+    INSERT INTO carrier_daily_rollups (
+        carrier_id, day, dest_uf, weight_band, response_count, success_count,
+        min_freight, avg_freight, p50_freight, min_deadline, avg_deadline, p50_deadline, updated_at
+    )
+    SELECT
+        carrier_id, day, dest_uf, weight_band, response_count, success_count,
+        min_freight, avg_freight, p50_freight, min_deadline, avg_deadline, p50_deadline, NOW()
+    FROM agg
+    ON CONFLICT (carrier_id, day, dest_uf, weight_band) DO UPDATE SET
+        response_count = EXCLUDED.response_count,
+        success_count = EXCLUDED.success_count,
+        min_freight = EXCLUDED.min_freight,
+        avg_freight = EXCLUDED.avg_freight,
+        p50_freight = EXCLUDED.p50_freight,
+        min_deadline = EXCLUDED.min_deadline,
+        avg_deadline = EXCLUDED.avg_deadline,
+        p50_deadline = EXCLUDED.p50_deadline,
+        updated_at = NOW();
+"""
+
+def refresh_carrier_rollups(batch_size=None):
+    """
+    Folds the next batch of settled responses into the rollups.
+    Returns the number of response IDs advanced (0 when already caught up).
+    Safe to run from several workers: the state row is locked for the duration of the run.
+    """
+    batch_size = batch_size or CurrentConfig.ROLLUP_BATCH_SIZE
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("INSERT INTO rollup_state (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;", (ROLLUP_NAME,))
+                cur.execute("SELECT last_response_id FROM rollup_state WHERE name = %s FOR UPDATE;", (ROLLUP_NAME,))
+                from_id = cur.fetchone()['last_response_id']
+
+                cur.execute("""
+                    SELECT MAX(response_id) AS max_id FROM (
+                        SELECT response_id FROM quote_responses
+                        WHERE response_id > %s AND response_time < NOW() - %s * INTERVAL '1 second'
+                        ORDER BY response_id
+                        LIMIT %s
+                    ) batch;
+                """, (from_id, SETTLE_SECONDS, batch_size))
+                to_id = cur.fetchone()['max_id']
+                if not to_id:
+                    conn.commit()
+                    logger.debug("Carrier rollups already up-to-date.")
+                    return 0
+
+                cur.execute(_REFRESH_KEYS_SQL, {'from_id': from_id, 'to_id': to_id})
+                keys_updated = cur.rowcount
+                cur.execute("""
+                    UPDATE rollup_state SET last_response_id = %s, updated_at = NOW() WHERE name = %s;
+                """, (to_id, ROLLUP_NAME))
+                conn.commit()
+                logger.info(f"Carrier rollups refreshed: responses ({from_id}, {to_id}], {keys_updated} keys updated.")
+                return to_id - from_id
+    except Exception as e:
+        logger.error(f"Error refreshing carrier rollups: {str(e)}", exc_info=True)
+        raise
+
+def refresh_until_caught_up():
+    """Runs refresh batches until no settled responses are left."""
+    total = 0
+    while True:
+        advanced = refresh_carrier_rollups()
+        if not advanced:
+            return total
+        total += advanced
+
+def get_carrier_stats(date_from, date_to, dest_uf=None, weight_band=None):
+    """
+    Aggregates the daily rollups over [date_from, date_to] per carrier, UF and weight band.
+    Reads only carrier_daily_rollups. p50 values over several days are the
+    success-weighted mean of the daily medians (an approximation).
+    """
+    conditions = ["r.day >= %(date_from)s", "r.day <= %(date_to)s"]
+    params = {'date_from': date_from, 'date_to': date_to}
+    if dest_uf:
+        conditions.append("r.dest_uf = %(dest_uf)s")
+        params['dest_uf'] = dest_uf.upper()
+    if weight_band:
+        conditions.append("r.weight_band = %(weight_band)s")
+        params['weight_band'] = weight_band
+
+    query = f"""
+        SELECT *,
+            RANK() OVER (PARTITION BY dest_uf, weight_band ORDER BY avg_freight NULLS LAST) = 1
+                AND avg_freight IS NOT NULL AS cheapest,
+            RANK() OVER (PARTITION BY dest_uf, weight_band ORDER BY avg_deadline NULLS LAST) = 1
+                AND avg_deadline IS NOT NULL AS fastest
+        FROM (
+            SELECT
+                r.carrier_id, cr.trade_name AS carrier_trade_name, r.dest_uf, r.weight_band,
+                SUM(r.response_count)::int AS responses,
+                SUM(r.success_count)::int AS successes,
+                ROUND(1 - SUM(r.success_count)::numeric / NULLIF(SUM(r.response_count), 0), 4)::float8 AS failure_rate,
+                MIN(r.min_freight)::float8 AS min_freight,
+                ROUND(SUM(r.avg_freight * r.success_count) / NULLIF(SUM(r.success_count), 0), 2)::float8 AS avg_freight,
+                ROUND(SUM(r.p50_freight * r.success_count) / NULLIF(SUM(r.success_count), 0), 2)::float8 AS p50_freight,
+                MIN(r.min_deadline) AS min_deadline,
+                ROUND(SUM(r.avg_deadline * r.success_count) / NULLIF(SUM(r.success_count), 0), 1)::float8 AS avg_deadline,
+                ROUND(SUM(r.p50_deadline * r.success_count) / NULLIF(SUM(r.success_count), 0), 1)::float8 AS p50_deadline
+            FROM carrier_daily_rollups r
+            JOIN carriers cr ON r.carrier_id = cr.carrier_id
+            WHERE {" AND ".join(conditions)}
+            GROUP BY r.carrier_id, cr.trade_name, r.dest_uf, r.weight_band
+        ) stats
+        ORDER BY dest_uf, weight_band, avg_freight NULLS LAST;
+    """
+    try:
+        with get_read_connection('carrier_stats') as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchall()
+    except Exception as e:
+        logger.error(f"Error reading carrier stats: {str(e)}", exc_info=True)
+        raise
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    advanced = refresh_until_caught_up()
+    print(f"Carrier rollups caught up ({advanced} response IDs folded).")
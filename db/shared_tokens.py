@@ -0,0 +1,37 @@
+# db/shared_tokens.py
+import logging
+from db.connection import get_db_connection
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+def get_shared_token(name):
+    """Returns (token, expires_at as epoch seconds) for a shared token that has not expired, or None."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT token, EXTRACT(EPOCH FROM expires_at)::float8 AS expires_at
+                    FROM shared_tokens WHERE name = %s AND expires_at > NOW();
+                """, (name,))
+                row = cur.fetchone()
+                return (row['token'], row['expires_at']) if row else None
+    except Exception as e:
+        logger.error(f"Error reading shared token '{name}': {str(e)}")
+        raise
+
+def save_shared_token(name, token, expires_at):
+    """Stores a token (expires_at as epoch seconds) for every worker."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO shared_tokens (name, token, expires_at)
+                    VALUES (%s, %s, to_timestamp(%s))
+                    ON CONFLICT (name) DO UPDATE SET
+                        token = EXCLUDED.token, expires_at = EXCLUDED.expires_at, updated_at = NOW();
+                """, (name, token, expires_at))
+                conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving shared token '{name}': {str(e)}")
+        raise
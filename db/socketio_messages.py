@@ -0,0 +1,40 @@
+# db/socketio_messages.py
+import logging
+from db.connection import get_db_connection
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must stay under 8000 bytes (UTF-8); larger messages go through socketio_messages
+MAX_NOTIFY_PAYLOAD = 7500
+
+def publish_socketio_message(channel, payload):
+    """
+    Publishes a SocketIO manager message on a NOTIFY channel. Payloads too large for NOTIFY
+    are stored in socketio_messages and announced as 'ref:<message_id>'.
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                if len(payload.encode('utf-8')) > MAX_NOTIFY_PAYLOAD:
+                    # Listeners fetch a stored message right after the notification
+                    cur.execute("DELETE FROM socketio_messages WHERE created_at < NOW() - INTERVAL '5 minutes';")
+                    cur.execute("INSERT INTO socketio_messages (payload) VALUES (%s) RETURNING message_id;", (payload,))
+                    payload = f"ref:{cur.fetchone()['message_id']}"
+                cur.execute("SELECT pg_notify(%s, %s);", (channel, payload))
+                conn.commit()
+    except Exception as e:
+        logger.error(f"Error publishing SocketIO message on {channel}: {str(e)}")
+        raise
+
+def get_socketio_message(message_id):
+    """Returns a stored SocketIO message payload, or None if it was already purged."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT payload FROM socketio_messages WHERE message_id = %s;", (message_id,))
+                row = cur.fetchone()
+                return row['payload'] if row else None
+    except Exception as e:
+        logger.error(f"Error reading SocketIO message {message_id}: {str(e)}")
+        raise
@@ -0,0 +1,70 @@
+# run_workers.py
+"""
+Runs the quotation server as N worker processes, one per port (FLASK_RUN_PORT, +1, ...).
+
+    SOCKETIO_MESSAGE_QUEUE=postgres SHARED_STATE_BACKEND=postgres RATE_LIMIT_BACKEND=postgres \
+        python run_workers.py --workers 4
+
+The workers share rooms through SOCKETIO_MESSAGE_QUEUE, API tokens through SHARED_STATE_BACKEND
+and carrier rate limits through RATE_LIMIT_BACKEND. Only worker 0 runs the singleton jobs
+(rollups, partition maintenance). Quotation jobs (rejoin after reconnecting) and the executor
+limits are per worker, so the load balancer in front must keep each browser on one worker
+(sticky sessions), e.g. nginx:
+
+    upstream cotacoes { ip_hash; server 127.0.0.1:5001; server 127.0.0.1:5002; ... }
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import logging
+from config import CurrentConfig # Import configuration
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s : %(message)s')
+logger = logging.getLogger(__name__)
+
+def start_worker(index, host, port):
+    env = {
+        **os.environ,
+        'WORKER_ID': str(index),
+        'FLASK_RUN_HOST': host,
+        'FLASK_RUN_PORT': str(port),
+        'RUN_SINGLETON_JOBS': '1' if index == 0 else '0',
+        # Worker 0 applies pending migrations; the others would only wait for its lock
+        'MIGRATE_ON_STARTUP': os.environ.get('MIGRATE_ON_STARTUP', '1') if index == 0 else '0',
+    }
+    logger.info(f"Starting worker {index} on {host}:{port}")
+    return subprocess.Popen([sys.executable, 'app.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the quotation server as several worker processes.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default=os.environ.get('FLASK_RUN_HOST', '10.1.5.2'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('FLASK_RUN_PORT', '5001')), help="Port of worker 0")
+    args = parser.parse_args()
+
+    if args.workers > 1 and not CurrentConfig.SOCKETIO_MESSAGE_QUEUE:
+        logger.warning("SOCKETIO_MESSAGE_QUEUE is empty: emits will only reach sockets of the worker that sends them.")
+
+    workers = [start_worker(index, args.host, args.port + index) for index in range(args.workers)]
+
+    def stop(signum, frame):
+        for worker in workers:
+            if worker.poll() is None:
+                worker.send_signal(signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # A worker that exits takes the others down (the process supervisor restarts the set)
+    exit_code = 0
+    while all(worker.poll() is None for worker in workers):
+        time.sleep(1)
+    stop(None, None)
+    for index, worker in enumerate(workers):
+        code = worker.wait()
+        if code and code != -signal.SIGTERM:
+            logger.error(f"Worker {index} exited with code {code}")
+            exit_code = exit_code or code
+    sys.exit(exit_code)
@@ -0,0 +1,61 @@
+# services/caching.py
+import threading
+import logging
+from collections import OrderedDict
+from config import CurrentConfig # Import configuration
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class BoundedCache:
+    """Thread-safe LRU cache with a maximum number of entries."""
+
+    def __init__(self, name, max_entries):
+        self.name = name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Returns the cached value (marking it as recently used) or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        metrics.incr(f"cache.{self.name}.{'hits' if value is not None else 'misses'}")
+        return value
+
+    def set(self, key, value):
+        """Stores a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.incr(f"cache.{self.name}.evictions")
+
+    def delete(self, key):
+        """Removes a single entry, if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Removes every entry whose key matches the predicate."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+# Latest quotations shown on /consultations, keyed by limit. Only used while the
+# quote event listener is connected, since it is what keeps these entries fresh.
+consultation_cache = BoundedCache('consultations', 8)
+
+# Rendered detail pages of completed (immutable) quotes, keyed by (quote_id, variant)
+quote_detail_cache = BoundedCache('quote_details', CurrentConfig.DETAIL_CACHE_MAX_ENTRIES)
@@ -0,0 +1,120 @@
+# services/coalescing.py
+"""
+Coalescing of identical in-flight carrier requests.
+
+When a call with the same key (carrier, variant and normalized request signature) is
+already running, later callers wait for that call's result instead of making their own.
+Each caller gets its own copy of the result, to emit and persist under its own quote.
+If the leading call is killed (its quote was cancelled), the waiting callers retry.
+RequestCoalescer waits on eventlet Events (eventlet serving mode); AsyncRequestCoalescer
+does the same for coroutines (asyncio serving mode) without importing eventlet.
+"""
+import copy
+import asyncio
+import json
+import hashlib
+import threading
+import logging
+from decimal import Decimal
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Sent to the waiting callers when the leading call was killed instead of finishing
+_ABANDONED = object()
+
+# Per-quote fields that do not change what the carrier is asked
+_IGNORED_FIELDS = ('quote_id', 'protocolo')
+
+def _normalize(value):
+    if isinstance(value, Decimal):
+        return str(value.normalize())
+    return str(value)
+
+def request_signature(cotacao_data):
+    """Stable hash of the carrier-relevant quote data (package order does not matter)."""
+    data = {key: value for key, value in cotacao_data.items() if key not in _IGNORED_FIELDS}
+    data['pack'] = sorted(json.dumps(package, sort_keys=True, default=_normalize) for package in data.get('pack', []))
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=_normalize).encode('utf-8')).hexdigest()
+
+class RequestCoalescer:
+    """Coalescer of the eventlet serving mode: followers wait on an eventlet Event."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {} # key -> Event delivering the leader's result
+
+    def run(self, key, func):
+        """Returns func()'s result, sharing a single execution among concurrent callers with the same key."""
+        from eventlet.event import Event # Only this serving mode needs eventlet
+        while True:
+            with self._lock:
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = Event()
+
+            if not leader:
+                result = event.wait()
+                if result is _ABANDONED:
+                    continue # The leader was killed; take over or attach to the next leader
+                metrics.incr('coalescing.coalesced')
+                metrics.incr(f'coalescing.{key[0]}.coalesced')
+                return copy.deepcopy(result)
+
+            metrics.incr('coalescing.leaders')
+            try:
+                result = func()
+            except Exception as e:
+                event.send_exception(e)
+                raise
+            except BaseException: # Killed (GreenletExit)
+                event.send(_ABANDONED)
+                raise
+            else:
+                event.send(result)
+                return copy.deepcopy(result)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+class AsyncRequestCoalescer:
+    """RequestCoalescer for coroutines; must only be used from one event loop."""
+
+    def __init__(self):
+        self._inflight = {} # key -> future delivering (error, result) of the leader
+
+    async def run(self, key, func):
+        """Returns await func(), sharing a single execution among concurrent callers with the same key."""
+        while True:
+            future = self._inflight.get(key)
+            if future is not None:
+                # Shielded: a cancelled follower must not cancel the leader's result
+                result = await asyncio.shield(future)
+                if result is _ABANDONED:
+                    continue # The leader was cancelled; take over or attach to the next leader
+                error, value = result
+                if error is not None:
+                    raise error
+                metrics.incr('coalescing.coalesced')
+                metrics.incr(f'coalescing.{key[0]}.coalesced')
+                return copy.deepcopy(value)
+
+            future = self._inflight[key] = asyncio.get_running_loop().create_future()
+            metrics.incr('coalescing.leaders')
+            try:
+                value = await func()
+            except Exception as e:
+                future.set_result((e, None))
+                raise
+            except BaseException: # Cancelled (CancelledError)
+                future.set_result(_ABANDONED)
+                raise
+            else:
+                future.set_result((None, value))
+                return copy.deepcopy(value)
+            finally:
+                self._inflight.pop(key, None)
+
+# Process-wide coalescer
+carrier_request_coalescer = RequestCoalescer()
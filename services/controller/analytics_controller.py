@@ -0,0 +1,44 @@
+# services/controller/analytics_controller.py
+from flask import render_template, request, jsonify
+from db.rollups import get_carrier_stats, WEIGHT_BANDS
+from services.serialization import json_response
+import datetime
+import logging
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+class AnalyticsController:
+
+    DEFAULT_RANGE_DAYS = 30
+
+    def show_analytics(self):
+        """Renders the carrier analytics page (data is fetched from the JSON endpoint)."""
+        return render_template('analytics.html', weight_bands=WEIGHT_BANDS, now=datetime.datetime.now)
+
+    def carrier_stats(self):
+        """Returns per-carrier price, deadline and failure stats read from the rollup tables."""
+        try:
+            today = datetime.date.today()
+            date_to_str = request.args.get('date_to', '').strip()
+            date_from_str = request.args.get('date_from', '').strip()
+            date_to = datetime.date.fromisoformat(date_to_str) if date_to_str else today
+            date_from = (datetime.date.fromisoformat(date_from_str) if date_from_str
+                         else date_to - datetime.timedelta(days=self.DEFAULT_RANGE_DAYS))
+            dest_uf = request.args.get('uf', '').strip() or None
+            weight_band = request.args.get('weight_band', '').strip() or None
+            if weight_band and weight_band not in WEIGHT_BANDS:
+                raise ValueError(f"Faixa de peso inválida: {weight_band}")
+        except ValueError as ve:
+            return jsonify({'error': f"Parâmetros inválidos: {ve}"}), 400
+
+        try:
+            stats = get_carrier_stats(date_from, date_to, dest_uf, weight_band)
+            return json_response({
+                'date_from': date_from.isoformat(),
+                'date_to': date_to.isoformat(),
+                'stats': stats
+            })
+        except Exception as e:
+            logger.error(f"Error retrieving carrier stats: {str(e)}", exc_info=True)
+            return jsonify({'error': 'Erro interno ao carregar estatísticas.'}), 500
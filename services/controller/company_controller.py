@@ -1,5 +1,5 @@
 # services/controller/company_controller.py
-from db.company import get_company_by_code
+from db.repository import get_repository
 from config import CurrentConfig # Import configuration
 import logging
 
@@ -7,7 +7,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 class CompanyController:
-    def __init__(self):
+    def __init__(self, repository=None):
+        self.repository = repository or get_repository()
         # Get the default company code from configuration
         self.default_company_code = CurrentConfig.DEFAULT_COMPANY_CODE
         logger.info(f"CompanyController initialized with default code: {self.default_company_code}")
@@ -24,7 +25,7 @@ class CompanyController:
              return None
              
         try:
-            company_data = get_company_by_code(code_to_use)
+            company_data = self.repository.get_company_by_code(code_to_use)
             if not company_data:
                 logger.error(f"Company with code {code_to_use} not found in database.")
                 return None
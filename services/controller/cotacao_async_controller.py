@@ -0,0 +1,115 @@
+# services/controller/cotacao_async_controller.py
+import asyncio
+import functools
+import logging
+from config import CurrentConfig # Import configuration
+from services.controller.cotacao_controller import CotacaoController, resultado_recusado, resultado_cancelado
+from services.coalescing import AsyncRequestCoalescer
+from services.rate_limit import carrier_rate_limiter
+from services.metrics import metrics
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+# Coalescer of the asyncio serving mode (lives on the server's event loop)
+async_carrier_request_coalescer = AsyncRequestCoalescer()
+
+class AsyncCotacaoController(CotacaoController):
+    """
+    CotacaoController for the asyncio serving mode (asgi.py). Same stages, deadline and
+    cancellation rules as solicitar_cotacoes, with asyncio tasks instead of greenlets.
+    The carrier adapters and the repository stay blocking and run in threads
+    (carrier calls in the executor's thread pool, database work in the loop's default one).
+    executor: an AsyncQuotationExecutor.
+    """
+
+    async def _blocking(self, func, *args, **kwargs):
+        """Runs a blocking function (database access) in a thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def gerar_protocolo_async(self):
+        return await self._blocking(self.gerar_protocolo)
+
+    async def obter_dados_base_para_cotacao_async(self, client_data, packages_data, invoice_value):
+        return await self._blocking(self.obter_dados_base_para_cotacao, client_data, packages_data, invoice_value)
+
+    async def obter_dados_recotacao_async(self, quote_id):
+        return await self._blocking(self.obter_dados_recotacao, quote_id)
+
+    async def salvar_cotacao_inicial_async(self, cotacao_data_final):
+        return await self._blocking(self.salvar_cotacao_inicial, cotacao_data_final)
+
+    async def solicitar_cotacoes_async(self, quote_id, cotacao_data, socket_callback, job=None, on_deadline=None):
+        """
+        Async counterpart of solicitar_cotacoes. socket_callback and on_deadline are coroutine functions.
+        A cancelled carrier call cannot interrupt its thread: its result is discarded and the
+        call is stored with status 'cancelled'.
+        """
+        run = await self._blocking(self._iniciar_execucao, quote_id, cotacao_data,
+                                   is_done=lambda call: call.done(), kill=lambda call: call.cancel())
+        if run is None:
+            return
+
+        persist_tasks = []
+
+        def persist(status, raw_result):
+            persist_tasks.append(asyncio.ensure_future(self._blocking(self._persistir_resposta, quote_id, raw_result, status)))
+
+        async def handle_carrier_result(task, cotacao_response):
+            accepted = run.accept(task, cotacao_response)
+            if accepted is None:
+                return
+            display_result, raw_result = accepted
+
+            # Stage 2: emit to the room immediately
+            try:
+                with metrics.timer('quotation.stage.emit'):
+                    await socket_callback(display_result)
+            except Exception as e:
+                logger.error(f"Error emitting response from {task.carrier_code} for quote {quote_id}: {e}", exc_info=True)
+
+            # Stage 3: persist in the background
+            if raw_result is not None:
+                persist('answered', raw_result)
+
+        calls = run.start(lambda task: asyncio.ensure_future(self._execute_carrier_request_async(run, task, handle_carrier_result)))
+        def cancel_pending_calls():
+            for task in run.cancel():
+                persist('cancelled', resultado_cancelado(task))
+
+        if job is not None:
+            job.on_cancel(cancel_pending_calls)
+
+        # Wait for every call up to the deadline, then report the ones still pending
+        if run.deadline is not None:
+            await asyncio.wait(calls, timeout=run.time_left())
+            nomes = run.reach_deadline()
+            if nomes and on_deadline is not None:
+                await on_deadline(nomes)
+
+        # Wait for all tasks to complete (or to be cancelled)
+        await asyncio.gather(*calls, return_exceptions=True)
+        status = run.finish()
+        # Make sure every response is stored before reporting completion
+        await asyncio.gather(*persist_tasks)
+        await self._blocking(self._marcar_concluida, quote_id, status)
+
+    async def _execute_carrier_request_async(self, run, task, result_callback):
+        """Runs a single carrier request (coalesced with identical in-flight ones) and hands its result over."""
+        try:
+            if CurrentConfig.COALESCE_CARRIER_REQUESTS:
+                cotacao_result = await async_carrier_request_coalescer.run(
+                    run.coalescing_key(task), lambda: self._chamar_transportadora_async(run, task))
+            else:
+                cotacao_result = await self._chamar_transportadora_async(run, task)
+            await result_callback(task, cotacao_result)
+        except Exception as e:
+            logger.error(f"Exception during carrier request execution: {e}", exc_info=True)
+
+    async def _chamar_transportadora_async(self, run, task):
+        """Waits for the carrier's rate limit token (never past the deadline), then runs the call in a carrier-call slot."""
+        if not await carrier_rate_limiter.acquire_async(task.carrier_code, run.max_wait()):
+            logger.warning(f"Rate limit reached for carrier {task.carrier_code}; call refused.")
+            return resultado_recusado(task.carrier_code)
+        with metrics.timer('quotation.stage.carrier_call'):
+            return await self.executor.run_carrier_call_async(task.call, priority=self.priority)
@@ -1,6 +1,17 @@
 # services/controller/cotacao_consulta_controller.py
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, Response, stream_with_context
 from db.quotes import get_last_quotations, filter_quotations, get_quote_details
+from db.exports import EXPORT_COLUMNS, iter_quote_export_rows
+from db.quote_search import build_search_conditions
+from services.caching import quote_detail_cache, consultation_cache
+from services.serialization import json_response, dumps_bytes
+from services.quote_events import quote_event_listener
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import datetime
 import logging
 
 # Configure logger (assuming configured globally in app.py)
@@ -11,8 +22,12 @@ class CotacaoConsultaController:
     def show_consultations(self):
         """Renders the consultations page with the latest quotes."""
         try:
-            # Retrieve the last 15 quotations
-            quotations = get_last_quotations(limit=15)
+            # Retrieve the last 15 quotations (cached while quote events keep the cache fresh)
+            quotations = consultation_cache.get(15) if quote_event_listener.connected else None
+            if quotations is None:
+                quotations = get_last_quotations(limit=15)
+                if quote_event_listener.connected:
+                    consultation_cache.set(15, quotations)
             return render_template('consultations.html', quotations=quotations)
         except Exception as e:
             logger.error(f"Error showing consultations: {str(e)}", exc_info=True)
@@ -20,43 +35,179 @@ class CotacaoConsultaController:
             return render_template('consultations.html', quotations=[], error="Erro ao carregar cotações recentes.")
 
     def filter_consultations(self):
-        """Applies filters and returns filtered quotations as JSON."""
+        """Applies filters and returns one page of filtered quotations as JSON, with the next page cursor."""
         try:
             # Extract filter parameters from query string
             filters = {
                 'code': request.args.get('code', '').strip(),
-                'cnpj': request.args.get('cnpj', '').strip(),
+                'cnpj': request.args.get('cnpj', '').strip(), # Any format, matched on digits only
                 'name': request.args.get('name', '').strip(),
-                'date': request.args.get('date', '').strip() # Expected format YYYY-MM-DD
+                'date_from': request.args.get('date_from', '').strip(), # Expected format YYYY-MM-DD
+                'date_to': request.args.get('date_to', '').strip(),     # Expected format YYYY-MM-DD
+                'date': request.args.get('date', '').strip() # Legacy single-day filter
             }
-            # Basic validation can be added here if needed (e.g., date format)
+            cursor = request.args.get('cursor', '').strip() or None
+            limit = request.args.get('limit', '').strip() or None
             
-            quotations = filter_quotations(filters)
-            return jsonify({'quotations': quotations})
+            quotations, next_cursor = filter_quotations(filters, cursor=cursor, limit=limit)
+            return json_response({'quotations': quotations, 'next_cursor': next_cursor})
             
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400 # Bad Request (invalid date or cursor)
         except Exception as e:
             logger.error(f"Error filtering consultations: {str(e)}", exc_info=True)
             return jsonify({'error': 'Erro interno ao filtrar cotações.'}), 500 # Internal Server Error
 
-    def show_quote_details(self, quote_id):
-        """Renders the details page for a specific quote ID."""
+    def export_consultations(self):
+        """Streams the filtered quote history (with all carrier responses) as CSV or XLSX."""
+        filters = {
+            'code': request.args.get('code', '').strip(),
+            'cnpj': request.args.get('cnpj', '').strip(),
+            'name': request.args.get('name', '').strip(),
+            'date_from': request.args.get('date_from', '').strip(),
+            'date_to': request.args.get('date_to', '').strip()
+        }
+        export_format = request.args.get('format', 'csv').strip().lower()
+        filename = f"cotacoes_{datetime.date.today().isoformat()}.{export_format}"
+
+        try:
+            # Validate filters up front so errors are reported before streaming starts
+            build_search_conditions(filters)
+            rows_iter = iter_quote_export_rows(filters)
+            if export_format == 'csv':
+                body = self._stream_csv(rows_iter)
+                mimetype = 'text/csv; charset=utf-8'
+            elif export_format == 'xlsx':
+                body = self._stream_xlsx(rows_iter)
+                mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            else:
+                return jsonify({'error': f"Formato de exportação inválido: {export_format}. Use csv ou xlsx."}), 400
+        except ImportError:
+            logger.error("XLSX export requested but XlsxWriter is not installed.")
+            return jsonify({'error': 'Exportação XLSX indisponível no servidor.'}), 501
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400
+
+        return Response(stream_with_context(body), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    @staticmethod
+    def _stream_csv(rows_iter):
+        """Writes CSV chunk by chunk (';' separated, UTF-8 with BOM so Excel reads accents)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+        buffer.write('\ufeff')
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in rows_iter:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def _stream_xlsx(rows_iter):
+        """Writes an XLSX in constant-memory mode to a temp file, then streams the file."""
+        import xlsxwriter # Optional dependency, imported only when XLSX is requested
+
+        def generate():
+            # Created on the first chunk: a response closed before streaming leaves no file behind
+            tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+            tmp.close()
+            try:
+                workbook = xlsxwriter.Workbook(tmp.name, {'constant_memory': True, 'remove_timezone': True})
+                sheet = workbook.add_worksheet('Cotacoes')
+                date_format = workbook.add_format({'num_format': 'dd/mm/yyyy hh:mm'})
+                sheet.write_row(0, 0, EXPORT_COLUMNS)
+                row_index = 1
+                for rows in rows_iter:
+                    for row in rows:
+                        for col_index, value in enumerate(row):
+                            if isinstance(value, datetime.datetime):
+                                sheet.write_datetime(row_index, col_index, value, date_format)
+                            elif value is None:
+                                continue
+                            else:
+                                sheet.write(row_index, col_index, value)
+                        row_index += 1
+                workbook.close()
+
+                with open(tmp.name, 'rb') as f:
+                    while True:
+                        chunk = f.read(64 * 1024)
+                        if not chunk:
+                            break
+                        yield chunk
+            finally:
+                os.remove(tmp.name)
+
+        return generate()
+
+    def show_quote_details(self, quote_id, variant='html'):
+        """
+        Renders the details page (variant 'html') or its JSON variant for a specific quote ID.
+        Completed quotes never change, so their rendered body is cached with a strong ETag;
+        quotes still in progress bypass the cache.
+        """
         if not isinstance(quote_id, int) or quote_id <= 0:
              logger.warning(f"Invalid quote_id requested: {quote_id}")
-             return render_template('quote_details.html', error="ID da cotação inválido."), 400 # Bad Request
+             return self._detail_error(variant, "ID da cotação inválido.", 400) # Bad Request
+
+        cached = quote_detail_cache.get((quote_id, variant))
+        if cached:
+            return self._cached_detail_response(cached)
              
         try:
             quote_data = get_quote_details(quote_id)
             if not quote_data:
                 logger.warning(f"Quote details not found for ID: {quote_id}")
-                return render_template('quote_details.html', error="Cotação não encontrada."), 404 # Not Found
-                
-            # Pass the structured data to the template
-            return render_template('quote_details.html', 
-                                   quote=quote_data['quote'], 
-                                   client=quote_data['client'],
-                                   packages=quote_data['packages'],
-                                   responses=quote_data['responses'])
+                return self._detail_error(variant, "Cotação não encontrada.", 404) # Not Found
+
+            if variant == 'json':
+                body = dumps_bytes(quote_data)
+                mimetype = 'application/json'
+            else:
+                # Pass the structured data to the template
+                body = render_template('quote_details.html', 
+                                       quote=quote_data['quote'], 
+                                       client=quote_data['client'],
+                                       packages=quote_data['packages'],
+                                       responses=quote_data['responses']).encode('utf-8')
+                mimetype = 'text/html'
+
+            if not quote_data['quote'].get('completed_at'):
+                # Still in progress: results may still arrive, never cache
+                response = Response(body, mimetype=mimetype)
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+
+            entry = {
+                'etag': hashlib.sha256(body).hexdigest(),
+                'body': body,
+                'mimetype': mimetype
+            }
+            quote_detail_cache.set((quote_id, variant), entry)
+            return self._cached_detail_response(entry)
                                    
         except Exception as e:
             logger.error(f"Error showing quote details for ID {quote_id}: {str(e)}", exc_info=True)
-            return render_template('quote_details.html', error="Erro interno ao carregar detalhes da cotação."), 500
\ No newline at end of file
+            return self._detail_error(variant, "Erro interno ao carregar detalhes da cotação.", 500)
+
+    @staticmethod
+    def _cached_detail_response(entry):
+        """Serves a cached detail body, answering If-None-Match with 304 Not Modified."""
+        if request.if_none_match.contains(entry['etag']):
+            response = Response(status=304)
+        else:
+            response = Response(entry['body'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag']) # Strong ETag
+        response.headers['Cache-Control'] = 'private, no-cache' # Always revalidate (cheap 304)
+        return response
+
+    @staticmethod
+    def _detail_error(variant, message, status):
+        """Builds an error response in the requested variant."""
+        if variant == 'json':
+            return jsonify({'error': message}), status
+        return render_template('quote_details.html', error=message), status
@@ -7,25 +7,205 @@ from services.transportadoras.esm import gera_cotacao_es_miguel
 from services.transportadoras.rte import gera_cotacao_rte
 from services.transportadoras.ssw import consultar_transportadora, get_ssw_carrier_config # Updated import
 from services.transportadoras.tnt import calcular_frete_tnt
-# Import DB functions
-from db.quotes import inserir_quote, get_next_protocolo
-from db.quote_packages import inserir_quote_packages
-from db.quote_responses import inserir_quote_response
+from services.transportadoras.stub import cotacao_stub
+# Storage (Postgres or in-memory, per QUOTE_REPOSITORY)
+from db.repository import get_repository
+from db.quotes import get_quote_details
 # Import other controllers if needed (or pass data)
 from services.controller.company_controller import CompanyController 
-import eventlet
+from services.metrics import metrics
+from services.executor import quotation_executor, INTERACTIVE
+from services.rate_limit import carrier_rate_limiter
+from services.coalescing import carrier_request_coalescer, request_signature
+import copy
+import time
 import logging
+from collections import namedtuple
 from decimal import Decimal # Use Decimal for monetary values
 
 # Configure logger (assuming configured globally in app.py)
 logger = logging.getLogger(__name__)
 
+# One carrier call of a quote: carrier code (rate limits, counters), variant (e.g. BTU modal), callable
+CarrierTask = namedtuple('CarrierTask', ['carrier_code', 'variant', 'call'])
+
+# Definition of carrier mapping (Internal Code -> Display Name)
+# Ensure the keys (BAU, TNT, etc.) match the 'Transportadora' identifier
+# returned by your carrier service functions and used in db.quote_responses.
+TRANSPORTADORA_MAP = {
+    'BAU': 'Bauer',           # SSW
+    'TNT': 'TNT Mercúrio',
+    'EPC': 'Princesa dos Campos',
+    'EUC': 'Eucatur',         # SSW
+    'RTE': 'Rodonaves',
+    'PEP': 'Zanotelli',       # SSW
+    'BTU': 'Braspress',
+    'ESM': 'Exp. São Miguel',
+    # Add more mappings as needed, matching the internal codes
+}
+
+# Marks results produced locally instead of by the carrier (rate-limit refusal): they are
+# shown on the page but never stored as carrier responses (history, exports, rollups)
+LOCAL_RESULT_KEY = 'local_status'
+
+def resultado_recusado(carrier_code):
+    """Result shown when the carrier's rate limit refused the call."""
+    return {
+        "Transportadora": carrier_code,
+        "message": "Limite de requisições da transportadora atingido. Tente novamente em instantes.",
+        LOCAL_RESULT_KEY: 'rate_limited'
+    }
+
+def resultado_cancelado(task):
+    """Row recorded for a carrier call killed before it answered (stored with status 'cancelled')."""
+    return {
+        "Transportadora": task.carrier_code,
+        "modal": "Aéreo" if task.variant == 'A' else "Rodoviário",
+        "message": "Cancelada: solicitante desconectado antes da resposta."
+    }
+
+def normalizar_resultado_para_exibicao(cotacao_result):
+    """
+    Builds the display version of a carrier result (display name, standardized invalid fields).
+    Never mutates the given dict: the raw result is what gets persisted.
+    """
+    display_result = dict(cotacao_result)
+
+    # Map internal code to display name
+    transportadora_code = cotacao_result.get('Transportadora')
+    display_result['Transportadora'] = TRANSPORTADORA_MAP.get(transportadora_code, transportadora_code) # Fallback to code if not mapped
+
+    # Simple validity check (can be enhanced)
+    frete = cotacao_result.get('frete')
+    try:
+        is_valid = frete is not None and frete != '-' and float(frete) > 0
+    except (TypeError, ValueError):
+        is_valid = False
+
+    if not is_valid:
+        # Standardize fields for invalid/error quotes
+        display_result['modal'] = '-'
+        display_result['frete'] = '-'
+        display_result['prazo'] = '-'
+        display_result['cotacao'] = '-'
+        # Keep the error message if present
+    return display_result
+
+class QuoteRun:
+    """
+    Serving-mode independent state of one carrier fan-out (solicitar_cotacoes): deadline,
+    answered and killed calls, the normalize stage, cancellation and completion metrics.
+    The controllers only start, wait for and kill the calls, through the call handles of
+    their serving mode (is_done(call), kill(call)).
+    """
+
+    def __init__(self, quote_id, cotacao_data, tasks, is_done, kill):
+        self.quote_id = quote_id
+        self.tasks = tasks
+        # Identical requests already in flight (same carrier, variant and signature) are shared
+        self.signature = request_signature(cotacao_data)
+        self.started = time.monotonic()
+        self.deadline = self.started + CurrentConfig.QUOTATION_DEADLINE_SECONDS if CurrentConfig.QUOTATION_DEADLINE_SECONDS > 0 else None
+        self.calls = [] # (task, call handle)
+        self.results_processed = 0
+        self.answered = set() # Tasks whose result arrived (never killed from then on)
+        self.killed = set()
+        self.deadline_passed = False
+        self._is_done = is_done
+        self._kill = kill
+
+    def start(self, spawn):
+        """Starts every carrier call; spawn(task) returns the call handle. Returns the handles."""
+        logger.info(f"Starting {len(self.tasks)} carrier calls for quote {self.quote_id}.")
+        self.calls = [(task, spawn(task)) for task in self.tasks]
+        return [call for _, call in self.calls]
+
+    def coalescing_key(self, task):
+        return (task.carrier_code, task.variant, self.signature)
+
+    def max_wait(self):
+        """How long a call may wait for its rate limit token: never past the deadline."""
+        if self.deadline is None:
+            return CurrentConfig.RATE_LIMIT_MAX_WAIT
+        return max(0.0, min(CurrentConfig.RATE_LIMIT_MAX_WAIT, self.deadline - time.monotonic()))
+
+    def time_left(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def accept(self, task, cotacao_response):
+        """
+        Records a call's result and normalizes it (stage 1). Returns (display_result, raw_result),
+        raw_result being None when it must not be stored, or None for an invalid response.
+        """
+        self.answered.add(id(task))
+        self.results_processed += 1
+        if self.deadline_passed:
+            metrics.incr('quotation.late_results')
+        if not (cotacao_response and isinstance(cotacao_response, dict) and 'Transportadora' in cotacao_response):
+            # Handle cases where the carrier function failed or returned invalid data
+            logger.warning(f"Invalid or failed response received from a carrier task for quote {self.quote_id}.")
+            return None
+
+        logger.info(f"Received response from {cotacao_response['Transportadora']} for quote {self.quote_id}.")
+        # Raw copy kept untouched for persistence; local results (rate-limit refusals) are only shown
+        with metrics.timer('quotation.stage.normalize'):
+            raw_result = copy.deepcopy(cotacao_response)
+            display_result = normalizar_resultado_para_exibicao(cotacao_response)
+        return display_result, (None if LOCAL_RESULT_KEY in raw_result else raw_result)
+
+    def cancel(self):
+        """
+        Kills the pending calls, except for CANCEL_LET_FINISH_CARRIERS (left running so their
+        result is still persisted). Returns the tasks killed, to be recorded as cancelled.
+        """
+        killed = []
+        for task, call in self.calls:
+            if id(task) in self.answered or self._is_done(call):
+                continue
+            if task.carrier_code in CurrentConfig.CANCEL_LET_FINISH_CARRIERS:
+                continue
+            self.killed.add(id(task))
+            killed.append(task)
+            self._kill(call)
+            metrics.incr('quotation.carrier_calls.cancelled')
+        logger.info(f"Quote {self.quote_id} cancelled: {len(self.killed)} pending carrier calls stopped.")
+        return killed
+
+    def was_killed(self, task):
+        return id(task) in self.killed
+
+    def reach_deadline(self):
+        """Called once the deadline passed: returns the display names of the carriers still pending ([] if none)."""
+        pendentes = [task for task, call in self.calls if id(task) not in self.answered and not self._is_done(call)]
+        if not pendentes:
+            return []
+        self.deadline_passed = True
+        metrics.incr('quotation.deadline_hit')
+        metrics.observe('quotation.time_to_complete', time.monotonic() - self.started)
+        nomes = list(dict.fromkeys(TRANSPORTADORA_MAP.get(t.carrier_code, t.carrier_code) for t in pendentes))
+        logger.info(f"Deadline reached for quote {self.quote_id}; still waiting on: {', '.join(nomes)}.")
+        return nomes
+
+    def finish(self):
+        """Called once every call ended: records the completion metrics and returns the quote's final status."""
+        if not self.deadline_passed:
+            metrics.observe('quotation.time_to_complete', time.monotonic() - self.started)
+        metrics.observe('quotation.time_to_all_results', time.monotonic() - self.started)
+        logger.info(f"All {self.results_processed} carrier tasks completed for quote {self.quote_id}.")
+        return 'cancelled' if self.killed else 'complete'
+
 class CotacaoController:
 
+    def __init__(self, repository=None, executor=None, priority=INTERACTIVE):
+        self.repository = repository or get_repository()
+        self.executor = executor or quotation_executor
+        # Carrier-call priority class: 'interactive' (a user is waiting) or 'bulk' (background re-quotes)
+        self.priority = priority
+
     def gerar_protocolo(self):
         """Generates a unique sequential protocol number for the quote."""
         try:
-            protocolo = get_next_protocolo()
+            protocolo = self.repository.get_next_protocolo()
             logger.info(f"Generated new protocol: {protocolo}")
             return protocolo
         except Exception as e:
@@ -43,7 +223,7 @@ class CotacaoController:
             return None
 
         # Get company data using CompanyController
-        company_controller = CompanyController() # Instantiate here or inject if preferred
+        company_controller = CompanyController(self.repository) # Instantiate here or inject if preferred
         company_data = company_controller.get_company_data()
         if not company_data:
             logger.error("Failed to retrieve company (origin) data. Cannot proceed.")
@@ -90,15 +270,37 @@ class CotacaoController:
                      f"Total Weight: {cotacao_base_data['total_weight']}")
         return cotacao_base_data
 
+    def obter_dados_recotacao(self, quote_id):
+        """
+        Base data to quote a stored quote again (same client, packages and invoice value,
+        current carrier prices). Returns None when the quote is not found.
+        """
+        if not str(quote_id).isdigit():
+            logger.error(f"Invalid quote ID for re-quotation: {quote_id}")
+            return None
+        details = get_quote_details(int(quote_id))
+        if not details:
+            logger.error(f"Quote {quote_id} not found for re-quotation.")
+            return None
+        quote = details['quote']
+        packages_data = {
+            'pack': details['packages'],
+            # Read back as float8: through str so Decimal keeps the stored value
+            'total_weight': str(quote['total_weight']),
+            'total_packages': quote['total_packages'],
+            'total_volume': str(quote['total_volume']),
+        }
+        return self.obter_dados_base_para_cotacao(details['client'], packages_data, str(quote['invoice_value']))
+
     def salvar_cotacao_inicial(self, cotacao_data_final):
         """Saves the initial quote record and its associated packages to the database."""
         try:
             # Insert the main quote record
-            quote_id = inserir_quote(cotacao_data_final)
+            quote_id = self.repository.insert_quote(cotacao_data_final)
             logger.info(f"Main quote record saved with ID: {quote_id}, Protocol: {cotacao_data_final['protocolo']}")
             
             # Insert associated packages
-            inserir_quote_packages(quote_id, cotacao_data_final['pack'])
+            self.repository.insert_quote_packages(quote_id, cotacao_data_final['pack'])
             logger.info(f"Associated packages saved for quote ID: {quote_id}")
             
             return quote_id
@@ -106,28 +308,28 @@ class CotacaoController:
             logger.error(f"Error saving initial quote data for protocol {cotacao_data_final.get('protocolo')}: {e}", exc_info=True)
             raise # Re-raise to be caught by the background task handler
 
-    def solicitar_cotacoes(self, quote_id, cotacao_data, socket_callback):
+    def montar_tarefas(self, cotacao_data):
         """
-        Orchestrates concurrent quote requests to carriers using eventlet GreenPool.
-        Saves responses to the database and triggers the SocketIO callback.
+        Builds the list of carrier calls for a quote: one CarrierTask per carrier/modal.
+        The code keys the carrier's rate limit and call counters; code and variant key coalescing.
         """
-        if not cotacao_data or not quote_id:
-            logger.error("Insufficient data to request quotations.")
-            return
-
-        logger.info(f"Requesting quotes for Quote ID: {quote_id}, Protocol: {cotacao_data['protocolo']}...")
+        # Load tests: every carrier answers from the stub after a simulated latency
+        if CurrentConfig.CARRIER_STUB_LATENCY_MS > 0:
+            latency_ms = CurrentConfig.CARRIER_STUB_LATENCY_MS
+            codes = ['BTU', 'EPC', 'ESM', 'RTE', 'TNT'] + list(CurrentConfig.SSW_CARRIERS.keys())
+            return [CarrierTask(code, None, lambda code=code: cotacao_stub(code, latency_ms)) for code in codes]
 
         # List of functions to call for each carrier/modal
         transportadoras_tasks = []
 
         # Add tasks for non-SSW carriers
         transportadoras_tasks.extend([
-            lambda: gera_cotacao_braspress(cotacao_data, modal="R"), # Rodoviário
-            lambda: gera_cotacao_braspress(cotacao_data, modal="A"), # Aéreo
-            lambda: gera_cotacao_epc(cotacao_data),
-            lambda: gera_cotacao_es_miguel(cotacao_data),
-            lambda: gera_cotacao_rte(cotacao_data),
-            lambda: calcular_frete_tnt(cotacao_data),
+            CarrierTask('BTU', 'R', lambda: gera_cotacao_braspress(cotacao_data, modal="R")), # Rodoviário
+            CarrierTask('BTU', 'A', lambda: gera_cotacao_braspress(cotacao_data, modal="A")), # Aéreo
+            CarrierTask('EPC', None, lambda: gera_cotacao_epc(cotacao_data)),
+            CarrierTask('ESM', None, lambda: gera_cotacao_es_miguel(cotacao_data)),
+            CarrierTask('RTE', None, lambda: gera_cotacao_rte(cotacao_data)),
+            CarrierTask('TNT', None, lambda: calcular_frete_tnt(cotacao_data)),
         ])
 
         # Add tasks for SSW carriers from config
@@ -138,58 +340,142 @@ class CotacaoController:
                      carrier_code=code, # Pass the code to identify config
                      dados_usuario=cotacao_data
                  )
-             transportadoras_tasks.append(create_ssw_task())
+             transportadoras_tasks.append(CarrierTask(carrier_code, None, create_ssw_task()))
 
-        # Use GreenPool for concurrency
-        pool = eventlet.GreenPool()
-        results_processed = 0
+        return transportadoras_tasks
+
+    def solicitar_cotacoes(self, quote_id, cotacao_data, socket_callback, job=None, on_deadline=None):
+        """
+        Orchestrates concurrent quote requests to carriers. Each call runs in its own
+        greenlet but only inside one of the executor's global carrier-call slots.
+        Each result goes through three stages: normalize, emit via the SocketIO callback,
+        then persist asynchronously from an untouched copy of the raw result.
+        job: optional QuotationJob; when it is cancelled, pending calls are killed (except
+        for CANCEL_LET_FINISH_CARRIERS, which finish and are persisted) and the quote is
+        completed with status 'cancelled'; each killed call is stored with status 'cancelled'.
+        on_deadline: optional callback(pending carrier names), called once if QUOTATION_DEADLINE_SECONDS
+        passes before every carrier answered; late results are still emitted and persisted.
+        """
+        import eventlet # Only the eventlet serving mode gets here
+        run = self._iniciar_execucao(quote_id, cotacao_data, is_done=lambda call: call.dead,
+                                     kill=lambda call: call.kill()) # Unwinds the HTTP call, releasing its socket and carrier slot
+        if run is None:
+            return
+
+        # Separate pool for DB writes so persistence never delays the emit stage
+        persist_pool = eventlet.GreenPool()
 
         # Callback function to handle results from each greenlet
-        def handle_carrier_result(cotacao_response):
-            nonlocal results_processed
-            results_processed += 1
-            if cotacao_response and isinstance(cotacao_response, dict) and 'Transportadora' in cotacao_response:
-                try:
-                    # Save the response to the database
-                    inserir_quote_response(quote_id, cotacao_response)
-                    # Emit the result via SocketIO callback
-                    socket_callback(cotacao_response)
-                    logger.info(f"Processed response from {cotacao_response['Transportadora']} for quote {quote_id}.")
-                except Exception as e:
-                    logger.error(f"Error processing/saving response for quote {quote_id} from "
-                                 f"{cotacao_response.get('Transportadora', 'Unknown')}: {e}", exc_info=True)
-                    # Optionally emit an error state for this carrier via socket_callback
-                    error_response = {
-                        'Transportadora': cotacao_response.get('Transportadora', 'Unknown'),
-                        'message': f'Erro interno ao processar resposta: {e}',
-                        'frete': None, 'prazo': None, 'cotacao': None, 'modal': '-'
-                    }
-                    socket_callback(error_response) # Emit error state
-            else:
-                # Handle cases where the carrier function failed or returned invalid data
-                logger.warning(f"Invalid or failed response received from a carrier task for quote {quote_id}.")
-                # Optionally emit a generic failure state if needed
+        def handle_carrier_result(task, cotacao_response):
+            accepted = run.accept(task, cotacao_response)
+            if accepted is None:
+                return
+            display_result, raw_result = accepted
+
+            # Stage 2: emit to the room immediately
+            try:
+                with metrics.timer('quotation.stage.emit'):
+                    socket_callback(display_result)
+            except Exception as e:
+                logger.error(f"Error emitting response from {task.carrier_code} for quote {quote_id}: {e}", exc_info=True)
+
+            # Stage 3: persist asynchronously
+            if raw_result is not None:
+                persist_pool.spawn_n(self._persistir_resposta, quote_id, raw_result)
 
         # Spawn greenlets for each carrier task
-        logger.info(f"Spawning {len(transportadoras_tasks)} tasks for quote {quote_id}.")
-        for task_func in transportadoras_tasks:
-            pool.spawn_n(self._execute_carrier_request, task_func, handle_carrier_result)
+        run.start(lambda task: eventlet.spawn(self._execute_carrier_request, run, task,
+                                              lambda result: handle_carrier_result(task, result)))
+        def cancel_pending_calls():
+            for task in run.cancel():
+                persist_pool.spawn_n(self._persistir_resposta, quote_id, resultado_cancelado(task), 'cancelled')
+
+        if job is not None:
+            job.on_cancel(cancel_pending_calls)
+
+        # Wait for every call up to the deadline, then report the ones still pending
+        if run.deadline is not None:
+            with eventlet.Timeout(run.time_left(), False):
+                self._aguardar_chamadas(run)
+            nomes = run.reach_deadline()
+            if nomes and on_deadline is not None:
+                on_deadline(nomes)
+
+        # Wait for all tasks to complete (or to be cancelled)
+        self._aguardar_chamadas(run)
+        status = run.finish()
+        # Make sure every response is stored before reporting completion
+        persist_pool.waitall()
+        self._marcar_concluida(quote_id, status)
+
+    def _iniciar_execucao(self, quote_id, cotacao_data, is_done, kill):
+        """Marks the quote as running and builds its QuoteRun (None when the data is insufficient). Blocking."""
+        if not cotacao_data or not quote_id:
+            logger.error("Insufficient data to request quotations.")
+            return None
 
-        # Wait for all tasks to complete
-        pool.waitall()
-        logger.info(f"All {results_processed} carrier tasks completed for quote {quote_id}.")
+        logger.info(f"Requesting quotes for Quote ID: {quote_id}, Protocol: {cotacao_data['protocolo']}...")
+        try:
+            self.repository.set_quote_status(quote_id, 'running')
+        except Exception as e:
+            logger.error(f"Could not mark quote {quote_id} as running: {e}")
 
+        # Adapters tag their archived payloads with the quote ID
+        cotacao_data = {**cotacao_data, 'quote_id': quote_id}
+        return QuoteRun(quote_id, cotacao_data, self.montar_tarefas(cotacao_data), is_done, kill)
 
-    def _execute_carrier_request(self, carrier_func, result_callback):
-        """Helper method to safely execute a single carrier request function."""
+    def _marcar_concluida(self, quote_id, status):
+        """From here on the quote never changes (detail pages become cacheable). Blocking."""
         try:
-            # Execute the specific carrier function (e.g., gera_cotacao_braspress)
-            cotacao_result = carrier_func()
+            self.repository.mark_quote_completed(quote_id, status=status)
+        except Exception as e:
+            logger.error(f"Could not mark quote {quote_id} as complete: {e}")
+
+    def _aguardar_chamadas(self, run):
+        """Waits for every carrier greenlet; calls killed on cancellation are expected to end that way."""
+        from greenlet import GreenletExit
+        for task, call in run.calls:
+            try:
+                call.wait()
+            except GreenletExit:
+                if not run.was_killed(task):
+                    raise
+
+    def _persistir_resposta(self, quote_id, raw_result, status='answered'):
+        """Persists a raw carrier result (persistence stage). Errors are logged, never propagated."""
+        try:
+            with metrics.timer('quotation.stage.persist'):
+                self.repository.insert_quote_response(quote_id, raw_result, status)
+        except Exception as e:
+            metrics.incr('quotation.persist_errors')
+            logger.error(f"Error saving response for quote {quote_id} from "
+                         f"{raw_result.get('Transportadora', 'Unknown')}: {e}", exc_info=True)
+
+    def _execute_carrier_request(self, run, task, result_callback):
+        """
+        Helper method to safely execute a single carrier request, attaching to an identical
+        in-flight request when there is one (COALESCE_CARRIER_REQUESTS).
+        """
+        try:
+            if CurrentConfig.COALESCE_CARRIER_REQUESTS:
+                cotacao_result = carrier_request_coalescer.run(
+                    run.coalescing_key(task), lambda: self._chamar_transportadora(run, task))
+            else:
+                cotacao_result = self._chamar_transportadora(run, task)
             result_callback(cotacao_result) # Pass result (or None/error dict) to handler
         except Exception as e:
             # Log error specific to this carrier function execution
-            # The function name isn't easily accessible here without inspect, log generically
+            # The carrier function itself returns an error dict when it can
             logger.error(f"Exception during carrier request execution: {e}", exc_info=True)
-            # Call the callback with None or an error structure to indicate failure
-            # result_callback(None) # Or potentially an error dict if needed
-            # Let the carrier function itself return the error dict if possible
\ No newline at end of file
+
+    def _chamar_transportadora(self, run, task):
+        """
+        Waits for the carrier's rate limit token (never past the quote's deadline), then runs
+        the call in a global carrier-call slot.
+        """
+        if not carrier_rate_limiter.acquire(task.carrier_code, run.max_wait()):
+            logger.warning(f"Rate limit reached for carrier {task.carrier_code}; call refused.")
+            return resultado_recusado(task.carrier_code)
+        # Execute the specific carrier function (e.g., gera_cotacao_braspress)
+        with metrics.timer('quotation.stage.carrier_call'):
+            return self.executor.run_carrier_call(task.call, priority=self.priority)
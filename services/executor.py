@@ -0,0 +1,332 @@
+# services/executor.py
+"""
+Process-wide bounded executor for quotation work.
+
+- At most MAX_CONCURRENT_QUOTATIONS quotations run at once; the rest wait in a FIFO
+  admission queue of at most MAX_QUEUED_QUOTATIONS entries (beyond that they are rejected).
+- At most MAX_CONCURRENT_CARRIER_CALLS outbound carrier calls run at once, across all quotes.
+
+Queued submitters are told their position (on_position callback) whenever it changes.
+
+Carrier-call slots are shared by priority classes ('interactive' for quotes a user is waiting
+on, 'bulk' for background re-quotes). Each class has its own concurrency limit; when a slot
+frees up it goes to the waiting class with the lowest weighted share of the slots granted so
+far (CARRIER_PRIORITY_WEIGHTS), so interactive calls go first and bulk ones use what is left.
+
+QuotationExecutor holds this bookkeeping independently of the serving mode; subclasses start
+jobs and park waiting carrier calls with their own primitives. EventletQuotationExecutor runs
+jobs in greenlets (app.py); AsyncQuotationExecutor runs coroutines and carrier calls in a
+thread pool (asgi.py). Only the eventlet subclass imports eventlet.
+"""
+import time
+import asyncio
+import functools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from config import CurrentConfig # Import configuration
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+def parse_classes(spec, cast=float, positive=False):
+    """
+    'interactive=8,bulk=1' -> {'interactive': 8.0, 'bulk': 1.0}
+    positive: values <= 0 are invalid too (weights: a class's share is divided by its weight).
+    """
+    values = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            name, value = item.split('=')
+            value = cast(value)
+            if positive and not value > 0:
+                raise ValueError(value)
+            values[name.strip()] = value
+        except ValueError:
+            logger.error(f"Ignoring invalid priority class entry: '{item}' (expected name=value{' > 0' if positive else ''})")
+    return values
+
+class _PriorityClass:
+
+    def __init__(self, name, weight, limit):
+        self.name = name
+        self.weight = weight
+        self.limit = limit
+        self.active = 0
+        self.vtime = 0.0 # Slots granted so far, divided by the weight
+        self.waiters = deque() # Waiters (objects with send()) of the calls waiting for a slot
+
+class QuotationExecutor:
+    """
+    Admission queue and carrier-call slots, independent of the serving mode. Subclasses
+    implement _start (run an admitted job) and the carrier-call wrappers, which wait for
+    a slot through _enqueue_or_grant/_abandon_wait.
+    """
+
+    def __init__(self, max_quotations, max_carrier_calls, max_queued, weights=None, limits=None):
+        self.max_quotations = max_quotations
+        self.max_carrier_calls = max_carrier_calls
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._queue = deque() # (func, args, kwargs, on_position, queued_at)
+        self._active = 0
+        self._carrier_active = 0
+        weights = weights or {}
+        limits = limits or {}
+        self._classes = {
+            name: _PriorityClass(name, weights.get(name, 1.0), limits.get(name, max_carrier_calls))
+            for name in set((INTERACTIVE, BULK)) | set(weights) | set(limits)
+        }
+
+    def submit(self, func, *args, on_position=None, **kwargs):
+        """
+        Runs func(*args, **kwargs) as soon as a quotation slot is free.
+        Returns 0 if it started right away, its queue position (1-based) if queued,
+        or None if the admission queue is full (rejected).
+        """
+        with self._lock:
+            if self._active < self.max_quotations:
+                self._active += 1
+                position = 0
+            elif len(self._queue) < self.max_queued:
+                self._queue.append((func, args, kwargs, on_position, time.perf_counter()))
+                position = len(self._queue)
+            else:
+                position = None
+            self._update_gauges()
+
+        if position is None:
+            metrics.incr('executor.quotations.rejected')
+            logger.warning("Quotation rejected: admission queue is full.")
+        elif position == 0:
+            metrics.observe('executor.queue_wait', 0.0)
+            self._start(func, args, kwargs)
+        else:
+            metrics.incr('executor.quotations.queued_total')
+            self._notify(on_position, position)
+        return position
+
+    def _start(self, func, args, kwargs):
+        """Runs an admitted job in the background; it must call _release() when done."""
+        raise NotImplementedError
+
+    def _run(self, func, args, kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Unhandled error in quotation job: {e}", exc_info=True)
+        finally:
+            self._release()
+
+    def _release(self):
+        """Frees a quotation slot: starts the next queued job and tells the rest their new position."""
+        with self._lock:
+            next_job = self._queue.popleft() if self._queue else None
+            if next_job is None:
+                self._active -= 1
+            waiting = [(entry[3], index + 1) for index, entry in enumerate(self._queue)]
+            self._update_gauges()
+
+        if next_job is not None:
+            func, args, kwargs, _, queued_at = next_job
+            metrics.observe('executor.queue_wait', time.perf_counter() - queued_at)
+            self._start(func, args, kwargs)
+        for on_position, position in waiting:
+            self._notify(on_position, position)
+
+    def _notify(self, on_position, position):
+        if on_position is None:
+            return
+        try:
+            on_position(position)
+        except Exception as e:
+            logger.warning(f"Could not report queue position: {e}")
+
+    def _priority_class(self, priority):
+        return self._classes.get(priority) or self._classes[INTERACTIVE]
+
+    def _enqueue_or_grant(self, cls, waiter):
+        """Takes a carrier-call slot right away (True) or queues waiter, sent once one is granted (False)."""
+        with self._lock:
+            self._catch_up(cls)
+            if not cls.waiters and self._can_grant(cls):
+                self._grant(cls)
+                return True
+            cls.waiters.append(waiter)
+            self._update_carrier_gauges(cls)
+            return False
+
+    def _abandon_wait(self, cls, waiter):
+        """A waiting call was killed/cancelled: leaves the queue, or frees the slot granted meanwhile."""
+        with self._lock:
+            if waiter in cls.waiters:
+                cls.waiters.remove(waiter)
+                self._update_carrier_gauges(cls)
+                return
+        self._release_carrier_slot(cls)
+
+    def _release_carrier_slot(self, cls):
+        with self._lock:
+            self._carrier_active -= 1
+            cls.active -= 1
+            self._update_carrier_gauges(cls)
+            self._dispatch()
+
+    def _can_grant(self, cls):
+        # Called with self._lock held
+        return self._carrier_active < self.max_carrier_calls and cls.active < cls.limit
+
+    def _catch_up(self, cls):
+        # Called with self._lock held, as a call of cls arrives. A class coming back from idle
+        # starts at the current virtual time, so it cannot claim the slots it did not use while idle.
+        if cls.active or cls.waiters:
+            return
+        busy = [c.vtime for c in self._classes.values() if c is not cls and (c.active or c.waiters)]
+        if busy:
+            cls.vtime = max(cls.vtime, min(busy))
+
+    def _grant(self, cls):
+        # Called with self._lock held
+        self._carrier_active += 1
+        cls.active += 1
+        cls.vtime += 1.0 / cls.weight
+        self._update_carrier_gauges(cls)
+
+    def _dispatch(self):
+        """Hands free slots to waiting calls, lowest weighted share first. Called with self._lock held."""
+        while True:
+            eligible = [c for c in self._classes.values() if c.waiters and self._can_grant(c)]
+            if not eligible:
+                return
+            # Ties go to the heavier class (interactive), then by name, whatever the dict order
+            cls = min(eligible, key=lambda c: (c.vtime, -c.weight, c.name))
+            self._grant(cls)
+            cls.waiters.popleft().send()
+
+    def _update_carrier_gauges(self, cls):
+        # Called with self._lock held
+        metrics.set_gauge('executor.carrier_calls.active', self._carrier_active)
+        metrics.set_gauge(f'executor.carrier_calls.active.{cls.name}', cls.active)
+        metrics.set_gauge(f'executor.carrier_calls.waiting.{cls.name}', len(cls.waiters))
+
+    def _update_gauges(self):
+        # Called with self._lock held
+        metrics.set_gauge('executor.quotations.active', self._active)
+        metrics.set_gauge('executor.quotations.queued', len(self._queue))
+
+class EventletQuotationExecutor(QuotationExecutor):
+    """QuotationExecutor for the eventlet serving mode: jobs run in greenlets, carrier calls in the caller's greenlet."""
+
+    def _start(self, func, args, kwargs):
+        import eventlet # Only this serving mode needs eventlet
+        eventlet.spawn_n(self._run, func, args, kwargs)
+
+    def run_carrier_call(self, func, *args, priority=INTERACTIVE, **kwargs):
+        """Runs one outbound carrier call inside a carrier-call slot of the given priority class."""
+        cls = self._priority_class(priority)
+        queued_at = time.perf_counter()
+        self._acquire_carrier_slot(cls)
+        started = time.perf_counter()
+        metrics.observe(f'executor.carrier_wait.{cls.name}', started - queued_at)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe(f'executor.carrier_call.{cls.name}', time.perf_counter() - started)
+            self._release_carrier_slot(cls)
+
+    def _acquire_carrier_slot(self, cls):
+        from eventlet.event import Event
+        waiter = Event()
+        if self._enqueue_or_grant(cls, waiter):
+            return
+        try:
+            waiter.wait()
+        except BaseException: # Killed while waiting (quote cancelled)
+            self._abandon_wait(cls, waiter)
+            raise
+
+class _AsyncWaiter:
+    """Future behind an Event-like send(), so _dispatch can wake asyncio waiters."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.future = loop.create_future()
+
+    def send(self):
+        self._loop.call_soon_threadsafe(self._set)
+
+    def _set(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class AsyncQuotationExecutor(QuotationExecutor):
+    """QuotationExecutor for the asyncio serving mode: submit() takes coroutine functions."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._threads = ThreadPoolExecutor(max_workers=self.max_carrier_calls, thread_name_prefix='carrier-call')
+
+    def _start(self, func, args, kwargs):
+        asyncio.get_running_loop().create_task(self._run_async(func, args, kwargs))
+
+    async def _run_async(self, func, args, kwargs):
+        try:
+            await func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Unhandled error in quotation job: {e}", exc_info=True)
+        finally:
+            self._release()
+
+    async def run_carrier_call_async(self, func, *args, priority=INTERACTIVE, **kwargs):
+        """
+        Runs one blocking carrier call in the thread pool, inside a carrier-call slot.
+        A cancelled call cannot interrupt its thread: the slot is freed when the call returns.
+        """
+        cls = self._priority_class(priority)
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        await self._acquire_carrier_slot_async(cls, loop)
+        started = time.perf_counter()
+        metrics.observe(f'executor.carrier_wait.{cls.name}', started - queued_at)
+        future = loop.run_in_executor(self._threads, functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        finally:
+            metrics.observe(f'executor.carrier_call.{cls.name}', time.perf_counter() - started)
+            if future.done():
+                self._release_carrier_slot(cls)
+            else: # Cancelled while the thread still runs
+                future.add_done_callback(lambda _: self._release_carrier_slot(cls))
+
+    async def _acquire_carrier_slot_async(self, cls, loop):
+        waiter = _AsyncWaiter(loop)
+        if self._enqueue_or_grant(cls, waiter):
+            return
+        try:
+            await waiter.future
+        except BaseException: # Cancelled while waiting (quote cancelled)
+            self._abandon_wait(cls, waiter)
+            raise
+
+# Process-wide executor (eventlet serving mode)
+quotation_executor = EventletQuotationExecutor(
+    max_quotations=CurrentConfig.MAX_CONCURRENT_QUOTATIONS,
+    max_carrier_calls=CurrentConfig.MAX_CONCURRENT_CARRIER_CALLS,
+    max_queued=CurrentConfig.MAX_QUEUED_QUOTATIONS,
+    weights=parse_classes(CurrentConfig.CARRIER_PRIORITY_WEIGHTS, positive=True),
+    limits=parse_classes(CurrentConfig.CARRIER_PRIORITY_LIMITS, int)
+)
+
+def create_async_executor():
+    """Executor for the asyncio serving mode, with the same limits as quotation_executor."""
+    return AsyncQuotationExecutor(
+        max_quotations=CurrentConfig.MAX_CONCURRENT_QUOTATIONS,
+        max_carrier_calls=CurrentConfig.MAX_CONCURRENT_CARRIER_CALLS,
+        max_queued=CurrentConfig.MAX_QUEUED_QUOTATIONS,
+        weights=parse_classes(CurrentConfig.CARRIER_PRIORITY_WEIGHTS, positive=True),
+        limits=parse_classes(CurrentConfig.CARRIER_PRIORITY_LIMITS, int)
+    )
@@ -0,0 +1,79 @@
+# services/metrics.py
+import threading
+import time
+import logging
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry (counters, gauges and timing samples).
+    Thread-safe (green-safe under eventlet monkey patching).
+    """
+
+    def __init__(self, max_samples=2000):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        # Keep only the most recent samples per timing to bound memory
+        self._timings = defaultdict(lambda: deque(maxlen=max_samples))
+
+    def incr(self, name, value=1):
+        """Increments a counter."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        """Sets a gauge to an absolute value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        """Records a timing sample (in seconds)."""
+        with self._lock:
+            self._timings[name].append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Context manager that records the elapsed time of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def percentiles(self, name, points=(50, 90, 99)):
+        """Returns the requested percentiles (in seconds) for a timing, or None if empty."""
+        with self._lock:
+            samples = sorted(self._timings.get(name, ()))
+        if not samples:
+            return None
+        result = {}
+        for p in points:
+            index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+            result[f"p{p}"] = samples[index]
+        return result
+
+    def snapshot(self):
+        """Returns a JSON-serializable view of all metrics."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timing_names = list(self._timings.keys())
+        timings = {}
+        for name in timing_names:
+            with self._lock:
+                samples = list(self._timings[name])
+            if not samples:
+                continue
+            timings[name] = {
+                "count": len(samples),
+                "avg": sum(samples) / len(samples),
+                **self.percentiles(name)
+            }
+        return {"counters": counters, "gauges": gauges, "timings": timings}
+
+# Process-wide registry
+metrics = MetricsRegistry()
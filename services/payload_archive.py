@@ -0,0 +1,238 @@
+# services/payload_archive.py
+"""
+Asynchronous archive of raw carrier request/response payloads.
+
+Adapters call payload_archive.record(...) right after the HTTP call; it only samples and
+enqueues. A background writer compresses the payloads (zstd when the optional
+`zstandard` package is installed, zlib otherwise) and appends them to segment files:
+
+    <PAYLOAD_ARCHIVE_DIR>/segment-<UTC timestamp>-<pid>-<seq>.bin
+
+Each record is a 4-byte big-endian header length, a JSON header (quote_id, carrier,
+operation, status, codec, blob sizes, ...), then the compressed request and response.
+Old segments are deleted once the directory exceeds PAYLOAD_ARCHIVE_MAX_BYTES.
+Use services.payload_replay to read records back and re-run the adapters' parsers.
+"""
+import os
+import re
+import json
+import glob
+import queue
+import random
+import struct
+import threading
+import time
+import zlib
+import logging
+from config import CurrentConfig # Import configuration
+from services.metrics import metrics
+
+try:
+    import zstandard
+except ImportError: # Optional dependency
+    zstandard = None
+
+try:
+    from eventlet import patcher, tpool
+except ImportError: # Only present in the eventlet serving mode
+    patcher = tpool = None
+
+logger = logging.getLogger(__name__)
+
+_HEADER_LEN = struct.Struct('>I')
+
+def _to_bytes(value):
+    if value is None:
+        return b''
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+def redact_xml(body, elements):
+    """Masks the content of the given XML elements (any namespace prefix), e.g. SOAP login/senha."""
+    if not body or not elements:
+        return body
+    names = '|'.join(re.escape(name) for name in elements)
+    pattern = re.compile(rf'(<((?:[\w.-]+:)?(?:{names}))\b[^>]*>)(.*?)(</\2>)', re.DOTALL)
+    if isinstance(body, bytes):
+        return redact_xml(body.decode('utf-8', 'replace'), elements).encode('utf-8')
+    return pattern.sub(r'\1***\4', body)
+
+def compress(data):
+    """Returns (codec, compressed bytes)."""
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(data)
+    return 'zlib', zlib.compress(data, 6)
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Registro comprimido com zstd, mas o pacote 'zstandard' não está instalado.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f"Codec desconhecido: {codec}")
+
+def _off_hub(func, *args):
+    """
+    Runs blocking work (compression, disk writes) in a real OS thread when the process is
+    monkey patched: the archiver's threading.Thread is then a green thread sharing the hub.
+    """
+    if tpool is not None and patcher.is_monkey_patched('thread'):
+        return tpool.execute(func, *args)
+    return func(*args)
+
+def encode_record(entry, request_bytes, response_bytes):
+    """One archive record: header length, JSON header, compressed request and response."""
+    codec, request_blob = compress(request_bytes)
+    _, response_blob = compress(response_bytes)
+    header = json.dumps({
+        **entry,
+        'codec': codec,
+        'request_size': len(request_blob),
+        'response_size': len(response_blob),
+        'raw_size': len(request_bytes) + len(response_bytes)
+    }, default=str).encode('utf-8')
+    return _HEADER_LEN.pack(len(header)) + header + request_blob + response_blob
+
+def iter_segment(path):
+    """Yields (header, request_bytes, response_bytes) for each record of a segment file."""
+    with open(path, 'rb') as f:
+        while True:
+            raw_len = f.read(_HEADER_LEN.size)
+            if len(raw_len) < _HEADER_LEN.size:
+                return # End of file (or a record cut short by a crash)
+            header = json.loads(f.read(_HEADER_LEN.unpack(raw_len)[0]))
+            request_blob = f.read(header['request_size'])
+            response_blob = f.read(header['response_size'])
+            if len(response_blob) < header['response_size']:
+                return
+            yield (header,
+                   decompress(header['codec'], request_blob),
+                   decompress(header['codec'], response_blob))
+
+def list_segments(archive_dir):
+    """Segment files, oldest first (names sort by creation time)."""
+    return sorted(glob.glob(os.path.join(archive_dir, 'segment-*.bin')))
+
+class PayloadArchiver:
+    """
+    Samples payloads on the caller's side and writes them from a single background thread
+    (compression and writes go to eventlet's OS thread pool when monkey patched).
+    """
+
+    def __init__(self, archive_dir, sample_rate, max_bytes, segment_bytes, queue_size, enabled=True):
+        self.archive_dir = archive_dir
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.enabled = enabled
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._segment = None
+        self._segment_size = 0
+        self._segment_seq = 0
+
+    def record(self, carrier, quote_id, response=None, request_body=None, response_body=None,
+               operation='cotacao', secret_elements=(), **meta):
+        """
+        Queues a request/response pair for archiving. Never blocks or raises.
+        response: a requests.Response (request body and raw content are taken from it);
+        request_body/response_body override or replace it when there is no response.
+        secret_elements: XML elements of the request masked before archiving (credentials).
+        Error responses (status != 200 or no response) are always kept; successes are sampled.
+        """
+        if not self.enabled:
+            return
+        try:
+            status = response.status_code if response is not None else None
+            if status == 200 and random.random() >= self.sample_rate:
+                metrics.incr('payload_archive.sampled_out')
+                return
+            if request_body is None and response is not None:
+                request_body = response.request.body
+            request_body = redact_xml(request_body, secret_elements)
+            if response_body is None and response is not None:
+                response_body = response.content
+            entry = {
+                'ts': time.time(),
+                'quote_id': quote_id,
+                'carrier': carrier,
+                'operation': operation,
+                'status': status,
+                'url': response.url if response is not None else None,
+                'elapsed': response.elapsed.total_seconds() if response is not None else None,
+                **meta
+            }
+            self._ensure_writer()
+            self._queue.put_nowait((entry, _to_bytes(request_body), _to_bytes(response_body)))
+        except queue.Full:
+            metrics.incr('payload_archive.dropped')
+        except Exception as e:
+            logger.warning(f"Could not queue payload for archiving ({carrier}): {e}")
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='payload-archiver', daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        while True:
+            entry, request_bytes, response_bytes = self._queue.get()
+            try:
+                self._write(entry, request_bytes, response_bytes)
+            except Exception as e:
+                metrics.incr('payload_archive.errors')
+                logger.error(f"Error archiving payload ({entry.get('carrier')}): {e}")
+
+    def _write(self, entry, request_bytes, response_bytes):
+        frame = _off_hub(encode_record, entry, request_bytes, response_bytes)
+
+        if self._segment is None or self._segment_size + len(frame) > self.segment_bytes:
+            self._rotate()
+        _off_hub(self._append, frame)
+        self._segment_size += len(frame)
+        metrics.incr('payload_archive.records')
+        metrics.incr('payload_archive.bytes', len(frame))
+
+    def _append(self, frame):
+        self._segment.write(frame)
+        self._segment.flush()
+
+    def _rotate(self):
+        """Closes the current segment, enforces the size budget and opens a new segment."""
+        if self._segment is not None:
+            self._segment.close()
+        self._enforce_budget()
+        self._segment_seq += 1
+        name = f"segment-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{os.getpid()}-{self._segment_seq:04d}.bin"
+        self._segment = open(os.path.join(self.archive_dir, name), 'ab')
+        self._segment_size = self._segment.tell()
+
+    def _enforce_budget(self):
+        segments = list_segments(self.archive_dir)
+        sizes = {path: os.path.getsize(path) for path in segments}
+        total = sum(sizes.values())
+        # Keep room for the segment about to be opened
+        while segments and total + self.segment_bytes > self.max_bytes:
+            oldest = segments.pop(0)
+            os.remove(oldest)
+            total -= sizes[oldest]
+            metrics.incr('payload_archive.segments_deleted')
+            logger.info(f"Payload archive budget reached; deleted {oldest}.")
+        metrics.set_gauge('payload_archive.disk_bytes', total)
+
+# Process-wide archiver
+payload_archive = PayloadArchiver(
+    archive_dir=CurrentConfig.PAYLOAD_ARCHIVE_DIR,
+    sample_rate=CurrentConfig.PAYLOAD_ARCHIVE_SAMPLE_RATE,
+    max_bytes=CurrentConfig.PAYLOAD_ARCHIVE_MAX_BYTES,
+    segment_bytes=CurrentConfig.PAYLOAD_ARCHIVE_SEGMENT_BYTES,
+    queue_size=CurrentConfig.PAYLOAD_ARCHIVE_QUEUE_SIZE,
+    enabled=CurrentConfig.PAYLOAD_ARCHIVE_ENABLED
+)
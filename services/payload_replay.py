@@ -0,0 +1,82 @@
+# services/payload_replay.py
+"""
+Offline replay of archived carrier responses through the adapters' parsers.
+
+    python -m services.payload_replay --quote-id 1234
+    python -m services.payload_replay --quote-id 1234 --carrier BTU --show-raw
+    python -m services.payload_replay --dir /path/to/archive --carrier TNT --limit 20
+"""
+import sys
+import json
+import argparse
+from config import CurrentConfig # Import configuration
+from services.payload_archive import iter_segment, list_segments
+from services.transportadoras.btu import process_btu_response
+from services.transportadoras.epc import _processar_resposta_epc
+from services.transportadoras.esm import _processar_resposta_esm
+from services.transportadoras.rte import process_rte_response
+from services.transportadoras.ssw import _parse_ssw_response, get_ssw_carrier_config
+from services.transportadoras.tnt import _parse_tnt_response
+
+def _json(body):
+    return json.loads(body.decode('utf-8'))
+
+# carrier -> parser(header, response bytes), mirroring what each adapter does on a 200 response
+PARSERS = {
+    'BTU': lambda header, body: process_btu_response(_json(body), header.get('modal', 'R')),
+    'EPC': lambda header, body: _processar_resposta_epc(_json(body)),
+    'ESM': lambda header, body: _processar_resposta_esm(_json(body)),
+    'RTE': lambda header, body: process_rte_response(_json(body)),
+    'TNT': lambda header, body: _parse_tnt_response(body.decode('utf-8')),
+}
+for _code in CurrentConfig.SSW_CARRIERS:
+    PARSERS[_code] = lambda header, body, code=_code: _parse_ssw_response(
+        body.decode('utf-8'), code, get_ssw_carrier_config(code))
+
+def iter_records(archive_dir, quote_id=None, carrier=None):
+    """Yields (header, request_bytes, response_bytes) matching the filters, oldest first."""
+    for path in list_segments(archive_dir):
+        for header, request_bytes, response_bytes in iter_segment(path):
+            if quote_id is not None and header.get('quote_id') != quote_id:
+                continue
+            if carrier and header.get('carrier') != carrier:
+                continue
+            yield header, request_bytes, response_bytes
+
+def replay(header, response_bytes):
+    """Runs the carrier's parser on an archived response body."""
+    parser = PARSERS.get(header.get('carrier'))
+    if parser is None:
+        raise LookupError(f"Nenhum parser registrado para a transportadora {header.get('carrier')}.")
+    return parser(header, response_bytes)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay archived carrier responses through the adapter parsers.")
+    parser.add_argument("--dir", default=CurrentConfig.PAYLOAD_ARCHIVE_DIR)
+    parser.add_argument("--quote-id", type=int)
+    parser.add_argument("--carrier")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after N records (0 = all)")
+    parser.add_argument("--show-raw", action="store_true", help="Print the raw request and response")
+    args = parser.parse_args(argv)
+
+    count = 0
+    for header, request_bytes, response_bytes in iter_records(args.dir, args.quote_id, args.carrier):
+        count += 1
+        print(f"--- quote {header.get('quote_id')} {header.get('carrier')} {header.get('operation')} "
+              f"status={header.get('status')} ts={header.get('ts')}")
+        if args.show_raw:
+            print(f"request:\n{request_bytes.decode('utf-8', 'replace')}")
+            print(f"response:\n{response_bytes.decode('utf-8', 'replace')}")
+        try:
+            print(f"parsed: {replay(header, response_bytes)}")
+        except Exception as e:
+            print(f"parse error: {e!r}")
+        if args.limit and count >= args.limit:
+            break
+    if not count:
+        print("No archived records match.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# services/quotation_flow.py
+"""
+Steps of the SocketIO quotation flow shared by both serving modes: session checks,
+idempotent job claiming, job bookkeeping, metrics and the events to send.
+
+app.py (eventlet) and asgi.py (asyncio) only join rooms, emit, sleep and schedule work.
+Each step here returns what to emit as an (event, data) pair, sent to the job's room
+unless stated otherwise.
+"""
+import logging
+from config import CurrentConfig # Import configuration
+from services.quotation_jobs import quotation_jobs, idempotency_key
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ERRO_SESSAO = "Dados de cliente, embalagem ou valor da nota ausentes na sessão."
+ERRO_PREPARO = 'Falha ao preparar dados para cotação.'
+ERRO_OCUPADO = 'Servidor ocupado no momento. Tente novamente em instantes.'
+ERRO_INICIO = 'Erro interno ao iniciar o processo de cotação.'
+ERRO_PROCESSAMENTO = 'Erro interno durante o processamento das cotações.'
+ERRO_RECOTACAO = 'Cotação não encontrada para recotar.'
+
+def session_quote(session):
+    """(client_data, packages_data, invoice_value) from the Flask session, or None when any is missing."""
+    quote = (session.get('client_data'), session.get('packages_data'), session.get('invoice_value'))
+    return quote if all(quote) else None
+
+def claim_job(quote, data):
+    """
+    Claims the job of a start_quotation request: a repeated request (same request_id from the
+    page, or same client and packages) gets the quotation already started. Returns (job, created).
+    """
+    return quotation_jobs.claim(idempotency_key(*quote, (data or {}).get('request_id')))
+
+def attach(job, sid, created):
+    """
+    Subscribes sid (already in the job's room) to the job. For a duplicate request returns
+    the snapshot to send to sid; None when the caller must start the quotation.
+    """
+    quotation_jobs.subscribe(job, sid)
+    if created:
+        return None
+    metrics.incr('quotation_jobs.duplicates_suppressed')
+    logger.info(f"Duplicate start_quotation from SID {sid} attached to quotation {job.protocolo or job.job_id}.")
+    return job.snapshot()
+
+def session_error(sid):
+    """Error sent to sid when its session lacks the quotation data."""
+    logger.error(f"{ERRO_SESSAO} for SID {sid}")
+    return 'quotation_error', {'error': ERRO_SESSAO}
+
+def fail(job, error_msg):
+    """Marks the job as failed; returns the error event."""
+    job.set_status('error', error_msg)
+    return 'quotation_error', {'error': error_msg}
+
+def queued(position):
+    return 'quotation_queued', {'position': position}
+
+def submitted(job, sid, position):
+    """Outcome of handing the job to the executor: None when it runs or waits, else the error event."""
+    if position is None:
+        return fail(job, ERRO_OCUPADO)
+    logger.info(f"Quotation for SID {sid} {'started' if position == 0 else f'queued at position {position}'}.")
+    return None
+
+def start_failed(job, sid, error):
+    logger.error(f"Error initiating quotation process for SID {sid}: {error}", exc_info=True)
+    return fail(job, ERRO_INICIO)
+
+def find_job(sid, data):
+    """Job a reconnecting client asks to rejoin, by protocol. Returns (job, None) or (None, expired event for sid)."""
+    protocolo = (data or {}).get('protocolo')
+    job = quotation_jobs.get(protocolo) if protocolo else None
+    if job is None:
+        logger.info(f"SocketIO client {sid} tried to rejoin unknown quotation {protocolo}.")
+        return None, ('quotation_expired', {'protocolo': protocolo})
+    return job, None
+
+def rejoin(job, sid):
+    """
+    Subscribes a rejoining sid and returns the snapshot to send it. The caller joins the room
+    first: a result emitted in between arrives twice (deduplicated by seq), never zero times.
+    """
+    quotation_jobs.subscribe(job, sid)
+    metrics.incr('quotation_jobs.rejoined')
+    logger.info(f"SocketIO client {sid} rejoined quotation {job.protocolo}.")
+    return job.snapshot()
+
+def watched_jobs_left(sid):
+    """Unsubscribes a disconnected sid; returns the jobs to cancel if nobody rejoins (CANCEL_ON_DISCONNECT)."""
+    return [job for job in quotation_jobs.unsubscribe(sid) if CurrentConfig.CANCEL_ON_DISCONNECT and job.active]
+
+def cancel_if_abandoned(job):
+    """Cancels the job unless a browser rejoined it within the grace period (the caller sleeps CANCEL_GRACE_SECONDS first)."""
+    if not job.subscribers and job.active:
+        logger.info(f"Quotation {job.protocolo} abandoned by its requester; cancelling pending carrier calls.")
+        job.cancel()
+
+def requote_submitted(quote_id, position):
+    """
+    Outcome of handing a re-quote (requote_quotation) to the executor, sent to the requester.
+    Nobody waits on its results: the consultations page lists it once saved.
+    """
+    if position is None:
+        return 'quotation_error', {'error': ERRO_OCUPADO}
+    logger.info(f"Re-quotation of quote {quote_id} {'started' if position == 0 else f'queued at position {position}'}.")
+    return 'requote_submitted', {'quote_id': quote_id, 'position': position}
+
+def requote_failed(quote_id, error):
+    logger.error(f"Error initiating re-quotation of quote {quote_id}: {error}", exc_info=True)
+    return 'quotation_error', {'error': ERRO_INICIO}
+
+class QuotationProgress:
+    """Job bookkeeping of process_quotations; each step returns the event to send to the job's room."""
+
+    def __init__(self, job, sid):
+        self.job = job
+        self.sid = sid
+        self.deadline_reported = False
+
+    def skip(self):
+        """True when the job waited in the admission queue and every requester already left."""
+        if not (CurrentConfig.CANCEL_ON_DISCONNECT and not self.job.subscribers):
+            return False
+        logger.info(f"Requester {self.sid} disconnected before its quotation started; skipping.")
+        metrics.incr('quotation_jobs.skipped_disconnected')
+        self.job.set_status('cancelled')
+        return True
+
+    def protocol_generated(self, protocolo):
+        # Reconnecting clients rejoin the job by protocol
+        logger.info(f"Generated Protocol {protocolo} for SID {self.sid}.")
+        quotation_jobs.set_protocolo(self.job, protocolo)
+        return 'protocol_generated', {'protocolo': protocolo}
+
+    def quote_saved(self, quote_id):
+        logger.info(f"Initial quote saved to DB with ID: {quote_id}, Protocol: {self.job.protocolo}")
+        self.job.quote_id = quote_id
+        self.job.set_status('running')
+
+    def new_result(self, cotacao_display):
+        """A normalized display result: buffered for rejoining clients, then emitted with its sequence number."""
+        seq = self.job.add_result(cotacao_display)
+        return 'new_quotation', {'cotacao': cotacao_display, 'seq': seq}
+
+    def deadline_reached(self, pendentes):
+        """The page shows what it has and which carriers are still pending."""
+        self.deadline_reported = True
+        self.job.set_pending(pendentes)
+        return 'quotations_complete', {'pending': pendentes}
+
+    def completed(self):
+        """Completion event (after a deadline, only the late results were still missing)."""
+        self.job.set_pending([])
+        self.job.set_status('cancelled' if self.job.cancelled else 'complete')
+        logger.info(f"Quotation process completed (Protocol: {self.job.protocolo}).")
+        if self.deadline_reported:
+            return 'quotations_final', {}
+        return 'quotations_complete', {'pending': []}
+
+    def failed(self, error):
+        logger.error(f"Error during background quotation processing for SID {self.sid}: {error}", exc_info=True)
+        return fail(self.job, ERRO_PROCESSAMENTO)
@@ -0,0 +1,194 @@
+# services/quotation_jobs.py
+"""
+In-memory registry of quotation jobs, found by protocol or by idempotency key.
+
+A job buffers the display results already emitted (each with a sequence number), so a
+browser that reconnects or reloads the page can rejoin the job's room by protocol and
+receive a snapshot, then the remaining live results, without new carrier calls.
+Finished jobs are kept for QUOTATION_JOB_RETENTION_SECONDS.
+
+The registry also tracks which sockets watch each job, so app.py can cancel a job whose
+last watcher disconnected (CANCEL_ON_DISCONNECT).
+
+Jobs are created when start_quotation arrives, before they have a protocol. A repeated
+start_quotation with the same idempotency key (double click, reconnect, duplicate tab) claims
+the existing job instead of a new one while it is running or for QUOTATION_IDEMPOTENCY_WINDOW_SECONDS
+after it started; failed and cancelled jobs are never reused.
+"""
+import time
+import uuid
+import json
+import hashlib
+import threading
+import logging
+from config import CurrentConfig # Import configuration
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def idempotency_key(client_data, packages_data, invoice_value, request_id=None):
+    """
+    Key of a quotation request: the page's request ID when it sends one, otherwise the client,
+    packages and invoice value from the session. Always scoped to the client.
+    """
+    client = str((client_data or {}).get('cnpj') or (client_data or {}).get('code'))
+    if request_id:
+        source = ['request', client, str(request_id)]
+    else:
+        source = ['data', client, packages_data, str(invoice_value)]
+    return hashlib.sha1(json.dumps(source, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class QuotationJob:
+
+    def __init__(self, key=None):
+        self.job_id = uuid.uuid4().hex
+        self.protocolo = None # Assigned once the job starts (QuotationJobRegistry.set_protocolo)
+        self.room = f"quotation:{self.job_id}"
+        self.key = key
+        self.created_at = time.monotonic()
+        self.quote_id = None
+        self.status = 'pending' # pending -> running -> complete (or error, cancelled)
+        self.error = None
+        self.finished_at = None
+        self.pending = [] # Carriers still pending after the deadline
+        self.subscribers = set() # SIDs watching the job
+        self.cancelled = False
+        self._cancel_callbacks = []
+        self._results = []
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in ('pending', 'running')
+
+    def add_result(self, display_result):
+        """Buffers a display result and returns its sequence number (1-based)."""
+        with self._lock:
+            self._results.append(display_result)
+            return len(self._results)
+
+    def set_status(self, status, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            if status in ('complete', 'error', 'cancelled'):
+                self.finished_at = time.monotonic()
+
+    def set_pending(self, pending):
+        with self._lock:
+            self.pending = list(pending)
+
+    def on_cancel(self, callback):
+        """Registers callback() to run when the job is cancelled (right away if it already was)."""
+        with self._lock:
+            if not self.cancelled:
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        """Cancels the job: runs the registered callbacks once."""
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._cancel_callbacks = self._cancel_callbacks, []
+        metrics.incr('quotation_jobs.cancelled')
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error cancelling quotation {self.protocolo}: {e}", exc_info=True)
+
+    def snapshot(self):
+        """Current state for a rejoining client: status plus every result emitted so far."""
+        with self._lock:
+            return {
+                'protocolo': self.protocolo,
+                'quote_id': self.quote_id,
+                'status': self.status,
+                'error': self.error,
+                'pending': list(self.pending),
+                'results': [{'seq': seq, 'cotacao': result} for seq, result in enumerate(self._results, start=1)]
+            }
+
+class QuotationJobRegistry:
+
+    def __init__(self, retention_seconds, idempotency_window_seconds=0):
+        self.retention_seconds = retention_seconds
+        self.idempotency_window_seconds = idempotency_window_seconds
+        self._jobs = {} # job_id -> job
+        self._by_protocolo = {} # protocol -> job
+        self._by_key = {} # idempotency key -> latest job
+        self._by_sid = {} # sid -> IDs of the jobs it watches
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """
+        Returns (job, created): the job already started under this idempotency key when it can
+        be reused, otherwise a new job registered under the key.
+        """
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is not None and self._reusable(job):
+                return job, False
+            job = QuotationJob(key=key)
+            self._add(job)
+            return job, True
+
+    def _reusable(self, job):
+        # Called with self._lock held
+        if job.status in ('error', 'cancelled') or job.cancelled:
+            return False
+        return job.active or time.monotonic() - job.created_at <= self.idempotency_window_seconds
+
+    def _add(self, job):
+        # Called with self._lock held
+        self._purge()
+        self._jobs[job.job_id] = job
+        if job.key is not None:
+            self._by_key[job.key] = job
+        metrics.set_gauge('quotation_jobs.buffered', len(self._jobs))
+
+    def set_protocolo(self, job, protocolo):
+        """Records the protocol generated when the job started, so clients can rejoin by it."""
+        with self._lock:
+            job.protocolo = str(protocolo)
+            self._by_protocolo[job.protocolo] = job
+
+    def get(self, protocolo):
+        with self._lock:
+            return self._by_protocolo.get(str(protocolo))
+
+    def subscribe(self, job, sid):
+        with self._lock:
+            job.subscribers.add(sid)
+            self._by_sid.setdefault(sid, set()).add(job.job_id)
+
+    def unsubscribe(self, sid):
+        """Removes a disconnected SID from its jobs. Returns the jobs nobody watches anymore."""
+        with self._lock:
+            orphaned = []
+            for job_id in self._by_sid.pop(sid, ()):
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    job.subscribers.discard(sid)
+                    if not job.subscribers:
+                        orphaned.append(job)
+            return orphaned
+
+    def _purge(self):
+        # Called with self._lock held
+        now = time.monotonic()
+        expired = [job for job in self._jobs.values()
+                   if job.finished_at is not None and now - job.finished_at > self.retention_seconds]
+        for job in expired:
+            del self._jobs[job.job_id]
+            if self._by_protocolo.get(job.protocolo) is job:
+                del self._by_protocolo[job.protocolo]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+# Process-wide registry
+quotation_jobs = QuotationJobRegistry(CurrentConfig.QUOTATION_JOB_RETENTION_SECONDS,
+                                      CurrentConfig.QUOTATION_IDEMPOTENCY_WINDOW_SECONDS)
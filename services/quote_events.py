@@ -0,0 +1,98 @@
+# services/quote_events.py
+import json
+import select
+import logging
+from db.connection import get_db_connection
+from db.quotes import get_quotation_summary
+from db.reference_data import reference_cache, INVALIDATION_CHANNEL
+from services.caching import consultation_cache, quote_detail_cache
+from services.metrics import metrics
+
+# Configure logger (assuming configured globally in app.py)
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'quote_events'
+CONSULTATIONS_ROOM = 'consultations'
+
+class QuoteEventListener:
+    """
+    Single LISTEN connection per worker (run as a SocketIO background task).
+    Invalidates the consultation/detail caches on quote events and pushes new rows
+    to browsers viewing /consultations. Also drops the reference data cache when any
+    worker invalidates it.
+    Every worker receives each event, so pushes skip the SocketIO message queue and
+    only reach the worker's own sockets.
+    """
+
+    POLL_TIMEOUT = 30      # Seconds between wakeups when idle
+    RECONNECT_DELAY = 5    # Seconds before reconnecting after an error
+
+    def __init__(self):
+        self.connected = False
+        self._socketio = None
+
+    def run(self, socketio):
+        """Listens forever, reconnecting on errors."""
+        self._socketio = socketio
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"Quote event listener disconnected: {e}")
+                metrics.incr('quote_events.disconnects')
+            self.connected = False
+            socketio.sleep(self.RECONNECT_DELAY)
+
+    def _listen(self):
+        conn = get_db_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL};")
+                cur.execute(f"LISTEN {INVALIDATION_CHANNEL};")
+            # Events may have been missed while disconnected
+            consultation_cache.clear()
+            quote_detail_cache.clear()
+            reference_cache.invalidate()
+            self.connected = True
+            logger.info(f"Listening for {CHANNEL} notifications.")
+            while True:
+                # select() is cooperative under eventlet's monkey patching
+                if select.select([conn], [], [], self.POLL_TIMEOUT) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    if notify.channel == INVALIDATION_CHANNEL:
+                        reference_cache.invalidate()
+                    else:
+                        self._handle(notify.payload)
+        finally:
+            conn.close()
+
+    def _handle(self, payload):
+        try:
+            event = json.loads(payload)
+            quote_id = int(event['quote_id'])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed {CHANNEL} payload: {payload}")
+            return
+        metrics.incr(f"quote_events.{event.get('event')}")
+
+        consultation_cache.clear()
+        quote_detail_cache.delete_where(lambda key: key[0] == quote_id)
+
+        if event.get('event') == 'created':
+            try:
+                summary = get_quotation_summary(quote_id)
+            except Exception:
+                return # Already logged; browsers still get the row on their next load
+            if summary:
+                summary['quote_date'] = summary['quote_date'].isoformat()
+                self._socketio.emit('consultation_new', summary, room=CONSULTATIONS_ROOM, ignore_queue=True)
+        elif event.get('event') == 'completed':
+            self._socketio.emit('consultation_completed', {'quote_id': quote_id}, room=CONSULTATIONS_ROOM,
+                               ignore_queue=True)
+
+# Process-wide listener
+quote_event_listener = QuoteEventListener()
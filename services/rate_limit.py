@@ -0,0 +1,157 @@
+# services/rate_limit.py
+"""
+Outbound rate limiting and quota accounting per carrier code.
+
+Each carrier has a token bucket (rate tokens/second, up to burst tokens). Buckets live
+in-process (RATE_LIMIT_BACKEND=local) or in Postgres (RATE_LIMIT_BACKEND=postgres, shared
+by every worker; falls back to the local bucket if the database is unavailable).
+A caller reserves its token once: the bucket answers how long to wait for it (the token is
+then already taken, the bucket may go below zero), or refuses when that exceeds max_wait.
+
+Per carrier and day, granted and throttled calls are accumulated in memory and added to
+carrier_call_counts by flush() (run periodically from app.py).
+"""
+import time
+import asyncio
+import datetime
+import threading
+import logging
+from collections import defaultdict
+from config import CurrentConfig # Import configuration
+from db.carrier_quotas import reserve_carrier_token, add_call_counts
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def parse_limits(spec):
+    """'BTU=2/4,BAU=1/3' -> {'BTU': (2.0, 4.0), 'BAU': (1.0, 3.0)} (rate per second / burst)."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            code, values = item.split('=')
+            rate, burst = (float(value) for value in values.split('/'))
+            _check_limit(rate, burst)
+            limits[code.strip().upper()] = (rate, burst)
+        except ValueError:
+            logger.error(f"Ignoring invalid CARRIER_RATE_LIMITS entry: '{item}' (expected CODE=rate/burst, rate > 0, burst >= 1)")
+    return limits
+
+def _check_limit(rate, burst):
+    if rate <= 0 or burst < 1:
+        raise ValueError(f"Invalid rate limit {rate}/{burst}: rate must be > 0 and burst >= 1")
+
+class TokenBucket:
+    """In-process token bucket."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """
+        Reserves one token. Returns the seconds to wait before using it (0.0 if available now),
+        or None, without reserving, when that would exceed max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+class CarrierRateLimiter:
+
+    def __init__(self, default_rate, default_burst, limits=None, backend='local'):
+        _check_limit(default_rate, default_burst)
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.limits = limits or {}
+        self.backend = backend
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: [0, 0]) # (carrier_code, day) -> [calls, throttled]
+
+    def _limit(self, carrier_code):
+        return self.limits.get(carrier_code, (self.default_rate, self.default_burst))
+
+    def _bucket(self, carrier_code):
+        with self._lock:
+            bucket = self._buckets.get(carrier_code)
+            if bucket is None:
+                bucket = self._buckets[carrier_code] = TokenBucket(*self._limit(carrier_code))
+            return bucket
+
+    def _reserve(self, carrier_code, max_wait):
+        """Seconds to wait for a reserved token, or None when refused (one database round trip with postgres)."""
+        if self.backend == 'postgres':
+            try:
+                rate, burst = self._limit(carrier_code)
+                return reserve_carrier_token(carrier_code, rate, burst, max_wait)
+            except Exception:
+                metrics.incr('rate_limit.backend_errors')
+        return self._bucket(carrier_code).reserve(max_wait)
+
+    def acquire(self, carrier_code, max_wait):
+        """
+        Waits (cooperatively) for a token for carrier_code for at most max_wait seconds.
+        Returns True when the call may proceed, False when it must be refused.
+        """
+        wait = self._reserve(carrier_code, max_wait)
+        if self._decide(carrier_code, wait):
+            time.sleep(wait) # Cooperative under eventlet's monkey patching
+            return True
+        return False
+
+    async def acquire_async(self, carrier_code, max_wait):
+        """acquire() for the asyncio serving mode; the Postgres backend is queried from a thread."""
+        if self.backend == 'postgres':
+            wait = await asyncio.get_running_loop().run_in_executor(None, self._reserve, carrier_code, max_wait)
+        else:
+            wait = self._reserve(carrier_code, max_wait)
+        if self._decide(carrier_code, wait):
+            await asyncio.sleep(wait)
+            return True
+        return False
+
+    def _decide(self, carrier_code, wait):
+        """Records the outcome of a reservation: True if granted (after waiting wait seconds), False if refused."""
+        if wait is None:
+            metrics.incr(f'rate_limit.{carrier_code}.throttled')
+            self._count(carrier_code, granted=False)
+            return False
+        metrics.observe('rate_limit.wait', wait)
+        self._count(carrier_code, granted=True)
+        return True
+
+    def _count(self, carrier_code, granted):
+        with self._lock:
+            self._counts[(carrier_code, datetime.date.today())][0 if granted else 1] += 1
+
+    def flush(self):
+        """Adds the accumulated daily counters to carrier_call_counts (kept for the next run on failure)."""
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(lambda: [0, 0])
+        if not counts:
+            return
+        try:
+            add_call_counts({key: tuple(value) for key, value in counts.items()})
+        except Exception:
+            with self._lock:
+                for key, (calls, throttled) in counts.items():
+                    self._counts[key][0] += calls
+                    self._counts[key][1] += throttled
+            raise
+
+# Process-wide limiter
+carrier_rate_limiter = CarrierRateLimiter(
+    default_rate=CurrentConfig.CARRIER_RATE_LIMIT_RATE,
+    default_burst=CurrentConfig.CARRIER_RATE_LIMIT_BURST,
+    limits=parse_limits(CurrentConfig.CARRIER_RATE_LIMITS),
+    backend=CurrentConfig.RATE_LIMIT_BACKEND
+)
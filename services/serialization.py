@@ -0,0 +1,76 @@
+# services/serialization.py
+"""
+Fast JSON encoding for HTTP responses and SocketIO packets.
+
+Uses orjson when installed (optional dependency) and falls back to the standard
+library otherwise. dumps/loads accept and ignore the stdlib keyword arguments, so this
+module can be passed directly as the `json` module of Flask-SocketIO. JSONEncoder is
+installed as the app's json_encoder, so jsonify goes through it as well.
+"""
+import json
+import datetime
+import decimal
+import logging
+from flask import Response
+from flask.json import JSONEncoder as FlaskJSONEncoder
+
+try:
+    import orjson
+except ImportError: # Optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def _default(obj):
+    """Types not handled natively (Decimal from non-NUMERIC-cast paths, dates in the stdlib path)."""
+    if isinstance(obj, decimal.Decimal):
+        if not obj.is_finite(): # NaN/Infinity have no JSON form
+            return None
+        return int(obj) if obj % 1 == 0 else float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj, default=_default):
+        """Serializes obj to UTF-8 JSON bytes."""
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+else:
+    def dumps_bytes(obj, default=_default):
+        """Serializes obj to UTF-8 JSON bytes."""
+        return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(s, **kwargs):
+        return json.loads(s)
+
+def dumps(obj, **kwargs):
+    """Serializes obj to a JSON string (stdlib-compatible signature)."""
+    return dumps_bytes(obj).decode('utf-8')
+
+def json_response(payload, status=200):
+    """Flask response with a JSON body produced by the fast encoder."""
+    return Response(dumps_bytes(payload), status=status, mimetype='application/json')
+
+class JSONEncoder(FlaskJSONEncoder):
+    """
+    app.json_encoder (Flask 2.0 has no JSON provider): jsonify and the session cookie are
+    encoded by dumps_bytes. Dates come out in ISO 8601, like in the other responses; types
+    unknown here fall back to Flask's encoder (UUID, dataclasses, Markup). Pretty-printed
+    output (indent) stays on the stdlib path.
+    """
+
+    def default(self, o):
+        try:
+            return _default(o)
+        except TypeError:
+            return super().default(o)
+
+    def encode(self, o):
+        if self.indent is not None:
+            return super().encode(o)
+        return dumps_bytes(o, default=self.default).decode('utf-8')
@@ -0,0 +1,68 @@
+# services/shared_state.py
+"""
+API access tokens shared by the worker processes.
+
+Tokens are kept in a local dict; with SHARED_STATE_BACKEND=postgres they are also stored in
+shared_tokens, so a token obtained by one worker is reused by the others instead of each
+worker authenticating on its own. The database is best effort: when it is unavailable the
+local copy (or a fresh authentication) is used.
+"""
+import time
+import threading
+import logging
+from config import CurrentConfig # Import configuration
+from db.shared_tokens import get_shared_token, save_shared_token
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class SharedTokenCache:
+
+    def __init__(self, backend='local', margin_seconds=60):
+        self.backend = backend
+        self.margin_seconds = margin_seconds # Tokens this close to expiring are treated as expired
+        self._tokens = {} # name -> (token, expires_at epoch seconds)
+        self._lock = threading.Lock()
+
+    def _valid(self, entry):
+        return entry is not None and time.time() < entry[1] - self.margin_seconds
+
+    def get(self, name):
+        """Returns a token that is still valid, or None (the caller authenticates and calls set())."""
+        with self._lock:
+            entry = self._tokens.get(name)
+        if self._valid(entry):
+            metrics.incr('shared_tokens.local_hits')
+            return entry[0]
+        if self.backend == 'postgres':
+            try:
+                entry = get_shared_token(name)
+            except Exception:
+                metrics.incr('shared_tokens.backend_errors')
+                return None
+            if self._valid(entry):
+                metrics.incr('shared_tokens.shared_hits')
+                with self._lock:
+                    self._tokens[name] = entry
+                return entry[0]
+        metrics.incr('shared_tokens.misses')
+        return None
+
+    def set(self, name, token, expires_in):
+        """Stores a token valid for expires_in seconds."""
+        entry = (token, time.time() + expires_in)
+        with self._lock:
+            self._tokens[name] = entry
+        if self.backend == 'postgres':
+            try:
+                save_shared_token(name, *entry)
+            except Exception:
+                metrics.incr('shared_tokens.backend_errors')
+
+    def expires_at(self, name):
+        with self._lock:
+            entry = self._tokens.get(name)
+        return entry[1] if entry else 0
+
+# Process-wide token cache
+shared_tokens = SharedTokenCache(CurrentConfig.SHARED_STATE_BACKEND)
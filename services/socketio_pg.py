@@ -0,0 +1,85 @@
+# services/socketio_pg.py
+"""
+SocketIO client manager backed by Postgres LISTEN/NOTIFY (SOCKETIO_MESSAGE_QUEUE=postgres).
+
+Lets several worker processes share rooms without a separate broker: every emit is published
+on a NOTIFY channel and each worker delivers it to the sockets it holds. Payloads too large
+for NOTIFY are stored in socketio_messages and fetched by the listeners (db.socketio_messages).
+
+Messages travel as JSON (emit payloads already are JSON-serializable), never pickle: anyone
+able to NOTIFY the channel or write socketio_messages must not be able to run code in the workers.
+"""
+import time
+import select
+import logging
+import socketio
+from db.connection import get_db_connection
+from db.socketio_messages import publish_socketio_message, get_socketio_message
+from services import serialization
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class PostgresPubSubManager(socketio.PubSubManager):
+
+    name = 'postgres'
+    POLL_TIMEOUT = 30      # Seconds between wakeups when idle
+    RECONNECT_DELAY = 5    # Seconds before reconnecting after an error
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        payload = serialization.dumps(data)
+        for attempt in range(2): # Retry once (e.g., a dropped connection)
+            try:
+                publish_socketio_message(self.channel, payload)
+                metrics.incr('socketio_queue.published')
+                return
+            except Exception:
+                metrics.incr('socketio_queue.publish_errors')
+        logger.error(f"Could not publish SocketIO message on {self.channel}; giving up.")
+
+    def _decode(self, payload):
+        """Manager message (dict) of a notification; raises ValueError for anything else."""
+        if payload.startswith('ref:'):
+            payload = get_socketio_message(int(payload[4:]))
+            if payload is None:
+                return None
+        message = serialization.loads(payload)
+        # Only dicts: the base manager would try to unpickle any other message it is given
+        if not isinstance(message, dict) or not isinstance(message.get('method'), str):
+            raise ValueError("not a SocketIO manager message")
+        return message
+
+    def _listen(self):
+        """Yields the published messages forever, reconnecting on errors."""
+        while True:
+            conn = None
+            try:
+                conn = get_db_connection()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                logger.info(f"Listening for SocketIO messages on {self.channel}.")
+                while True:
+                    # select() is cooperative under eventlet's monkey patching
+                    if select.select([conn], [], [], self.POLL_TIMEOUT) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            message = self._decode(notify.payload)
+                        except Exception as e:
+                            logger.warning(f"Ignoring undecodable SocketIO message on {self.channel}: {e}")
+                            continue
+                        if message is not None:
+                            yield message
+            except Exception as e:
+                logger.error(f"SocketIO message listener disconnected: {e}")
+                metrics.incr('socketio_queue.disconnects')
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(self.RECONNECT_DELAY)
@@ -2,6 +2,7 @@
 import requests
 import logging
 from config import CurrentConfig # Import configuration
+from services.shared_state import shared_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -9,20 +10,19 @@ logger = logging.getLogger(__name__)
 auth_url = f"{CurrentConfig.TOTVS_BASE_URL}/authorization/v2/token"
 legal_entities_search_url = f"{CurrentConfig.TOTVS_BASE_URL}/person/v2/legal-entities/search"
 
-# Store token globally within the module (simple caching)
-_access_token = None
-# Could add expiration time checking if needed
+# Token cache entry (services.shared_state, shared by the workers)
+TOKEN_NAME = 'totvs'
 
 def get_access_token():
     """
     Obtains or retrieves a cached access token for the TOTVS API.
     Handles authentication using credentials from config.
     """
-    global _access_token
-    # Simple cache check - could be enhanced with expiration time
-    if _access_token:
+    # Cached tokens expiring within 60s are refreshed
+    access_token = shared_tokens.get(TOKEN_NAME)
+    if access_token:
         logger.debug("Using cached TOTVS access token.")
-        return _access_token
+        return access_token
 
     auth_data = {
         "username": CurrentConfig.TOTVS_USERNAME,
@@ -40,16 +40,15 @@ def get_access_token():
         response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
         
         token_data = response.json()
-        _access_token = token_data.get("access_token")
+        access_token = token_data.get("access_token")
         
-        if not _access_token:
+        if not access_token:
              logger.error("Access token not found in TOTVS API response.")
              raise ValueError("Falha ao obter token de acesso TOTVS: token ausente na resposta.")
              
         logger.info("Successfully obtained new TOTVS access token.")
-        # Simple caching: store the token
-        # Add expiration logic here if needed (parse 'expires_in', store expiration timestamp)
-        return _access_token
+        shared_tokens.set(TOKEN_NAME, access_token, int(token_data.get("expires_in", 3600))) # Default 1 hour
+        return access_token
         
     except requests.exceptions.RequestException as e:
         logger.error(f"Error requesting TOTVS access token: {e}", exc_info=True)
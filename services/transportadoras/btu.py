@@ -4,6 +4,7 @@ import base64
 import time
 import logging
 from config import CurrentConfig # Import configuration
+from services.payload_archive import payload_archive
 from decimal import Decimal, InvalidOperation # Use Decimal
 
 logger = logging.getLogger(__name__)
@@ -167,16 +168,15 @@ def gera_cotacao_braspress(dados, modal):
         response = requests.post(BTU_URL, json=payload, headers=headers, timeout=API_TIMEOUT)
         elapsed_time = time.time() - start_time
         logger.info(f"BTU API response time (Modal: {modal_desc}): {elapsed_time:.2f} seconds")
+        # Raw request/response go to the payload archive (see services.payload_replay)
+        payload_archive.record("BTU", dados.get('quote_id'), response, modal=modal_upper)
         
-        # Log raw response status and body (truncated)
-        logger.debug(f"BTU Raw Response Status (Modal: {modal_desc}): {response.status_code}")
         response_body_text = response.text
         try:
             response_data = response.json()
-            logger.debug(f"BTU Raw Response Body (JSON, Modal: {modal_desc}): {response_data}")
         except ValueError:
             response_data = None
-            logger.debug(f"BTU Raw Response Body (Non-JSON, Modal: {modal_desc}): {response_body_text[:500]}")
+            logger.debug(f"BTU response is not JSON (Modal: {modal_desc}, status {response.status_code}).")
 
         # Check for HTTP errors first
         if response.status_code != 200:
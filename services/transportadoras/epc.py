@@ -4,6 +4,7 @@ from datetime import datetime
 import time
 import logging
 from config import CurrentConfig # Import configuration
+from services.payload_archive import payload_archive
 from decimal import Decimal, InvalidOperation # Use Decimal for calculations
 
 logger = logging.getLogger(__name__)
@@ -69,21 +70,22 @@ def construir_payload_epc(dados):
     logger.debug(f"EPC Payload: {payload}")
     return payload
 
-def solicitar_cotacao_epc(payload):
+def solicitar_cotacao_epc(payload, quote_id=None):
     """Sends the quote request to EPC and returns the response."""
     start_time = time.time()
     try:
         response = requests.post(URL_EPC, json=payload, auth=AUTH_EPC, timeout=API_TIMEOUT)
         elapsed_time = time.time() - start_time
         logger.info(f"EPC API response time: {elapsed_time:.2f} seconds")
+        # Raw request/response go to the payload archive (see services.payload_replay)
+        payload_archive.record("EPC", quote_id, response)
 
         # Attempt to parse JSON regardless of status code for error messages
         try:
             response_data = response.json()
-            logger.debug(f"EPC Response Body: {response_data}")
         except ValueError:
             response_data = None # Not JSON
-            logger.debug(f"EPC Response Body (Non-JSON): {response.text}")
+            logger.debug(f"EPC response is not JSON (status {response.status_code}).")
 
         # Check status code *after* attempting to get JSON error message
         if response.status_code != 200:
@@ -171,7 +173,7 @@ def gera_cotacao_epc(dados):
     logger.info("Requesting quote from EPC (Princesa dos Campos)...")
     try:
         payload = construir_payload_epc(dados)
-        response_data = solicitar_cotacao_epc(payload)
+        response_data = solicitar_cotacao_epc(payload, dados.get('quote_id'))
 
         if response_data and response_data.get('message') is None: # Check if solicitation was successful
             processed_result = _processar_resposta_epc(response_data)
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import time
 import logging
 from config import CurrentConfig # Import configuration
+from services.payload_archive import payload_archive
 from decimal import Decimal, InvalidOperation # Use Decimal
 
 logger = logging.getLogger(__name__)
@@ -144,23 +145,22 @@ def _processar_resposta_esm(response_data):
         return {"frete": None, "prazo": None, "cotacao": None, "message": f"Erro processamento ESM: {e}"}
 
 
-def solicitar_cotacao_es_miguel(payload):
+def solicitar_cotacao_es_miguel(payload, quote_id=None):
     """Sends the quote request to ESM and returns the raw response dictionary or an error dict."""
     start_time = time.time()
     try:
         response = requests.post(URL_ES_MIGUEL, json=payload, headers=HEADERS_ES_MIGUEL, timeout=API_TIMEOUT)
         elapsed_time = time.time() - start_time
         logger.info(f"ESM API response time: {elapsed_time:.2f} seconds")
+        # Raw request/response go to the payload archive (see services.payload_replay)
+        payload_archive.record("ESM", quote_id, response)
 
-        # Log raw response regardless of status
-        logger.debug(f"ESM Raw Response Status: {response.status_code}")
         response_body_text = response.text # Store text in case it's not JSON
         try:
              response_data = response.json()
-             logger.debug(f"ESM Raw Response Body (JSON): {response_data}")
              return response_data # Return parsed JSON
         except ValueError:
-             logger.debug(f"ESM Raw Response Body (Non-JSON): {response_body_text[:500]}")
+             logger.debug(f"ESM response is not JSON (status {response.status_code}).")
              # Handle non-JSON response based on status code
              if response.status_code == 200:
                   # Status 200 but not JSON - unexpected
@@ -217,7 +217,7 @@ def gera_cotacao_es_miguel(dados):
     }
     try:
         payload = construir_payload_es_miguel(dados)
-        response_data = solicitar_cotacao_es_miguel(payload) # Gets raw dict or error dict
+        response_data = solicitar_cotacao_es_miguel(payload, dados.get('quote_id')) # Gets raw dict or error dict
         
         # Process the raw response (which could be success or API error)
         processed_result = _processar_resposta_esm(response_data)
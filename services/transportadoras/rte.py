@@ -3,6 +3,8 @@ import requests
 import time
 import logging
 from config import CurrentConfig # Import configuration
+from services.payload_archive import payload_archive
+from services.shared_state import shared_tokens
 from decimal import Decimal, InvalidOperation # Use Decimal
 
 logger = logging.getLogger(__name__)
@@ -16,20 +18,15 @@ RTE_USERNAME = CurrentConfig.RTE_USERNAME
 RTE_PASSWORD = CurrentConfig.RTE_PASSWORD
 API_TIMEOUT = CurrentConfig.DEFAULT_API_TIMEOUT
 
-# Simple in-memory token cache
-_token_cache = {
-    'cotacao': {'token': None, 'expires_at': 0},
-    'busca_cidade': {'token': None, 'expires_at': 0}
-}
-
 def _obter_token_rte(token_url, cache_key):
-    """Gets or refreshes an access token for a specific RTE API endpoint."""
-    cache = _token_cache[cache_key]
-    
-    # Check cache validity (consider a buffer before expiration)
-    if cache['token'] and time.time() < cache['expires_at'] - 60: # 60s buffer
-        logger.debug(f"Using cached RTE token for '{cache_key}'. Expires at: {time.ctime(cache['expires_at'])}")
-        return cache['token']
+    """Gets or refreshes an access token for a specific RTE API endpoint (shared by the workers)."""
+    token_name = f"rte.{cache_key}"
+
+    # Cached tokens expiring within 60s are refreshed
+    cached_token = shared_tokens.get(token_name)
+    if cached_token:
+        logger.debug(f"Using cached RTE token for '{cache_key}'. Expires at: {time.ctime(shared_tokens.expires_at(token_name))}")
+        return cached_token
 
     logger.info(f"Requesting new RTE token for '{cache_key}' from {token_url}")
     payload = {
@@ -53,11 +50,10 @@ def _obter_token_rte(token_url, cache_key):
              raise ValueError(f"Token RTE ausente na resposta ({cache_key}).")
              
         # Update cache
-        cache['token'] = access_token
-        cache['expires_at'] = time.time() + expires_in
+        shared_tokens.set(token_name, access_token, expires_in)
         
         logger.info(f"Successfully obtained new RTE token for '{cache_key}'.")
-        logger.debug(f"RTE Token '{cache_key}' expires at: {time.ctime(cache['expires_at'])}")
+        logger.debug(f"RTE Token '{cache_key}' expires at: {time.ctime(shared_tokens.expires_at(token_name))}")
         return access_token
         
     except requests.exceptions.RequestException as e:
@@ -75,7 +71,7 @@ def obter_token_busca_cidade():
     """Facade function to get the city search token."""
     return _obter_token_rte(URL_TOKEN_BUSCA_CIDADE, 'busca_cidade')
 
-def obter_city_id_rte(zip_code):
+def obter_city_id_rte(zip_code, quote_id=None):
     """Queries the RTE API for the CityId corresponding to a Zip Code."""
     if not zip_code or not str(zip_code).isdigit():
         logger.error(f"Invalid Zip Code provided for RTE City ID lookup: {zip_code}")
@@ -94,10 +90,9 @@ def obter_city_id_rte(zip_code):
         
         response = requests.get(url, headers=headers, timeout=API_TIMEOUT)
         
-        # Log status and raw response text for debugging
         logger.debug(f"RTE City ID Lookup - Status: {response.status_code}")
-        response_body_text = response.text
-        logger.debug(f"RTE City ID Lookup - Response Body: {response_body_text[:500]}") # Log truncated
+        # Archived too: a failed lookup is a failed RTE quotation
+        payload_archive.record("RTE", quote_id, response, operation='busca_cidade')
         
         response.raise_for_status() # Check for HTTP errors
         
@@ -264,7 +259,7 @@ def gera_cotacao_rte(dados):
 
     try:
         # 1. Get Destination City ID
-        destination_city_id = obter_city_id_rte(dados['cli_cep'])
+        destination_city_id = obter_city_id_rte(dados['cli_cep'], dados.get('quote_id'))
         
         # 2. Get Quotation Token
         token_cotacao = obter_token_cotacao()
@@ -283,16 +278,15 @@ def gera_cotacao_rte(dados):
         response = requests.post(URL_COTACAO_RTE, json=payload, headers=headers, timeout=API_TIMEOUT)
         elapsed_time = time.time() - start_time
         logger.info(f"RTE Quotation API response time: {elapsed_time:.2f} seconds")
+        # Raw request/response go to the payload archive (see services.payload_replay)
+        payload_archive.record("RTE", dados.get('quote_id'), response)
 
-        # Log raw status and body
-        logger.debug(f"RTE Quotation Raw Response Status: {response.status_code}")
         response_body_text = response.text
         try:
             response_data = response.json()
-            logger.debug(f"RTE Quotation Raw Response Body (JSON): {response_data}")
         except ValueError:
             response_data = None
-            logger.debug(f"RTE Quotation Raw Response Body (Non-JSON): {response_body_text[:500]}")
+            logger.debug(f"RTE quotation response is not JSON (status {response.status_code}).")
 
         # Check HTTP status
         if response.status_code != 200:
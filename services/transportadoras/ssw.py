@@ -5,6 +5,7 @@ import html
 import time
 import logging
 from config import CurrentConfig # Import configuration
+from services.payload_archive import payload_archive
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation # Use Decimal
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,7 @@ SSW_BASE_URL = CurrentConfig.SSW_BASE_URL
 SSW_SOAP_ACTION = CurrentConfig.SSW_SOAP_ACTION
 SSW_CARRIERS_CONFIG = CurrentConfig.SSW_CARRIERS # Dict of carrier configs
 API_TIMEOUT = CurrentConfig.DEFAULT_API_TIMEOUT
+SSW_SECRET_ELEMENTS = ('login', 'senha') # Masked in the payload archive
 
 def get_ssw_carrier_config(carrier_code):
     """Retrieves the configuration for a specific SSW carrier."""
@@ -217,7 +219,9 @@ def consultar_transportadora(carrier_code, dados_usuario):
         response = requests.post(SSW_BASE_URL, headers=headers, data=body, timeout=API_TIMEOUT)
         elapsed_time = time.time() - start_time
         logger.info(f"SSW API response time ({carrier_code}): {elapsed_time:.2f} seconds")
-        logger.debug(f"SSW Response Body ({carrier_code}):\n{response.text[:1000]}...")
+        # Raw request/response go to the payload archive (see services.payload_replay)
+        payload_archive.record(carrier_code, dados_usuario.get('quote_id'), response, request_body=body,
+                               secret_elements=SSW_SECRET_ELEMENTS)
 
         if response.status_code != 200:
             logger.error(f"SSW request failed ({carrier_code}): HTTP {response.status_code} {response.reason}")
@@ -0,0 +1,13 @@
+# services/transportadoras/stub.py
+"""Stub carrier used by load tests (CARRIER_STUB_LATENCY_MS > 0): answers after a simulated latency."""
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+def cotacao_stub(carrier_code, latency_ms):
+    """Sleeps ~latency_ms (cooperative under eventlet) and returns a fixed carrier result."""
+    time.sleep(random.uniform(0.5, 1.5) * latency_ms / 1000)
+    return {"Transportadora": carrier_code, "modal": "Rodoviário", "frete": 123.45,
+            "prazo": 3, "cotacao": "0", "message": None}
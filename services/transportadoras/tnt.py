@@ -4,6 +4,7 @@ import xml.etree.ElementTree as ET
 import time
 import logging
 from config import CurrentConfig # Import configuration
+from services.payload_archive import payload_archive
 from decimal import Decimal, InvalidOperation # Use Decimal
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,7 @@ TNT_LOGIN = CurrentConfig.TNT_LOGIN
 TNT_PASSWORD = CurrentConfig.TNT_PASSWORD
 FATOR_CUBAGEM_TNT = Decimal(CurrentConfig.TNT_CUBAGE_FACTOR) # Use Decimal
 API_TIMEOUT = CurrentConfig.DEFAULT_API_TIMEOUT
+TNT_SECRET_ELEMENTS = ('login', 'senha') # Masked in the payload archive (mod:login, mod:senha)
 
 def _calcular_peso_final_tnt(packages, total_weight_real):
     """Calculates total cubed weight and returns the greater of cubed or real weight."""
@@ -190,7 +192,10 @@ def _tentar_calculo_frete_tnt(dados_usuario, tp_situacao_tributaria_dest, peso_f
         response = requests.post(URL_TNT, headers=headers, data=body, timeout=API_TIMEOUT)
         elapsed_time = time.time() - start_time
         logger.info(f"TNT API response time (Sit Trib Dest: {tp_situacao_tributaria_dest}): {elapsed_time:.2f} seconds")
-        logger.debug(f"TNT Response Body (Sit Trib Dest: {tp_situacao_tributaria_dest}):\n{response.text[:1000]}...")
+        # Raw request/response go to the payload archive (see services.payload_replay)
+        payload_archive.record("TNT", dados_usuario.get('quote_id'), response, request_body=body,
+                               secret_elements=TNT_SECRET_ELEMENTS,
+                               sit_trib_dest=tp_situacao_tributaria_dest)
 
         if response.status_code != 200:
             logger.error(f"TNT request failed (Sit Trib Dest: {tp_situacao_tributaria_dest}): HTTP {response.status_code} {response.reason}")
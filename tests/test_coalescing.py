@@ -0,0 +1,152 @@
+# tests/test_coalescing.py
+import asyncio
+from decimal import Decimal
+import pytest
+from services.coalescing import RequestCoalescer, AsyncRequestCoalescer, request_signature
+
+KEY = ('BTU', 'R', 'signature')
+
+def test_signature_ignores_quote_fields_and_package_order():
+    pack = [{'Weight': Decimal('6.250'), 'AmountPackages': 2}, {'Weight': 3, 'AmountPackages': 1}]
+    base = {'cep_destino': '01001000', 'valor_nf': Decimal('1000.0'), 'pack': pack}
+    same = {**base, 'valor_nf': Decimal('1000'), 'pack': pack[::-1], 'quote_id': 7, 'protocolo': 42}
+    assert request_signature(base) == request_signature(same)
+    assert request_signature(base) != request_signature({**base, 'cep_destino': '01001001'})
+
+# === Eventlet serving mode ===
+
+def test_followers_share_the_leaders_result():
+    eventlet = pytest.importorskip('eventlet')
+    from eventlet.event import Event
+    coalescer = RequestCoalescer()
+    release = Event()
+    calls = []
+
+    def carrier_call():
+        calls.append(1)
+        release.wait()
+        return {'Transportadora': 'BTU', 'frete': 10}
+
+    leader = eventlet.spawn(coalescer.run, KEY, carrier_call)
+    eventlet.sleep(0)
+    followers = [eventlet.spawn(coalescer.run, KEY, carrier_call) for _ in range(3)]
+    eventlet.sleep(0)
+    release.send()
+    results = [leader.wait()] + [follower.wait() for follower in followers]
+
+    assert calls == [1]
+    assert all(result == {'Transportadora': 'BTU', 'frete': 10} for result in results)
+    assert len({id(result) for result in results}) == 4 # Each caller gets its own copy
+
+def test_followers_get_the_leaders_exception():
+    eventlet = pytest.importorskip('eventlet')
+    from eventlet.event import Event
+    coalescer = RequestCoalescer()
+    release = Event()
+
+    def carrier_call():
+        release.wait()
+        raise ConnectionError('timeout')
+
+    leader = eventlet.spawn(coalescer.run, KEY, carrier_call)
+    eventlet.sleep(0)
+    follower = eventlet.spawn(coalescer.run, KEY, carrier_call)
+    eventlet.sleep(0)
+    release.send()
+    for greenthread in (leader, follower):
+        with pytest.raises(ConnectionError):
+            greenthread.wait()
+    assert not coalescer._inflight
+
+def test_follower_retries_when_the_leader_is_killed():
+    eventlet = pytest.importorskip('eventlet')
+    from greenlet import GreenletExit
+    coalescer = RequestCoalescer()
+    calls = []
+
+    def carrier_call():
+        calls.append(1)
+        if len(calls) == 1:
+            eventlet.sleep(10) # Killed while waiting on the carrier
+        return {'Transportadora': 'BTU'}
+
+    leader = eventlet.spawn(coalescer.run, KEY, carrier_call)
+    eventlet.sleep(0)
+    follower = eventlet.spawn(coalescer.run, KEY, carrier_call)
+    eventlet.sleep(0)
+    leader.kill() # Its quote was cancelled
+    with pytest.raises(GreenletExit):
+        leader.wait()
+    assert follower.wait() == {'Transportadora': 'BTU'}
+    assert calls == [1, 1] # The follower made the call itself
+
+# === Asyncio serving mode ===
+
+def test_async_followers_share_the_leaders_result():
+    coalescer = AsyncRequestCoalescer()
+    calls = []
+
+    async def carrier_call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'Transportadora': 'BTU', 'frete': 10}
+
+    async def main():
+        return await asyncio.gather(*(coalescer.run(KEY, carrier_call) for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(result == {'Transportadora': 'BTU', 'frete': 10} for result in results)
+    assert len({id(result) for result in results}) == 4
+    assert not coalescer._inflight
+
+def test_async_followers_get_the_leaders_exception():
+    coalescer = AsyncRequestCoalescer()
+
+    async def carrier_call():
+        await asyncio.sleep(0.01)
+        raise ConnectionError('timeout')
+
+    async def main():
+        return await asyncio.gather(*(coalescer.run(KEY, carrier_call) for _ in range(2)), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(main())] == [ConnectionError, ConnectionError]
+
+def test_async_follower_retries_when_the_leader_is_cancelled():
+    coalescer = AsyncRequestCoalescer()
+    calls = []
+
+    async def carrier_call():
+        calls.append(1)
+        await asyncio.sleep(10 if len(calls) == 1 else 0.01)
+        return {'Transportadora': 'BTU'}
+
+    async def main():
+        leader = asyncio.ensure_future(coalescer.run(KEY, carrier_call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.run(KEY, carrier_call))
+        await asyncio.sleep(0)
+        leader.cancel() # Its quote was cancelled
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == {'Transportadora': 'BTU'}
+    assert calls == [1, 1]
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    coalescer = AsyncRequestCoalescer()
+
+    async def carrier_call():
+        await asyncio.sleep(0.01)
+        return {'Transportadora': 'BTU'}
+
+    async def main():
+        leader = asyncio.ensure_future(coalescer.run(KEY, carrier_call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.run(KEY, carrier_call))
+        await asyncio.sleep(0)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(main()) == {'Transportadora': 'BTU'}
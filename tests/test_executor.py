@@ -0,0 +1,199 @@
+# tests/test_executor.py
+import asyncio
+from services.executor import QuotationExecutor, AsyncQuotationExecutor, parse_classes
+
+class ManualExecutor(QuotationExecutor):
+    """Records the jobs it starts; the test runs them (freeing their slot) explicitly."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.started = []
+
+    def _start(self, func, args, kwargs):
+        self.started.append((func, args, kwargs))
+
+    def finish(self, index=0):
+        func, args, kwargs = self.started.pop(index)
+        self._run(func, args, kwargs)
+
+def job(name, ran):
+    return lambda: ran.append(name)
+
+def test_submit_runs_up_to_the_slot_limit_then_queues_in_order():
+    executor = ManualExecutor(max_quotations=2, max_carrier_calls=4, max_queued=3)
+    positions = {}
+    results = [executor.submit(job(name, []), on_position=lambda position, name=name: positions.setdefault(name, []).append(position))
+               for name in 'abcde']
+    assert results == [0, 0, 1, 2, 3]
+    assert len(executor.started) == 2
+    # Running jobs are never told a position; queued ones get theirs on submit
+    assert positions == {'c': [1], 'd': [2], 'e': [3]}
+
+def test_submit_rejects_when_the_queue_is_full():
+    executor = ManualExecutor(max_quotations=1, max_carrier_calls=4, max_queued=1)
+    ran = []
+    assert executor.submit(job('a', ran)) == 0
+    assert executor.submit(job('b', ran)) == 1
+    assert executor.submit(job('c', ran)) is None
+    executor.finish()
+    executor.finish()
+    assert ran == ['a', 'b'] # The rejected job never runs
+    assert executor.submit(job('d', ran)) == 0 # Room again once the queue drained
+
+def test_release_starts_the_oldest_queued_job_and_updates_positions():
+    executor = ManualExecutor(max_quotations=1, max_carrier_calls=4, max_queued=5)
+    ran = []
+    positions = {}
+    for name in 'abcd':
+        executor.submit(job(name, ran), on_position=lambda position, name=name: positions.setdefault(name, []).append(position))
+
+    executor.finish()
+    assert ran == ['a']
+    assert len(executor.started) == 1 # 'b' took the freed slot
+    assert positions == {'b': [1], 'c': [2, 1], 'd': [3, 2]}
+
+    executor.finish()
+    executor.finish()
+    executor.finish()
+    assert ran == ['a', 'b', 'c', 'd']
+    assert executor._active == 0 and not executor._queue
+
+def test_failing_job_still_frees_its_slot():
+    executor = ManualExecutor(max_quotations=1, max_carrier_calls=4, max_queued=1)
+    ran = []
+    executor.submit(lambda: 1 / 0)
+    executor.submit(job('b', ran))
+    executor.finish() # Logged, not raised
+    executor.finish()
+    assert ran == ['b']
+    assert executor._active == 0
+
+def test_failing_position_callback_does_not_block_admission():
+    executor = ManualExecutor(max_quotations=1, max_carrier_calls=4, max_queued=2)
+    executor.submit(job('a', []))
+    assert executor.submit(job('b', []), on_position=lambda position: 1 / 0) == 1
+    executor.finish()
+    assert len(executor.started) == 1
+
+def test_async_executor_applies_the_same_limits():
+    executor = AsyncQuotationExecutor(max_quotations=2, max_carrier_calls=2, max_queued=1)
+    running = []
+    peak = []
+
+    async def quotation(name, done):
+        running.append(name)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(name)
+        done.append(name)
+
+    async def main():
+        done = []
+        results = [executor.submit(quotation, name, done) for name in 'abcd']
+        while len(done) < 3:
+            await asyncio.sleep(0.005)
+        return results, done
+
+    results, done = asyncio.run(main())
+    assert results == [0, 0, 1, None]
+    assert sorted(done[:2]) == ['a', 'b'] and done[2] == 'c'
+    assert max(peak) == 2
+
+class Waiter:
+    """Stands in for the eventlet Event / asyncio future of a waiting carrier call."""
+
+    def __init__(self, priority, granted):
+        self.priority = priority
+        self.granted = granted
+
+    def send(self):
+        self.granted.append(self.priority)
+
+def test_parse_classes_ignores_invalid_entries():
+    assert parse_classes('interactive=8, bulk=1,,x') == {'interactive': 8.0, 'bulk': 1.0}
+    # A weight divides the slots granted: zero, negative or NaN would break the scheduler
+    assert parse_classes('interactive=8,bulk=0,other=-1,odd=nan', positive=True) == {'interactive': 8.0}
+    # Only weights must be positive
+    assert parse_classes('interactive=60,bulk=0', int) == {'interactive': 60, 'bulk': 0}
+
+def scheduler(max_carrier_calls=1, weights=None, limits=None):
+    return ManualExecutor(max_quotations=1, max_carrier_calls=max_carrier_calls, max_queued=1,
+                          weights=weights or {'interactive': 4, 'bulk': 1}, limits=limits)
+
+def call(executor, priority, granted):
+    """A carrier call asking for a slot; recorded in granted once it gets one."""
+    if executor._enqueue_or_grant(executor._priority_class(priority), Waiter(priority, granted)):
+        granted.append(priority)
+
+def finish_calls(executor, granted, count, start=0):
+    """Ends count calls in the order they were granted, freeing their slots."""
+    for index in range(start, start + count): # Each release grants the next call, appending to granted
+        executor._release_carrier_slot(executor._priority_class(granted[index]))
+
+def test_slots_are_shared_by_weight():
+    executor = scheduler()
+    granted = []
+    for _ in range(40):
+        call(executor, 'interactive', granted)
+        call(executor, 'bulk', granted)
+    finish_calls(executor, granted, 25)
+    # Bulk arrived while interactive held the slot: it starts level with it and loses the tie,
+    # then gets one grant in every five
+    assert granted[:2] == ['interactive', 'interactive']
+    assert granted[2:22] == (['bulk'] + ['interactive'] * 4) * 4
+
+def test_interactive_is_not_starved_by_a_bulk_backlog():
+    executor = scheduler(max_carrier_calls=2)
+    granted = []
+    for _ in range(50):
+        call(executor, 'bulk', granted)
+    finish_calls(executor, granted, 10)
+    call(executor, 'interactive', granted)
+    assert granted.count('interactive') == 0 # Both slots busy: it waits
+    finish_calls(executor, granted, 1, start=10)
+    assert granted[-1] == 'interactive' # Next free slot, ahead of 38 queued bulk calls
+
+def test_class_back_from_idle_does_not_starve_the_others():
+    executor = scheduler()
+    granted = []
+    for _ in range(30):
+        call(executor, 'bulk', granted)
+    finish_calls(executor, granted, 20)
+    # Interactive was idle while bulk ran 20 calls; it gets its share from now on, not 80 calls in a row
+    for _ in range(20):
+        call(executor, 'interactive', granted)
+    finish_calls(executor, granted, 10, start=20)
+    recent = granted[21:31]
+    assert recent.count('interactive') == 8 and recent.count('bulk') == 2
+
+def test_class_limit_holds_with_free_slots():
+    executor = scheduler(max_carrier_calls=4, limits={'bulk': 1})
+    granted = []
+    for _ in range(3):
+        call(executor, 'bulk', granted)
+    assert granted == ['bulk']
+    assert executor._carrier_active == 1 # Three global slots free, but bulk is at its limit
+    call(executor, 'interactive', granted)
+    call(executor, 'interactive', granted)
+    assert granted == ['bulk', 'interactive', 'interactive']
+    finish_calls(executor, granted, 1)
+    assert granted[-1] == 'bulk' and executor._classes['bulk'].active == 1
+
+def test_abandoned_wait_leaves_the_queue_or_frees_the_granted_slot():
+    executor = scheduler()
+    granted = []
+    call(executor, 'bulk', granted)
+    cls = executor._priority_class('interactive')
+    waiter = Waiter('interactive', granted)
+    assert not executor._enqueue_or_grant(cls, waiter)
+    executor._abandon_wait(cls, waiter) # Cancelled while queued
+    assert not cls.waiters
+    finish_calls(executor, granted, 1)
+    assert executor._carrier_active == 0
+
+    call(executor, 'bulk', granted)
+    waiter = Waiter('interactive', granted)
+    executor._enqueue_or_grant(cls, waiter)
+    finish_calls(executor, granted, 1, start=1) # Slot handed to the waiter...
+    executor._abandon_wait(cls, waiter) # ...which was cancelled before it could run
+    assert executor._carrier_active == 0 and cls.active == 0
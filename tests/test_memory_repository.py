@@ -0,0 +1,43 @@
+# tests/test_memory_repository.py
+import pytest
+from db.repository.base import QuoteRepository
+from db.repository.memory import InMemoryQuoteRepository
+
+CLIENT = {
+    'code': '100', 'cnpj': '11.222.333/0001-44', 'name': 'Cliente', 'number_state_registration': 'ISENTO',
+    'city_name': 'São Paulo', 'state_abbreviation': 'SP', 'cep': '01001-000', 'address': 'Rua A',
+    'neighborhood': 'Centro', 'address_number': '1', 'ibge_city_code': '3550308',
+}
+
+def test_upsert_client_inserts_then_detects_changes():
+    repo = InMemoryQuoteRepository()
+    row, changed = repo.upsert_client(CLIENT)
+    assert row['inserted'] and changed
+    assert repo.upsert_client(CLIENT) == ({**row, 'inserted': False}, False)
+    row, changed = repo.upsert_client({**CLIENT, 'name': 'Cliente Novo'})
+    assert changed and row['name'] == 'Cliente Novo'
+
+def test_known_cnpj_under_new_code_recodes_the_existing_client():
+    repo = InMemoryQuoteRepository()
+    original, _ = repo.upsert_client(CLIENT)
+    row, changed = repo.upsert_client({**CLIENT, 'code': '200'})
+    assert changed and not row['inserted']
+    assert row['client_id'] == original['client_id'] and row['code'] == '200'
+    assert list(repo.clients) == ['200']
+
+def test_incomplete_repository_fails_at_construction():
+    class PartialRepository(QuoteRepository):
+        def get_next_protocolo(self):
+            return 1
+
+    with pytest.raises(TypeError):
+        PartialRepository()
+    InMemoryQuoteRepository() # Complete implementations instantiate
+
+def test_cancelled_calls_are_stored_with_their_status():
+    repo = InMemoryQuoteRepository()
+    repo.add_carrier('BTU')
+    repo.add_carrier('TNT')
+    repo.insert_quote_response(1, {'Transportadora': 'BTU', 'frete': 10, 'prazo': 2})
+    repo.insert_quote_response(1, {'Transportadora': 'TNT', 'modal': 'Rodoviário'}, status='cancelled')
+    assert [row['status'] for row in repo.responses[1]] == ['answered', 'cancelled']
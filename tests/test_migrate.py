@@ -0,0 +1,7 @@
+# tests/test_migrate.py
+from db import migrate
+
+def test_discover_migrations_is_ordered_and_unique():
+    versions = [version for version, _, _ in migrate.discover_migrations()]
+    assert versions == sorted(versions)
+    assert versions[0] == 1 and len(versions) == len(set(versions))
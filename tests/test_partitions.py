@@ -0,0 +1,165 @@
+# tests/test_partitions.py
+import datetime
+import re
+import pytest
+from db import partitions
+from db.partitions import _add_months, _month_start, _parse_partition_month, partition_name
+
+def test_month_start_and_add_months_across_years():
+    assert _month_start(datetime.date(2024, 2, 29)) == datetime.date(2024, 2, 1)
+    assert _add_months(datetime.date(2024, 11, 1), 1) == datetime.date(2024, 12, 1)
+    assert _add_months(datetime.date(2024, 12, 1), 1) == datetime.date(2025, 1, 1)
+    assert _add_months(datetime.date(2024, 1, 1), -1) == datetime.date(2023, 12, 1)
+    assert _add_months(datetime.date(2024, 3, 1), -15) == datetime.date(2022, 12, 1)
+    assert _add_months(datetime.date(2024, 3, 1), 0) == datetime.date(2024, 3, 1)
+
+def test_partition_names_round_trip():
+    month = datetime.date(2024, 1, 1)
+    name = partition_name('quote_responses', month)
+    assert name == 'quote_responses_p202401'
+    assert _parse_partition_month('quote_responses', name) == month
+    assert _parse_partition_month('quote_responses', 'quote_responses_default') is None
+    assert _parse_partition_month('quote_responses', 'quote_packages_p202401') is None
+
+class FakeDatabase:
+    """Just enough of the catalog and COPY for the partition maintenance code paths."""
+
+    def __init__(self):
+        self.partitions = {table: {} for table in partitions.PARTITIONED_TABLES} # table -> {name: csv data}
+        self.defaults = set()
+        self.parked = {} # Rows in the DEFAULT partitions: month -> count (both tables)
+        self.statements = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _table_of(self, name):
+        return next(table for table in self.db.partitions if name.startswith(table))
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.db.statements.append(sql)
+        if sql.startswith('SELECT relkind'):
+            self.result = [{'relkind': 'p'}]
+        elif 'to_regclass(%s) IS NOT NULL' in sql:
+            self.result = [{'present': params[0] in self.db.defaults}]
+        elif 'FROM pg_inherits' in sql:
+            self.result = [{'name': name} for name in self.db.partitions[params[0]]]
+        elif 'PARTITION OF' in sql and sql.endswith('DEFAULT;'):
+            self.db.defaults.add(re.search(r'EXISTS (\w+)', sql).group(1))
+        elif 'PARTITION OF' in sql:
+            name = re.search(r'EXISTS (\w+)', sql).group(1)
+            self.db.partitions[self._table_of(name)].setdefault(name, '')
+        elif "date_trunc('month'" in sql:
+            self.result = [{'month': month} for month in self.db.parked]
+        elif sql.startswith('SELECT EXISTS'):
+            self.result = [{'pending': params[0] in self.db.parked}]
+        elif sql.startswith('WITH moved AS'):
+            self.rowcount = self.db.parked[params[0]]
+        elif 'DETACH PARTITION' in sql or 'ATTACH PARTITION' in sql:
+            pass
+        elif sql.startswith('DROP TABLE'):
+            name = re.search(r'DROP TABLE (\w+)', sql).group(1)
+            del self.db.partitions[self._table_of(name)][name]
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return list(self.result)
+
+    def copy_expert(self, sql, file):
+        name = re.search(r'COPY (\w+)', sql).group(1)
+        table = self._table_of(name)
+        if 'TO STDOUT' in sql:
+            file.write(self.db.partitions[table][name])
+        else:
+            self.db.partitions[table][name] = file.read()
+
+@pytest.fixture
+def database(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(partitions, 'get_db_connection', db.connect)
+    return db
+
+def test_ensure_creates_default_and_upcoming_partitions(database):
+    created = partitions.ensure_partitions(months_ahead=1)
+    current = _month_start(datetime.date.today())
+    assert database.defaults == {'quote_responses_default', 'quote_packages_default'}
+    assert partition_name('quote_responses', current) in created
+    assert partition_name('quote_packages', _add_months(current, 1)) in created
+    assert partitions.ensure_partitions(months_ahead=1) == [] # Idempotent
+
+def test_ensure_moves_rows_parked_in_the_default_partition(database):
+    database.defaults.update(f"{table}_default" for table in partitions.PARTITIONED_TABLES)
+    past_month = _add_months(_month_start(datetime.date.today()), -2)
+    database.parked[past_month] = 3
+
+    created = partitions.ensure_partitions(months_ahead=0)
+    assert partition_name('quote_responses', past_month) in created
+    moves = [i for i, sql in enumerate(database.statements) if sql.startswith('WITH moved AS (')]
+    assert len(moves) == 2
+    for i in moves:
+        # The default partition is detached while the month partition is created and filled
+        assert database.statements[i - 2].endswith('DETACH PARTITION quote_responses_default;') or \
+            database.statements[i - 2].endswith('DETACH PARTITION quote_packages_default;')
+        assert database.statements[i + 1].endswith('_default DEFAULT;')
+
+def test_archive_then_restore_round_trip(database, tmp_path):
+    current = _month_start(datetime.date.today())
+    old_month = _add_months(current, -14)
+    for table in partitions.PARTITIONED_TABLES:
+        database.partitions[table][partition_name(table, old_month)] = f"quote_id,quote_date\n1,{old_month}\n"
+        database.partitions[table][partition_name(table, current)] = f"quote_id,quote_date\n2,{current}\n"
+    original = {table: dict(names) for table, names in database.partitions.items()}
+
+    archived = partitions.archive_old_partitions(retention_months=12, archive_dir=str(tmp_path))
+    assert sorted(archived) == sorted(str(tmp_path / f"{partition_name(t, old_month)}.csv.gz")
+                                      for t in partitions.PARTITIONED_TABLES)
+    for table in partitions.PARTITIONED_TABLES:
+        assert list(database.partitions[table]) == [partition_name(table, current)]
+
+    restored = partitions.restore_partition(old_month + datetime.timedelta(days=10), archive_dir=str(tmp_path))
+    assert sorted(restored) == sorted(partition_name(t, old_month) for t in partitions.PARTITIONED_TABLES)
+    assert database.partitions == original
+
+def test_restore_refuses_an_existing_partition(database, tmp_path):
+    month = _add_months(_month_start(datetime.date.today()), -14)
+    database.partitions['quote_responses'][partition_name('quote_responses', month)] = "quote_id\n1\n"
+    partitions.archive_old_partitions(retention_months=12, archive_dir=str(tmp_path))
+    database.partitions['quote_responses'][partition_name('quote_responses', month)] = ''
+    with pytest.raises(ValueError):
+        partitions.restore_partition(month, archive_dir=str(tmp_path))
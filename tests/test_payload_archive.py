@@ -0,0 +1,51 @@
+# tests/test_payload_archive.py
+from types import SimpleNamespace
+from services.payload_archive import PayloadArchiver, iter_segment, list_segments, redact_xml
+
+SSW_BODY = '''<urn:cotar>
+    <dominio xsi:type="xsd:string">ABC</dominio>
+    <login xsi:type="xsd:string">usuario-ssw</login>
+    <senha xsi:type="xsd:string">segredo-ssw</senha>
+    <cepOrigem xsi:type="xsd:integer">01001000</cepOrigem>
+</urn:cotar>'''
+
+TNT_BODY = '''<ser:in0>
+    <mod:login>usuario-tnt</mod:login>
+    <mod:senha>segredo-tnt</mod:senha>
+    <mod:cepOrigem>01001000</mod:cepOrigem>
+</ser:in0>'''
+
+def make_archiver(tmp_path):
+    archiver = PayloadArchiver(archive_dir=str(tmp_path), sample_rate=1.0, max_bytes=10 * 1024 ** 2,
+                               segment_bytes=1024 ** 2, queue_size=10)
+    archiver._ensure_writer = lambda: None # Records are written by the test, not a background thread
+    return archiver
+
+def flush(archiver):
+    while not archiver._queue.empty():
+        archiver._write(*archiver._queue.get_nowait())
+    archiver._segment.close()
+
+def test_redact_xml_masks_elements_with_and_without_prefix():
+    redacted = redact_xml(SSW_BODY, ('login', 'senha')) + redact_xml(TNT_BODY, ('login', 'senha'))
+    assert 'segredo' not in redacted and 'usuario' not in redacted
+    assert '<login xsi:type="xsd:string">***</login>' in redacted
+    assert '<mod:senha>***</mod:senha>' in redacted
+    assert '<cepOrigem xsi:type="xsd:integer">01001000</cepOrigem>' in redacted
+
+def test_redact_xml_accepts_bytes():
+    assert redact_xml(TNT_BODY.encode('utf-8'), ('senha',)).count(b'segredo') == 0
+
+def test_archived_segment_contains_no_credentials(tmp_path):
+    archiver = make_archiver(tmp_path)
+    response = SimpleNamespace(status_code=500, url='https://carrier.example/soap', content=b'<fault/>',
+                               elapsed=SimpleNamespace(total_seconds=lambda: 0.1))
+    archiver.record('SSW1', 1, response, request_body=SSW_BODY, secret_elements=('login', 'senha'))
+    archiver.record('TNT', 1, response, request_body=TNT_BODY, secret_elements=('login', 'senha'))
+    flush(archiver)
+
+    records = [record for path in list_segments(str(tmp_path)) for record in iter_segment(path)]
+    assert [header['carrier'] for header, _, _ in records] == ['SSW1', 'TNT']
+    for _, request_bytes, _ in records:
+        assert b'segredo' not in request_bytes and b'usuario' not in request_bytes
+        assert b'01001000' in request_bytes
@@ -0,0 +1,92 @@
+# tests/test_quotation_jobs.py
+import pytest
+from services import quotation_jobs as jobs_module
+from services.quotation_jobs import QuotationJobRegistry, idempotency_key
+
+CLIENT = {'cnpj': '12345678000199', 'code': 'C001'}
+PACKAGES = {'pack': [{'AmountPackages': 2, 'Weight': 6.25}], 'total_weight': 12.5}
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manual monotonic clock for job ages and retention."""
+    now = [1000.0]
+    monkeypatch.setattr(jobs_module.time, 'monotonic', lambda: now[0])
+    return now
+
+@pytest.fixture
+def registry(clock):
+    return QuotationJobRegistry(retention_seconds=300, idempotency_window_seconds=30)
+
+def test_key_prefers_the_request_id_and_is_scoped_to_the_client():
+    by_request = idempotency_key(CLIENT, PACKAGES, 1000, request_id='abc')
+    # Same request ID: same key whatever the session data
+    assert by_request == idempotency_key(CLIENT, {'pack': []}, 2000, request_id='abc')
+    # ...but never shared across clients
+    assert by_request != idempotency_key({'cnpj': '99999999000100'}, PACKAGES, 1000, request_id='abc')
+    assert by_request != idempotency_key(CLIENT, PACKAGES, 1000)
+
+def test_key_without_request_id_covers_packages_and_invoice_value():
+    key = idempotency_key(CLIENT, PACKAGES, 1000)
+    assert key == idempotency_key(dict(CLIENT), {'total_weight': 12.5, 'pack': [{'Weight': 6.25, 'AmountPackages': 2}]}, 1000)
+    assert key != idempotency_key(CLIENT, PACKAGES, 1000.5)
+    assert key != idempotency_key(CLIENT, {**PACKAGES, 'total_weight': 13}, 1000)
+    assert key != idempotency_key({'cnpj': '99999999000100'}, PACKAGES, 1000)
+
+def test_claim_reuses_a_running_job(registry, clock):
+    job, created = registry.claim('key')
+    assert created
+    job.set_status('running')
+    clock[0] += 600 # Long past the window: a running job is reused anyway
+    assert registry.claim('key') == (job, False)
+    assert registry.claim('other')[1]
+
+def test_claim_reuses_a_finished_job_within_the_window(registry, clock):
+    job, _ = registry.claim('key')
+    job.set_status('complete')
+    clock[0] += 30
+    assert registry.claim('key') == (job, False)
+    clock[0] += 1
+    new_job, created = registry.claim('key')
+    assert created and new_job is not job
+    assert registry.claim('key') == (new_job, False) # The key now points at the new job
+
+@pytest.mark.parametrize('status', ['error', 'cancelled'])
+def test_claim_never_reuses_failed_or_cancelled_jobs(registry, status):
+    job, _ = registry.claim('key')
+    job.set_status(status)
+    new_job, created = registry.claim('key')
+    assert created and new_job is not job
+
+def test_claim_never_reuses_a_job_being_cancelled(registry):
+    job, _ = registry.claim('key')
+    job.set_status('running')
+    job.cancel() # Still running while its pending calls unwind
+    assert registry.claim('key')[1]
+
+def test_rejoin_by_protocol_and_orphaned_jobs(registry):
+    job, _ = registry.claim('key')
+    registry.set_protocolo(job, 42)
+    assert registry.get('42') is job and registry.get(42) is job
+    registry.subscribe(job, 'sid-1')
+    registry.subscribe(job, 'sid-2')
+    assert registry.unsubscribe('sid-1') == []
+    assert registry.unsubscribe('sid-2') == [job]
+    assert registry.unsubscribe('sid-2') == []
+
+def test_finished_jobs_are_purged_after_retention(registry, clock):
+    job, _ = registry.claim('key')
+    registry.set_protocolo(job, 42)
+    job.set_status('complete')
+    clock[0] += 301
+    registry.claim('other') # Purging happens as jobs are added
+    assert registry.get(42) is None
+    assert registry.claim('key')[1]
+
+def test_snapshot_numbers_the_buffered_results(registry):
+    job, _ = registry.claim('key')
+    assert job.add_result({'Transportadora': 'Braspress'}) == 1
+    assert job.add_result({'Transportadora': 'TNT Mercúrio'}) == 2
+    job.set_pending(['Bauer'])
+    snapshot = job.snapshot()
+    assert [result['seq'] for result in snapshot['results']] == [1, 2]
+    assert snapshot['pending'] == ['Bauer'] and snapshot['status'] == 'pending'
@@ -0,0 +1,44 @@
+# tests/test_rate_limit.py
+import asyncio
+import pytest
+from services import rate_limit
+from services.rate_limit import CarrierRateLimiter, TokenBucket, parse_limits
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manual monotonic clock; sleeping advances it."""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_parse_limits_rejects_zero_rate_and_small_burst():
+    assert parse_limits('BTU=2/4, bau=1/3,TNT=0/5,EPC=1/0.5,RTE=-1/2,bad') == {'BTU': (2.0, 4.0), 'BAU': (1.0, 3.0)}
+
+def test_limiter_rejects_invalid_defaults():
+    with pytest.raises(ValueError):
+        CarrierRateLimiter(default_rate=0, default_burst=10)
+
+def test_bucket_reserves_burst_then_future_tokens(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    assert [bucket.reserve(max_wait=1.0) for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    # A wait beyond max_wait is refused without consuming a token
+    assert bucket.reserve(max_wait=1.0) is None
+    clock[0] += 1.0
+    assert bucket.reserve(max_wait=1.0) == 0.5
+
+def test_acquire_waits_for_reserved_token_or_refuses(clock, monkeypatch):
+    slept = []
+    monkeypatch.setattr(rate_limit.time, 'sleep', slept.append)
+    limiter = CarrierRateLimiter(default_rate=1, default_burst=1)
+    assert limiter.acquire('BTU', max_wait=2)
+    assert limiter.acquire('BTU', max_wait=2)
+    assert not limiter.acquire('BTU', max_wait=0.5)
+    assert slept == [0.0, 1.0]
+    counts = list(limiter._counts.values())
+    assert counts == [[2, 1]]
+
+def test_acquire_async_matches_acquire(clock):
+    limiter = CarrierRateLimiter(default_rate=100, default_burst=1, limits={'TNT': (1, 1)})
+    assert asyncio.run(limiter.acquire_async('TNT', max_wait=0))
+    assert not asyncio.run(limiter.acquire_async('TNT', max_wait=0))
+    assert asyncio.run(limiter.acquire_async('BTU', max_wait=0))
@@ -0,0 +1,76 @@
+# tests/test_read_routing.py
+import pytest
+from db import connection as db_connection
+
+class FakeConnection:
+    def __init__(self, name, lag_seconds=0):
+        self.name = name
+        self.lag_seconds = lag_seconds
+        self.closed = False
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                pass
+
+            def fetchone(self):
+                return {'lag_seconds': conn.lag_seconds}
+        return Cursor()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Replica configured; counts connections to it. Set state['lag'] to simulate lag."""
+    state = {'connects': 0, 'lag': 0, 'now': 1000.0}
+    def connect_replica():
+        state['connects'] += 1
+        return FakeConnection('replica', state['lag'])
+    monkeypatch.setattr(db_connection.CurrentConfig, 'DB_READ_HOST', 'replica-host')
+    monkeypatch.setattr(db_connection.CurrentConfig, 'REPLICA_LAG_CHECK_INTERVAL', 10)
+    monkeypatch.setattr(db_connection.CurrentConfig, 'REPLICA_MAX_LAG_SECONDS', 5)
+    monkeypatch.setattr(db_connection, '_connect_replica', connect_replica)
+    monkeypatch.setattr(db_connection, 'get_db_connection', lambda: FakeConnection('primary'))
+    monkeypatch.setattr(db_connection, 'numeric_as_number', lambda conn: conn) # Needs a real connection
+    monkeypatch.setattr(db_connection.time, 'time', lambda: state['now'])
+    monkeypatch.setattr(db_connection, '_replica_state', {'lag_ok': True, 'checked_at': 0})
+    return state
+
+def test_cast_numeric_returns_int_or_float():
+    assert db_connection._cast_numeric(None, None) is None
+    assert db_connection._cast_numeric('42', None) == 42 and isinstance(db_connection._cast_numeric('42', None), int)
+    assert db_connection._cast_numeric('-7.00', None) == -7 and isinstance(db_connection._cast_numeric('-7.00', None), int)
+    assert db_connection._cast_numeric('1234.56', None) == 1234.56
+
+def test_lagging_replica_is_not_contacted_until_the_cache_expires(replica):
+    replica['lag'] = 60
+    assert db_connection.get_read_connection('history').name == 'primary'
+    assert replica['connects'] == 1 # Lag measured once
+
+    replica['now'] += 5
+    assert db_connection.get_read_connection('history').name == 'primary'
+    assert replica['connects'] == 1 # Cached "lagging": no replica connection
+
+    replica['lag'] = 0
+    replica['now'] += 10
+    assert db_connection.get_read_connection('history').name == 'replica'
+    assert replica['connects'] == 2
+
+def test_healthy_replica_is_used_without_rechecking_lag(replica):
+    assert db_connection.get_read_connection('details').name == 'replica'
+    checked_at = db_connection._replica_state['checked_at']
+    replica['now'] += 1
+    assert db_connection.get_read_connection('details').name == 'replica'
+    assert db_connection._replica_state['checked_at'] == checked_at
@@ -0,0 +1,24 @@
+# tests/test_serialization.py
+import json
+import uuid
+import datetime
+from decimal import Decimal
+import pytest
+
+flask = pytest.importorskip('flask')
+from services import serialization
+
+def test_decimals_become_numbers_and_non_finite_ones_null():
+    payload = {'frete': Decimal('123.45'), 'volumes': Decimal('3.000'), 'nan': Decimal('NaN'),
+               'inf': Decimal('Infinity'), 'neg_inf': Decimal('-Infinity')}
+    assert serialization.loads(serialization.dumps(payload)) == {
+        'frete': 123.45, 'volumes': 3, 'nan': None, 'inf': None, 'neg_inf': None}
+
+def test_jsonify_uses_the_fast_encoder():
+    app = flask.Flask(__name__)
+    app.json_encoder = serialization.JSONEncoder
+    key = uuid.uuid4()
+    with app.app_context():
+        body = flask.jsonify({'valor': Decimal('10.50'), 'data': datetime.date(2024, 1, 31),
+                              'id': key, 'erro': Decimal('NaN')}).get_data(as_text=True)
+    assert json.loads(body) == {'valor': 10.5, 'data': '2024-01-31', 'id': str(key), 'erro': None}
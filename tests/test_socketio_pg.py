@@ -0,0 +1,51 @@
+# tests/test_socketio_pg.py
+import base64
+import pickle
+import pytest
+
+pytest.importorskip('socketio')
+from services import socketio_pg, serialization
+from services.socketio_pg import PostgresPubSubManager
+
+EXECUTED = []
+
+class Exploit:
+    """Pickle payload that would run code when unpickled."""
+
+    def __reduce__(self):
+        return (EXECUTED.append, ('pwned',))
+
+@pytest.fixture
+def manager():
+    return PostgresPubSubManager(channel='socketio', write_only=True)
+
+def test_messages_round_trip_as_json(manager, monkeypatch):
+    published = []
+    monkeypatch.setattr(socketio_pg, 'publish_socketio_message', lambda channel, payload: published.append(payload))
+    message = {'method': 'emit', 'event': 'new_quotation', 'data': {'cotacao': {'Transportadora': 'TNT Mercúrio'}, 'seq': 1},
+               'namespace': '/', 'room': 'quotation:abc', 'skip_sid': None, 'callback': None, 'host_id': 'h1'}
+    manager._publish(message)
+    assert published[0].startswith('{')
+    assert manager._decode(published[0]) == message
+
+def test_stored_messages_are_fetched_by_reference(manager, monkeypatch):
+    stored = {7: serialization.dumps({'method': 'emit', 'event': 'x', 'data': 'y' * 9000})}
+    monkeypatch.setattr(socketio_pg, 'get_socketio_message', stored.get)
+    assert manager._decode('ref:7')['data'] == 'y' * 9000
+    assert manager._decode('ref:8') is None # Already purged
+
+@pytest.mark.parametrize('payload', [
+    base64.b64encode(pickle.dumps(Exploit())).decode('ascii'), # Former wire format
+    pickle.dumps(Exploit(), protocol=0).decode('latin-1'),
+    '"just a string"',
+    '[1, 2]',
+    '{"event": "no method"}',
+])
+def test_tampered_payloads_are_rejected_not_executed(manager, monkeypatch, payload):
+    with pytest.raises(ValueError):
+        manager._decode(payload)
+    # Same through the socketio_messages table
+    monkeypatch.setattr(socketio_pg, 'get_socketio_message', lambda message_id: payload)
+    with pytest.raises(ValueError):
+        manager._decode('ref:1')
+    assert EXECUTED == []